@@ -0,0 +1,243 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO
+import call_line_checker
+import pd_to_diagram
+
+# 批量求解：从 JSONL 文件（或标准输入）读取 pd_code，在进程池中并行求解，每完成一个任务就输出一行 JSON 结果
+#
+# 输入的每一行是一个 JSON 对象 {"id": ..., "pd_code": [[...], ...], "seed": ...}，其中 id 和 seed 可以省略
+# （id 默认为行号，seed 默认为命令行参数 --seed），也可以直接是一个 pd_code 列表；空行和以 # 开头的行被忽略
+# 无法解析的行（不是 JSON、缺少 pd_code、id 或 seed 不合法）不会中断批量求解，而是以行号为 id 输出一条 status 为 "error" 的结果
+#
+# 输出的每一行是一个 JSON 对象，字段为
+#     id, status ("ok" 或 "error"), seed, crossing_number, value, feasible, solution, time_limit,
+#     timings: {"wait": 提交到开始求解的时间, "solve": 求解用时}, worker: 子进程的 pid
+# status 为 "error" 时没有 value、feasible、solution，而是在 error 中给出异常信息
+# 结果按完成的先后顺序输出，与输入顺序无关；每个任务使用自己的随机数种子，结果与调度顺序无关
+#
+# 指定 --output 和 --resume 时，跳过输出文件中已经有结果的 id，新的结果追加到文件末尾，可以在中断之后继续
+# 指定 --checkpoint-dir 时，每个任务的模拟退火定期把状态写入这个目录中的检查点，中断之后重新运行时正在求解的任务从检查点继续，
+# 任务完成、结果写入输出之后删除它的检查点
+
+DEFAULT_SEED = 42
+
+def checkpoint_path_for(checkpoint_dir: str, job_id: Any) -> str:
+    """
+    任务的检查点文件路径，id 可能含有不能出现在文件名中的字符，因此使用它的哈希值
+    """
+    return os.path.join(checkpoint_dir, "%s.pkl" % hashlib.sha256(json.dumps(job_id).encode("utf-8")).hexdigest()[:16])
+
+def read_jobs(lines: Iterable[str], seed: int = DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    """
+    逐行解析输入，返回任务字典 {"id", "pd_code", "seed"}，id 只能是字符串或整数
+    无法解析的行返回出错的结果 {"id": 行号, "status": "error", "error": ...}，由 solve_batch 直接原样输出
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, list):
+                record = {"pd_code": record}
+            if not isinstance(record, dict) or "pd_code" not in record:
+                raise ValueError(f"第 {line_number} 行缺少 pd_code: {line}")
+            job_id = record.get("id", line_number)
+            if not isinstance(job_id, (str, int)):
+                raise ValueError(f"第 {line_number} 行的 id 只能是字符串或整数: {line}")
+            job_seed = int(record.get("seed", seed))
+        except (ValueError, TypeError) as e: # json.JSONDecodeError 也是 ValueError
+            yield {"id": line_number, "status": "error", "error": f"{type(e).__name__}: {e}"}
+            continue
+        yield {"id": job_id, "pd_code": record["pd_code"], "seed": job_seed}
+
+def completed_ids(path: str, retry_errors: bool = False) -> Set[Any]:
+    """
+    读取已有的输出文件，返回已经有结果的 id；retry_errors 为 True 时不包含出错的任务
+    中断时最后一行可能只写了一半，无法解析的行被忽略
+    """
+    done: Set[Any] = set()
+    if not os.path.isfile(path):
+        return done
+    with open(path, "r") as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict) or "id" not in record:
+                continue
+            if retry_errors and record.get("status") != "ok":
+                continue
+            done.add(record["id"])
+    return done
+
+def solve_job(job: Dict[str, Any], time_limit: Optional[float] = None, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL,
+              store_path: Optional[str] = None, submit_time: Optional[float] = None, schedule: str = "geometric",
+              neighborhood: str = "random", checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    求解一个任务，在子进程中调用；异常不会抛出，而是记录在结果的 error 字段中
+    """
+    begin_time = time.time()
+    result: Dict[str, Any] = {"id": job["id"], "seed": job["seed"], "crossing_number": len(job["pd_code"]), "time_limit": time_limit}
+    checkpoint_path = checkpoint_path_for(checkpoint_dir, job["id"]) if checkpoint_dir is not None else None
+    try:
+        # C++ 部分的输出直接写到文件描述符上，这里只屏蔽 Python 部分的输出，保证标准输出上只有结果
+        with contextlib.redirect_stdout(sys.stderr):
+            solution, value = pd_to_diagram.solve_diagram_for_pd_code(job["pd_code"], seed=job["seed"], store_path=store_path,
+                                                                      routing_mode=routing_mode, verbose=False, time_limit=time_limit,
+                                                                      schedule=schedule, neighborhood=neighborhood,
+                                                                      checkpoint_path=checkpoint_path)
+        result.update({
+            "status": "ok",
+            "value": value if math.isfinite(value) else None,
+            "feasible": pd_to_diagram.is_feasible(solution, value),
+            "solution": solution,
+        })
+    except Exception as e:
+        result.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    end_time = time.time()
+    result["timings"] = {"wait": begin_time - submit_time if submit_time is not None else 0.0, "solve": end_time - begin_time}
+    result["worker"] = os.getpid()
+    return result
+
+def solve_batch(
+    jobs: Iterable[Dict[str, Any]],
+    workers: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL,
+    store_path: Optional[str] = None,
+    skip_ids: Optional[Set[Any]] = None,
+    schedule: str = "geometric",
+    neighborhood: str = "random",
+    checkpoint_dir: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    在进程池中求解 jobs 中的所有任务，每完成一个任务就返回它的结果（按完成的先后顺序）
+
+    参数:
+        jobs: 任务字典的迭代器，格式与 read_jobs 的返回值相同；按需读取，同时在队列中的任务不超过进程数的两倍；
+            带有 status 的项（无法解析的输入行）不求解，直接作为结果返回
+        workers: 进程数，为 None 时取 CPU 核数
+        time_limit: 每个任务的时间上限（秒），为 None 时不限制
+        routing_mode: 布线模式
+        store_path: 保存结果的 SQLite 数据库，见 solve_diagram_for_pd_code
+        skip_ids: 跳过这些 id 的任务（继续之前中断的批量求解）
+        schedule: 降温策略的名字，见 pd_to_diagram.make_schedule
+        neighborhood: 邻域的名字，见 pd_to_diagram.solve_diagram_for_pd_code
+        checkpoint_dir: 保存每个任务检查点的目录，为 None 时不写检查点；检查点在调用者写入结果之后由 remove_checkpoint 删除
+    """
+    workers = workers if workers is not None and workers > 0 else (os.cpu_count() or 1)
+    max_pending = 2 * workers
+    skip_ids = skip_ids if skip_ids is not None else set()
+    pending: Set[Future] = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 读取或提交任务时出现异常，先等已经提交的任务完成并返回它们的结果，再抛出异常，避免丢弃已经完成的计算
+        error: Optional[Exception] = None
+        try:
+            for job in jobs:
+                if job["id"] in skip_ids:
+                    continue
+                if "status" in job:
+                    yield job
+                    continue
+                pending.add(executor.submit(solve_job, job, time_limit, routing_mode, store_path, time.time(), schedule, neighborhood, checkpoint_dir))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        except Exception as e:
+            error = e
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        if error is not None:
+            raise error
+
+def remove_checkpoint(checkpoint_dir: Optional[str], job_id: Any) -> None:
+    if checkpoint_dir is None:
+        return
+    path = checkpoint_path_for(checkpoint_dir, job_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+def write_results(results: Iterable[Dict[str, Any]], fp: TextIO, checkpoint_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    每个结果写成一行 JSON 并立即刷新，返回成功、失败（不可行）和出错的任务数目
+    结果写入之后才删除任务的检查点，中途被打断时不会丢失已经完成的计算
+    """
+    counts = {"ok": 0, "infeasible": 0, "error": 0}
+    for result in results:
+        fp.write(json.dumps(result) + "\n")
+        fp.flush()
+        if result["status"] == "ok":
+            remove_checkpoint(checkpoint_dir, result["id"])
+        if result["status"] != "ok":
+            counts["error"] += 1
+        elif result["feasible"]:
+            counts["ok"] += 1
+        else:
+            counts["infeasible"] += 1
+    return counts
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="批量求解 JSONL 文件中的 pd_code")
+    parser.add_argument("input", nargs="?", default="-", help="输入文件，每行一个任务，缺省或为 - 时读取标准输入")
+    parser.add_argument("--output", "-o", default=None, help="结果输出文件，缺省时输出到标准输出")
+    parser.add_argument("--resume", action="store_true", help="跳过输出文件中已有结果的任务，并把新的结果追加到输出文件")
+    parser.add_argument("--retry-errors", action="store_true", help="继续时重新求解出错的任务")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--time-limit", type=float, default=None, help="每个任务的时间上限（秒）")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="输入中没有给出 seed 时使用的随机数种子")
+    parser.add_argument("--routing", choices=sorted(call_line_checker.ROUTING_MODES), default="sequential", help="布线模式")
+    parser.add_argument("--store", default=None, help="保存结果的 SQLite 数据库")
+    parser.add_argument("--schedule", choices=pd_to_diagram.SCHEDULE_NAMES, default="geometric", help="模拟退火的降温策略")
+    parser.add_argument("--neighborhood", choices=pd_to_diagram.NEIGHBORHOOD_NAMES, default="random", help="模拟退火的邻域")
+    parser.add_argument("--checkpoint-dir", default=None, help="保存每个任务检查点的目录，中断之后重新运行时从检查点继续")
+    args = parser.parse_args(argv)
+    if args.resume and args.output is None:
+        parser.error("--resume 需要指定 --output")
+
+    with contextlib.redirect_stdout(sys.stderr): # 编译信息不能混入结果
+        pd_to_diagram.auto_compile()
+
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    skip_ids = completed_ids(args.output, args.retry_errors) if args.resume else set()
+    if len(skip_ids) > 0:
+        print(f"跳过已经完成的 {len(skip_ids)} 个任务", file=sys.stderr)
+
+    begin_time = time.time()
+    input_fp = sys.stdin if args.input == "-" else open(args.input, "r")
+    if args.output is None:
+        output_fp = sys.stdout
+    else:
+        output_fp = open(args.output, "a" if args.resume else "w")
+        if args.resume and output_fp.tell() > 0: # 中断时最后一行可能没有写完，先换行再追加
+            with open(args.output, "rb") as fp:
+                fp.seek(-1, os.SEEK_END)
+                if fp.read(1) != b"\n":
+                    output_fp.write("\n")
+    try:
+        results = solve_batch(read_jobs(input_fp, args.seed), args.workers, args.time_limit,
+                              call_line_checker.ROUTING_MODES[args.routing], args.store, skip_ids,
+                              args.schedule, args.neighborhood, args.checkpoint_dir)
+        counts = write_results(results, output_fp, args.checkpoint_dir)
+    finally:
+        if input_fp is not sys.stdin:
+            input_fp.close()
+        if output_fp is not sys.stdout:
+            output_fp.close()
+    print("用时 %13.6f, 可行 %d, 不可行 %d, 出错 %d" % (time.time() - begin_time, counts["ok"], counts["infeasible"], counts["error"]), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
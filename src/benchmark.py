@@ -0,0 +1,299 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import call_line_checker
+import pd_to_diagram
+from constructive_init import constructive_initial_solution
+from get_int_list_input_from_dict import get_int_list_input_from_dict
+from layout import Layout
+from sa import SimulatedAnnealing
+
+# 性能测试：在固定的扭结语料上测量
+#   1. call_main_with_array 以及 SolverContext 每秒能计算多少次目标函数
+#   2. 模拟退火每次迭代中，除去 C++ 布线之外 Python 部分的耗时（与 solve_diagram_for_pd_code 一样使用 ContextObjective，
+#      另外单独测量一次直接调用 call_with_array* 的结果）
+#   3. gen_init 找到初始可行解所用的时间
+#   4. 固定随机数种子时，最优目标函数值随时间的变化曲线
+# 结果以 json 格式输出，其中记录了 git 版本号，便于比较不同提交之间的性能
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# pd_to_diagram.py 中 __main__ 部分使用的 pd_code
+MAIN_PD_CODES = {
+    "5_a": [[2, 8, 3, 7], [4, 10, 5, 9], [6, 2, 7, 1], [8, 4, 9, 3], [10, 6, 1, 5]],
+    "5_b": [[6, 1, 7, 2], [10, 7, 5, 8], [4, 5, 1, 6], [2, 10, 3, 9], [8, 4, 9, 3]],
+    "11":  [[6,1,7,2],[3,13,4,12],[7,21,8,20],[19,5,20,10],[13,19,14,22],[21,11,22,18],[17,15,18,14],[9,17,10,16],[15,9,16,8],[2,5,3,6],[11,1,12,4]],
+    "10":  [[6, 1, 7, 2], [14, 7, 15, 8], [4, 15, 1, 16], [10, 6, 11, 5], [8, 4, 9, 3], [18, 11, 19, 12], [20, 17, 5, 18], [12, 19, 13, 20], [16, 10, 17, 9], [2, 14, 3, 13]],
+}
+
+def torus_knot_pd_code(n: int) -> List[List[int]]:
+    """
+    (2, n) 环面扭结（n 为奇数）的 pd_code，共 n 个交叉点
+    """
+    def f(x: int) -> int:
+        return (x - 1) % (2 * n) + 1
+    return [[2 * k - 1, f(2 * k + n), 2 * k, f(2 * k + n - 1)] for k in range(1, n + 1)]
+
+def load_corpus(quick: bool = False) -> List[Dict[str, Any]]:
+    """
+    加载测试语料，每一项包含名字、pd_code，以及可选的布局数组（call_main_with_array 的输入格式）
+    没有给出布局的项使用构造性初始解作为布局
+    """
+    corpus = []
+    with open(os.path.join(SCRIPT_DIR, "sample_input.txt"), "r") as fp:
+        blocks = [block.split() for block in fp.read().split("=" * 20) if block.strip()]
+    for k, block in enumerate(blocks):
+        arr = list(map(int, block))
+        n = arr[1]
+        pd_code = [arr[2 + 7 * i + 3: 2 + 7 * i + 7] for i in range(n)]
+        corpus.append({"name": "sample_input[%d]" % k, "pd_code": pd_code, "arr": arr})
+
+    with open(os.path.join(SCRIPT_DIR, "sample_k3a1.json"), "r") as fp:
+        solution = json.load(fp)
+    corpus.append({"name": "sample_k3a1", "pd_code": solution["pd_code"], "arr": get_int_list_input_from_dict(solution)})
+
+    for name, pd_code in MAIN_PD_CODES.items():
+        corpus.append({"name": "main_" + name, "pd_code": pd_code, "arr": None})
+
+    for n in ([7] if quick else [7, 15, 21]):
+        corpus.append({"name": "torus_2_%d" % n, "pd_code": torus_knot_pd_code(n), "arr": None})
+
+    for case in corpus:
+        if case["arr"] is None:
+            solution, _ = constructive_initial_solution(case["pd_code"])
+            case["arr"] = get_int_list_input_from_dict(solution) # type: ignore
+    return corpus
+
+def git_revision() -> Optional[str]:
+    """
+    当前代码的 git 版本号，工作区有未提交的修改时加上 "-dirty"
+    """
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure_throughput(arr: List[int], min_time: float, pd_code: Optional[List[List[int]]] = None) -> Dict[str, Any]:
+    """
+    反复调用 call_main_with_array，至少运行 min_time 秒；给出 pd_code 时改为通过 SolverContext 计算同一个布局
+    """
+    buffer = np.array(arr, dtype=np.int32)
+    if pd_code is None:
+        evaluate = functools.partial(call_line_checker.get_line_checker().call_with_array, buffer)
+    else:
+        context, layout = call_line_checker.SolverContext(pd_code, arr[0]), Layout(buffer)
+        evaluate = functools.partial(context.evaluate, layout.pos, layout.direction)
+    value = evaluate() # 预热
+    count = 0
+    begin_time = time.perf_counter()
+    while True:
+        evaluate()
+        count += 1
+        elapsed = time.perf_counter() - begin_time
+        if elapsed >= min_time:
+            break
+    return {"value": value, "evaluations": count, "evals_per_sec": count / elapsed, "ms_per_eval": 1000 * elapsed / count}
+
+class TimedObjective:
+    """
+    记录目标函数（以及带上界的目标函数）的调用耗时与最优值随时间的变化，超过 budget 秒时抛出 BudgetExceeded 结束模拟退火
+
+    默认与 solve_diagram_for_pd_code 一样通过 ContextObjective 计算；one_shot 为真时直接调用
+    objective_function / bounded_objective_function（每次都把完整的布局数组传给 C++）
+    """
+    class BudgetExceeded(Exception):
+        pass
+
+    def __init__(self, pd_code: List[List[int]], grid_size: int, budget: float = math.inf, one_shot: bool = False):
+        if one_shot:
+            self.objective, self.bounded_objective = pd_to_diagram.objective_function, pd_to_diagram.bounded_objective_function
+        else:
+            context_objective = pd_to_diagram.ContextObjective(pd_code, grid_size)
+            self.objective, self.bounded_objective = context_objective, context_objective.bounded
+        self.budget = budget
+        self.begin_time = time.perf_counter()
+        self.objective_time = 0.0
+        self.calls = 0
+        self.best_value = math.inf
+        self.curve: List[List[float]] = []
+
+    def _record(self, function: Callable, *args) -> float:
+        begin_time = time.perf_counter()
+        if begin_time - self.begin_time > self.budget:
+            raise TimedObjective.BudgetExceeded()
+        value = function(*args)
+        end_time = time.perf_counter()
+        self.objective_time += end_time - begin_time
+        self.calls += 1
+        if value < self.best_value:
+            self.best_value = value
+            self.curve.append([end_time - self.begin_time, value])
+        return value
+
+    def __call__(self, solution: Any) -> float:
+        return self._record(self.objective, solution)
+
+    def bounded(self, solution: Any, ceiling: float) -> float:
+        return self._record(self.bounded_objective, solution, ceiling)
+
+def make_annealer(pd_code: List[List[int]], objective: TimedObjective, **kwargs) -> SimulatedAnnealing:
+    """
+    与 solve_diagram_for_pd_code 默认配置相同的模拟退火
+    """
+    return SimulatedAnnealing(objective, pd_to_diagram.layout_neighbor_generator, initial_temperature=4 * len(pd_code) * len(pd_code),
+                              seed=None, verbose=False, on_accept=Layout.commit, on_reject=Layout.undo, snapshot_function=Layout.copy,
+                              bounded_objective_function=objective.bounded, **kwargs)
+
+def measure_python_overhead(case: Dict[str, Any], iterations: int, one_shot: bool = False) -> Dict[str, Any]:
+    """
+    运行大约 iterations 次模拟退火迭代，总耗时减去目标函数的耗时即为 Python 部分的耗时；one_shot 的含义见 TimedObjective
+    """
+    pd_code = case["pd_code"]
+    objective = TimedObjective(pd_code, case["arr"][0], one_shot=one_shot)
+    equilibrium_iterations = 100
+    temperature_steps = max(1, iterations // equilibrium_iterations)
+    initial_temperature = 4 * len(pd_code) * len(pd_code)
+    cooling_rate = 0.95
+    sa = make_annealer(pd_code, objective, equilibrium_iterations=equilibrium_iterations, cooling_rate=cooling_rate,
+                       final_temperature=initial_temperature * cooling_rate ** temperature_steps * 1.0001)
+    random.seed(0)
+    pd_to_diagram.neighbor_generator_called_time = 0
+    begin_time = time.perf_counter()
+    sa.run(Layout(np.array(case["arr"], dtype=np.int32)))
+    elapsed = time.perf_counter() - begin_time
+    steps = sa.iterations * equilibrium_iterations
+    return {
+        "iterations": steps,
+        "total_us_per_iteration": 1e6 * elapsed / steps,
+        "objective_us_per_iteration": 1e6 * objective.objective_time / steps,
+        "python_us_per_iteration": 1e6 * (elapsed - objective.objective_time) / steps
+    }
+
+def measure_time_to_feasible(pd_code: List[List[int]], seed: int, use_constructive: bool,
+                             routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL) -> Dict[str, Any]:
+    """
+    gen_init 使用指定的布线模式找到初始解所用的时间，以及该初始解在该布线模式下是否可行
+    """
+    random.seed(seed)
+    begin_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution = pd_to_diagram.gen_init(pd_code, use_constructive=use_constructive, routing_mode=routing_mode)
+    elapsed = time.perf_counter() - begin_time
+    value = pd_to_diagram.objective_function(solution, routing_mode)
+    return {"seconds": elapsed, "value": value, "feasible": pd_to_diagram.is_feasible(solution, value)}
+
+def measure_quality_curve(pd_code: List[List[int]], seed: int, budget: float) -> Dict[str, Any]:
+    """
+    固定随机数种子，运行 budget 秒模拟退火（包括生成初始解），记录最优目标函数值随时间的变化
+    """
+    random.seed(seed)
+    pd_to_diagram.neighbor_generator_called_time = 0
+    begin_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        initial_solution = pd_to_diagram.gen_init(pd_code)
+    objective = TimedObjective(pd_code, initial_solution["grid_size"], budget)
+    objective.begin_time = begin_time # 时间预算与曲线的时刻都包括生成初始解的时间
+    sa = make_annealer(pd_code, objective)
+    try:
+        sa.run(Layout.from_dict(initial_solution))
+        finished = True
+    except TimedObjective.BudgetExceeded:
+        finished = False
+    return {"seed": seed, "finished": finished, "best_value": objective.best_value, "evaluations": objective.calls, "curve": objective.curve}
+
+def run_benchmark(quick: bool, min_time: float, iterations: int, budget: float, seeds: List[int], case_filter: Optional[str]) -> Dict[str, Any]:
+    corpus = [case for case in load_corpus(quick) if case_filter is None or case_filter in case["name"]]
+    result: Dict[str, Any] = {
+        "git_revision": git_revision(),
+        "timestamp": time.time(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {"quick": quick, "min_time": min_time, "iterations": iterations, "budget": budget, "seeds": seeds},
+        "cases": {}
+    }
+    for case in corpus:
+        print("正在测试 %s ...." % case["name"], flush=True)
+        n = len(case["pd_code"])
+        entry: Dict[str, Any] = {"crossing_number": n, "grid_size": case["arr"][0]}
+        entry["throughput"] = measure_throughput(case["arr"], min_time)
+        entry["context_throughput"] = measure_throughput(case["arr"], min_time, case["pd_code"])
+        entry["python_overhead"] = measure_python_overhead(case, iterations)
+        entry["python_overhead_one_shot"] = measure_python_overhead(case, iterations, one_shot=True)
+        if n >= 3: # 少于 3 个交叉点时无法构造初始解
+            # 两种布线模式分别测量，按顺序布线的结果使用原来的键名，协商布线的结果加上 negotiated_ 前缀
+            entry["time_to_feasible"] = {}
+            for prefix, routing_mode in [("", call_line_checker.ROUTING_SEQUENTIAL), ("negotiated_", call_line_checker.ROUTING_NEGOTIATED)]:
+                entry["time_to_feasible"][prefix + "constructive"] = measure_time_to_feasible(case["pd_code"], seeds[0], True, routing_mode)
+                if not quick or n <= 7: # 交叉点较多时随机采样通常要用完 MAX_RANDOM_TIME 次尝试
+                    entry["time_to_feasible"][prefix + "random"] = measure_time_to_feasible(case["pd_code"], seeds[0], False, routing_mode)
+            if not case["name"].startswith("sample_"): # 样例输入中的扭结与其他语料重复，不再测量优化曲线
+                entry["quality"] = [measure_quality_curve(case["pd_code"], seed, budget) for seed in seeds]
+        result["cases"][case["name"]] = entry
+    return result
+
+def print_time_to_feasible(result: Dict[str, Any]) -> None:
+    """
+    并排输出两种布线模式下 gen_init 找到初始解的时间以及初始解是否可行
+    """
+    print("%-18s %-14s %24s %24s" % ("case", "init", "sequential s (feasible)", "negotiated s (feasible)"))
+    for name, entry in result["cases"].items():
+        for init in ["constructive", "random"]:
+            sequential = entry.get("time_to_feasible", {}).get(init)
+            negotiated = entry.get("time_to_feasible", {}).get("negotiated_" + init)
+            if sequential is None or negotiated is None:
+                continue
+            print("%-18s %-14s %16.3f (%5s) %16.3f (%5s)" % (
+                name, init, sequential["seconds"], sequential["feasible"], negotiated["seconds"], negotiated["feasible"]))
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """
+    输出两次测试结果中吞吐量和 Python 开销的变化，两次结果都测量了 SolverContext 时再输出它的吞吐量
+    """
+    print("%-18s %14s %14s %8s %14s %14s %14s" % ("case", "old evals/s", "new evals/s", "ratio", "old py us/it", "new py us/it", "ctx evals/s"))
+    for name, entry in new["cases"].items():
+        if name not in old["cases"]:
+            continue
+        old_entry = old["cases"][name]
+        old_rate, new_rate = old_entry["throughput"]["evals_per_sec"], entry["throughput"]["evals_per_sec"]
+        context_rates = [e["context_throughput"]["evals_per_sec"] for e in (old_entry, entry) if "context_throughput" in e]
+        context_column = "%6.0f->%6.0f" % tuple(context_rates) if len(context_rates) == 2 else "%14s" % "-"
+        print("%-18s %14.1f %14.1f %8.2f %14.1f %14.1f %s" % (
+            name, old_rate, new_rate, new_rate / old_rate,
+            old_entry["python_overhead"]["python_us_per_iteration"], entry["python_overhead"]["python_us_per_iteration"], context_column))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pd_to_diagram 性能测试")
+    parser.add_argument("--output", default="benchmark.json", help="结果输出文件")
+    parser.add_argument("--quick", action="store_true", help="只测试较小的语料，并缩短测试时间")
+    parser.add_argument("--cases", default=None, help="只测试名字中包含该字符串的语料")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3], help="优化曲线使用的随机数种子")
+    parser.add_argument("--budget", type=float, default=None, help="每条优化曲线的时间预算（秒）")
+    parser.add_argument("--compare", default=None, help="与之前的测试结果进行比较")
+    args = parser.parse_args()
+
+    pd_to_diagram.auto_compile()
+    min_time, iterations, budget = (0.5, 500, 5.0) if args.quick else (2.0, 2000, 30.0)
+    if args.budget is not None:
+        budget = args.budget
+    result = run_benchmark(args.quick, min_time, iterations, budget, args.seeds, args.cases)
+    with open(args.output, "w") as fp:
+        json.dump(result, fp, indent=2)
+    print("结果已经写入 %s" % args.output)
+    print_time_to_feasible(result)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as fp:
+            compare(json.load(fp), result)
@@ -0,0 +1,157 @@
+import functools
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+try:
+    import fcntl # 只在类 Unix 系统上可用，用于避免多个进程同时编译同一个动态链接库
+except ImportError: # pragma: no cover
+    fcntl = None # type: ignore
+
+# 动态链接库的编译缓存：以 line_checker.cpp 的内容、编译器、编译选项以及 CPU 型号的哈希值为键，
+# 编译结果保存在缓存目录中，只有缓存中没有对应的文件时才编译
+#
+# 先编译到缓存目录中的临时文件，再用 os.replace 原子地改名，已经加载了旧文件的进程不受影响，也不会读到写了一半的文件；
+# 多个进程同时发现缓存缺失时，用文件锁保证只有一个进程在编译，其余进程等待之后直接使用编译结果
+#
+# 环境变量：
+#     PD_TO_DIAGRAM_LIB     直接指定动态链接库的路径，不使用缓存
+#     PD_TO_DIAGRAM_CACHE   缓存目录，默认为 $XDG_CACHE_HOME/pd_to_diagram（即 ~/.cache/pd_to_diagram）
+#     PD_TO_DIAGRAM_TARGET  编译目标，"native"（默认）或 "portable"
+#     CXX                   编译器，默认为 g++
+
+DIRNOW = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(DIRNOW, "line_checker.cpp")
+
+# 与 compile.sh 中编译动态链接库的选项相同，只是 -march 由编译目标决定
+COMMON_FLAGS = ["-shared", "-fPIC", "-O3", "-flto", "-fno-semantic-interposition", "-pthread",
+                "-funroll-loops", "-ftree-vectorize", "-fipa-pta"]
+
+# native 针对当前机器的 CPU 优化，只能在相同型号的 CPU 上使用；portable 不指定 -march，可以在集群中不同型号的机器之间共享
+TARGET_FLAGS: Dict[str, List[str]] = {
+    "native": ["-march=native"],
+    "portable": [],
+}
+DEFAULT_TARGET = "native"
+
+def cache_dir() -> str:
+    """
+    编译缓存所在的目录
+    """
+    if "PD_TO_DIAGRAM_CACHE" in os.environ:
+        return os.environ["PD_TO_DIAGRAM_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pd_to_diagram")
+
+def default_target() -> str:
+    return os.environ.get("PD_TO_DIAGRAM_TARGET", DEFAULT_TARGET)
+
+def compiler() -> str:
+    return os.environ.get("CXX", "g++")
+
+@functools.lru_cache(maxsize=None)
+def compiler_version(cxx: str) -> str:
+    """
+    编译器的版本信息（g++ --version 的第一行），编译器升级之后缓存自动失效
+    """
+    try:
+        result = subprocess.run([cxx, "--version"], capture_output=True, text=True)
+    except OSError:
+        return ""
+    return result.stdout.split("\n", 1)[0]
+
+@functools.lru_cache(maxsize=None)
+def cpu_signature() -> str:
+    """
+    描述当前 CPU 的字符串：体系结构、型号以及支持的指令集，-march=native 的编译结果只能在签名相同的机器上使用
+    """
+    signature = [platform.machine()]
+    try:
+        with open("/proc/cpuinfo", "r") as fp:
+            for line in fp:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key in ("model name", "flags", "Features", "CPU part"):
+                    signature.append(key + "=" + " ".join(sorted(value.split())))
+                elif key == "" and len(signature) > 1: # 只读取第一个处理器
+                    break
+    except OSError:
+        signature.append(platform.processor())
+    return "\n".join(signature)
+
+def build_key(target: str) -> str:
+    """
+    缓存的键：源文件内容、编译器及其版本、编译选项以及（native 目标时的）CPU 签名的 sha256
+    """
+    with open(SOURCE_PATH, "rb") as fp:
+        source_hash = hashlib.sha256(fp.read()).hexdigest()
+    cxx = compiler()
+    material = {
+        "source": source_hash,
+        "cxx": cxx,
+        "cxx_version": compiler_version(cxx),
+        "flags": COMMON_FLAGS + TARGET_FLAGS[target],
+        "cpu": cpu_signature() if target == "native" else platform.machine(),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+def cached_library_path(target: Optional[str] = None) -> str:
+    """
+    编译目标 target 对应的缓存文件路径（不检查文件是否存在）
+    """
+    target = target if target is not None else default_target()
+    return os.path.join(cache_dir(), "line_checker-%s-%s.so" % (target, build_key(target)[:16]))
+
+def build(output_path: str, target: str) -> None:
+    """
+    把 line_checker.cpp 编译到 output_path：先写入同一目录下的临时文件，再原子地改名
+    """
+    directory = os.path.dirname(output_path)
+    fd, temp_path = tempfile.mkstemp(prefix=".building-", suffix=".so", dir=directory)
+    os.close(fd)
+    try:
+        command = [compiler()] + COMMON_FLAGS + TARGET_FLAGS[target] + ["-o", temp_path, SOURCE_PATH]
+        print("compiling %s ..." % os.path.basename(output_path), file=sys.stderr)
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"编译失败: {result.stderr}")
+        os.chmod(temp_path, 0o755)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def library_path(target: Optional[str] = None, force: bool = False) -> str:
+    """
+    返回可以直接加载的动态链接库路径，缓存中没有时先编译
+
+    参数:
+        target: 编译目标，"native" 或 "portable"，为 None 时由环境变量 PD_TO_DIAGRAM_TARGET 决定
+        force: 为 True 时即使缓存中已有结果也重新编译
+    """
+    if "PD_TO_DIAGRAM_LIB" in os.environ and not force:
+        return os.environ["PD_TO_DIAGRAM_LIB"]
+    target = target if target is not None else default_target()
+    if target not in TARGET_FLAGS:
+        raise ValueError(f"未知的编译目标: {target}，可选的编译目标为 {sorted(TARGET_FLAGS)}")
+    path = cached_library_path(target)
+    if os.path.isfile(path) and not force:
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "w") as lock_fp:
+        if fcntl is not None:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+        # 等待锁的过程中其他进程可能已经编译好了
+        if force or not os.path.isfile(path):
+            build(path, target)
+    return path
+
+if __name__ == "__main__":
+    for target in TARGET_FLAGS:
+        print(target, library_path(target))
@@ -1,12 +1,57 @@
 import ctypes
+import math
 import os
 import numpy as np
 import functools
 import warnings
+from typing import Any, Dict, List, Tuple, Union
+from get_int_list_input_from_dict import get_int_list_input_from_dict
+import build_cache
 
 # 当前文件所在目录
 DIRNOW = os.path.dirname(os.path.abspath(__file__))
-LIBPATH = os.path.join(DIRNOW, "line_checker.so")
+LIBPATH = os.path.join(DIRNOW, "line_checker.so") # compile.sh 的输出，LineChecker 默认加载的是编译缓存中的文件，见 build_cache.py
+
+# 单条连线的统计信息，与 line_checker.cpp 中的 struct RouteStats 内存布局一致
+ROUTE_STATS_DTYPE = np.dtype([
+    ("socket", np.int32),          # 弧线编号
+    ("status", np.int32),          # 见 ROUTE_STATUS
+    ("nodes_popped", np.int64),    # A* 从堆中弹出的节点数目
+    ("nodes_pushed", np.int64),    # A* 压入堆中的节点数目
+    ("peak_heap", np.int64),       # 堆的最大大小
+    ("peak_container", np.int64),  # 节点容器的最大大小
+    ("length", np.float64),        # 连线长度，失败时为 inf
+    ("seconds", np.float64),       # 布线用时
+], align=True)
+
+# RouteStats.status 的取值
+ROUTE_STATUS = ["ok", "unreachable", "over_budget", "skipped"]
+ROUTE_OK, ROUTE_UNREACHABLE, ROUTE_OVER_BUDGET, ROUTE_SKIPPED = range(4)
+
+# 求解状态，与 line_checker.cpp 中的 enum SolveStatus 一致
+SOLVE_STATUS = ["unsolved", "fail", "success", "abort", "invalid"]
+STATUS_UNSOLVED, STATUS_FAIL, STATUS_SUCCESS, STATUS_ABORT, STATUS_INVALID = range(5)
+
+# 布线模式，与 line_checker.cpp 中的 enum RoutingMode 一致
+# ROUTING_SEQUENTIAL：按照距离从远到近依次布线，已经布好的连线成为之后连线的障碍物
+# ROUTING_NEGOTIATED：先按顺序布线，再让失败的连线穿过挡路的连线并拆除、重布被穿过的连线（协商拥塞），保留迭代中最好的结果
+ROUTING_SEQUENTIAL, ROUTING_NEGOTIATED = range(2)
+ROUTING_MODES = {"sequential": ROUTING_SEQUENTIAL, "negotiated": ROUTING_NEGOTIATED}
+
+def summarize_route_stats(stats: np.ndarray) -> Dict[str, float]:
+    """
+    将一次求解中每条连线的统计信息汇总为一个字典，键以 peak_ 开头的取最大值，其余为求和
+    """
+    return {
+        "evaluations": 1,
+        "nodes_popped": int(stats["nodes_popped"].sum()),
+        "nodes_pushed": int(stats["nodes_pushed"].sum()),
+        "peak_heap": int(stats["peak_heap"].max(initial=0)),
+        "peak_container": int(stats["peak_container"].max(initial=0)),
+        "failed_wires": int((stats["status"] == ROUTE_UNREACHABLE).sum()),
+        "aborted": int(bool((stats["status"] >= ROUTE_OVER_BUDGET).any())),
+        "route_seconds": float(stats["seconds"].sum())
+    }
 
 def warn_first_call(message: str):
     """
@@ -29,18 +74,21 @@ def warn_first_call(message: str):
     return decorator
 
 class LineChecker:
-    def __init__(self):
+    def __init__(self, lib_path: "str | None" = None):
         """
         初始化 LineChecker 实例，加载动态链接库
         
         参数:
-            lib_path: 编译好的 C++ 动态链接库路径（如 .so, .dll, .dylib）
+            lib_path: 编译好的 C++ 动态链接库路径（如 .so, .dll, .dylib），为 None 时使用编译缓存中的文件（缓存缺失时先编译）
         """
         # 加载动态链接库
-        if not os.path.exists(LIBPATH):
-            raise FileNotFoundError(f"动态链接库不存在: {LIBPATH}")
+        if lib_path is None:
+            lib_path = build_cache.library_path()
+        if not os.path.exists(lib_path):
+            raise FileNotFoundError(f"动态链接库不存在: {lib_path}")
         
-        self.lib = ctypes.CDLL(LIBPATH)
+        self.lib_path = lib_path
+        self.lib = ctypes.CDLL(lib_path)
         
         # 定义 call_main 函数的参数和返回值类型
         # 函数原型：extern int call_main(char* filename)
@@ -55,6 +103,122 @@ class LineChecker:
         ]
         self.lib.call_main_with_array.restype = ctypes.c_double
 
+        # 定义 call_main_with_array_mode 函数的参数和返回值类型
+        # 函数原型：extern double call_main_with_array_mode(int* arr, int cnt, int mode)
+        self.lib.call_main_with_array_mode.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_int
+        ]
+        self.lib.call_main_with_array_mode.restype = ctypes.c_double
+
+        # 定义 call_main_with_array_bounded 函数的参数和返回值类型
+        # 函数原型：extern double call_main_with_array_bounded(int* arr, int cnt, double ceiling)
+        self.lib.call_main_with_array_bounded.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_double
+        ]
+        self.lib.call_main_with_array_bounded.restype = ctypes.c_double
+
+        # 定义 call_main_with_array_stats 函数的参数和返回值类型
+        # 函数原型：extern double call_main_with_array_stats(int* arr, int cnt, double ceiling, RouteStats* out, int capacity)
+        self.lib.call_main_with_array_stats.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_double,
+            np.ctypeslib.ndpointer(dtype=ROUTE_STATS_DTYPE, flags='C_CONTIGUOUS'),
+            ctypes.c_int
+        ]
+        self.lib.call_main_with_array_stats.restype = ctypes.c_double
+
+        # 定义 call_main_with_batch 函数的参数和返回值类型
+        # 函数原型：extern void call_main_with_batch(int* arr, int* offsets, int k, double* out, int nthreads)
+        self.lib.call_main_with_batch.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS'),
+            ctypes.c_int
+        ]
+        self.lib.call_main_with_batch.restype = None
+
+        # 定义 call_main_with_batch_mode 函数的参数和返回值类型
+        # 函数原型：extern void call_main_with_batch_mode(int* arr, int* offsets, int k, double* out, int nthreads, int mode)
+        self.lib.call_main_with_batch_mode.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_int
+        ]
+        self.lib.call_main_with_batch_mode.restype = None
+
+        # 定义 call_main_with_array_geometry 函数的参数和返回值类型
+        # 函数原型：extern double call_main_with_array_geometry(int* arr, int cnt, int mode, int* arc_offsets, int* points, int point_capacity, int* crossings, int* point_count)
+        self.lib.call_main_with_array_geometry.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_int,
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.POINTER(ctypes.c_int)
+        ]
+        self.lib.call_main_with_array_geometry.restype = ctypes.c_double
+
+        # 定义增量求解器相关函数的参数和返回值类型，handle 是 C++ 中 IncrementalSolver 对象的指针
+        self.lib.incremental_create.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int
+        ]
+        self.lib.incremental_create.restype = ctypes.c_void_p
+        self.lib.incremental_propose.argtypes = [
+            ctypes.c_void_p,
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int
+        ]
+        self.lib.incremental_propose.restype = ctypes.c_double
+        for func_name in ["incremental_commit", "incremental_rollback", "incremental_destroy"]:
+            getattr(self.lib, func_name).argtypes = [ctypes.c_void_p]
+            getattr(self.lib, func_name).restype = None
+        self.lib.incremental_current_length.argtypes = [ctypes.c_void_p]
+        self.lib.incremental_current_length.restype = ctypes.c_double
+        self.lib.incremental_last_exact.argtypes = [ctypes.c_void_p]
+        self.lib.incremental_last_exact.restype = ctypes.c_int
+
+        # 定义求解上下文相关函数的参数和返回值类型，context 是 C++ 中 SolverContext 对象的指针
+        # positions、directions 按照步长读取，直接传入数组（或视图）首元素的地址，见 SolverContext.evaluate
+        self.lib.create_context.argtypes = [
+            np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS'),
+            ctypes.c_int,
+            ctypes.c_int
+        ]
+        self.lib.create_context.restype = ctypes.c_void_p
+        self.lib.context_evaluate.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p, ctypes.c_int,
+            ctypes.c_void_p, ctypes.c_int,
+            ctypes.c_double,
+            ctypes.c_int
+        ]
+        self.lib.context_evaluate.restype = ctypes.c_double
+        self.lib.context_evaluate_stats.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p, ctypes.c_int,
+            ctypes.c_void_p, ctypes.c_int,
+            ctypes.c_double,
+            np.ctypeslib.ndpointer(dtype=ROUTE_STATS_DTYPE, flags='C_CONTIGUOUS'),
+            ctypes.c_int
+        ]
+        self.lib.context_evaluate_stats.restype = ctypes.c_double
+        self.lib.context_status.argtypes = [ctypes.c_void_p]
+        self.lib.context_status.restype = ctypes.c_int
+        self.lib.destroy_context.argtypes = [ctypes.c_void_p]
+        self.lib.destroy_context.restype = None
+
     @warn_first_call("LineChecker.call is deprecated since it sometimes trigger OS Error: Open Too Many Files")
     def call(self, file_path: str) -> float:
         """
@@ -92,6 +256,286 @@ class LineChecker:
         result = self.lib.call_main_with_array(arr, len(arr))
         return float(result)
 
+    def call_with_array_mode(self, arr: np.ndarray, mode: int = ROUTING_SEQUENTIAL) -> float:
+        """
+        调用 C++ 中的 call_main_with_array_mode 函数，使用指定的布线模式
+
+        参数:
+            arr: 输入的 numpy 数组，格式与 call_with_array 相同
+            mode: ROUTING_SEQUENTIAL 或 ROUTING_NEGOTIATED，前者与 call_with_array 完全相同
+
+        返回:
+            处理结果的浮点数表示
+        """
+        arr = np.ascontiguousarray(arr, dtype=np.int32)
+        return float(self.lib.call_main_with_array_mode(arr, len(arr), mode))
+
+    def call_with_array_bounded(self, arr: np.ndarray, ceiling: float) -> float:
+        """
+        调用 C++ 中的 call_main_with_array_bounded 函数，目标函数值一定超过 ceiling 时提前停止布线
+
+        参数:
+            arr: 输入的 numpy 数组，格式与 call_with_array 相同
+            ceiling: 目标函数值的上界
+
+        返回:
+            没有提前停止时与 call_with_array 的返回值完全相同，提前停止时返回 math.inf
+        """
+        arr = np.ascontiguousarray(arr, dtype=np.int32)
+        return float(self.lib.call_main_with_array_bounded(arr, len(arr), ceiling))
+
+    def call_with_stats(self, arr: np.ndarray, ceiling: float = math.inf) -> Tuple[float, np.ndarray]:
+        """
+        调用 C++ 中的 call_main_with_array_stats 函数，同时返回每条连线的统计信息
+
+        参数:
+            arr: 输入的 numpy 数组，格式与 call_with_array 相同
+            ceiling: 目标函数值的上界，含义与 call_with_array_bounded 相同，默认不设上界
+
+        返回:
+            目标函数值，以及按照布线顺序排列的统计信息（dtype 为 ROUTE_STATS_DTYPE 的结构化数组，长度为 2 * crossing_number）
+        """
+        arr = np.ascontiguousarray(arr, dtype=np.int32)
+        stats = np.zeros(2 * int(arr[1]), dtype=ROUTE_STATS_DTYPE)
+        value = float(self.lib.call_main_with_array_stats(arr, len(arr), ceiling, stats, len(stats)))
+        return value, stats
+
+    def call_with_geometry(self, arr: np.ndarray, mode: int = ROUTING_SEQUENTIAL,
+                           buffers: "Dict[str, np.ndarray] | None" = None) -> Tuple[float, Dict[str, np.ndarray]]:
+        """
+        调用 C++ 中的 call_main_with_array_geometry 函数，C++ 直接把布线结果的几何信息写入 numpy 数组
+
+        参数:
+            arr: 输入的 numpy 数组，格式与 call_with_array 相同
+            mode: 布线模式
+            buffers: geometry_buffers 分配的数组，批量导出时可以重复使用同一组数组；为 None 时按照 arr 的大小新分配
+
+        返回:
+            目标函数值，以及几何信息字典（其中的数组是 buffers 中数组的视图）：
+                arc_offsets: int32[2N + 1]，弧线 v（编号从 1 开始）的点为 points[arc_offsets[v - 1]:arc_offsets[v]]
+                points: int32[点数, 2]，每条弧线从一端交叉点的中心出发，经过插头和连线到达另一端交叉点的中心，连线失败的弧线没有点
+                crossings: int32[N, 4]，每个交叉点的 x, y, 朝向，以及从下方穿过的弧线的方向（0 表示沿 x 轴，1 表示沿 y 轴）
+                grid_size: 网格大小（0 维数组）
+        """
+        arr = np.ascontiguousarray(arr, dtype=np.int32)
+        grid_size, crossing_number = int(arr[0]), int(arr[1])
+        if buffers is None:
+            buffers = geometry_buffers(grid_size, crossing_number)
+        arc_offsets, points, crossings = buffers["arc_offsets"], buffers["points"], buffers["crossings"]
+        if len(arc_offsets) < 2 * crossing_number + 1 or len(crossings) < crossing_number:
+            raise ValueError(f"缓冲区太小，无法容纳 {crossing_number} 个交叉点")
+        point_count = ctypes.c_int(0)
+        value = float(self.lib.call_main_with_array_geometry(arr, len(arr), mode, arc_offsets, points, len(points), crossings, ctypes.byref(point_count)))
+        if point_count.value > len(points):
+            raise ValueError(f"缓冲区太小，需要 {point_count.value} 个点，只能容纳 {len(points)} 个点")
+        return value, {
+            "arc_offsets": arc_offsets[:2 * crossing_number + 1],
+            "points": points[:point_count.value],
+            "crossings": crossings[:crossing_number],
+            "grid_size": np.array(grid_size),
+        }
+
+    def call_batch(self, solutions: List[Union[Dict[str, Any], np.ndarray]], nthreads: int = 0, mode: int = ROUTING_SEQUENTIAL) -> np.ndarray:
+        """
+        调用 C++ 中的 call_main_with_batch_mode 函数，一次计算多个布局的目标函数值
+
+        所有布局被打包进一个连续的 int32 数组，C++ 中使用多个线程并行计算，
+        ctypes 在调用期间会释放 GIL
+
+        参数:
+            solutions: 布局列表，每个布局可以是 solution 字典，也可以是 call_with_array 的输入数组
+            nthreads: 使用的线程数目，小于等于 0 时使用所有可用的硬件线程
+            mode: 布线模式，见 call_with_array_mode
+
+        返回:
+            与 solutions 一一对应的目标函数值，类型为 float64 的 numpy 数组
+        """
+        out = np.empty(len(solutions), dtype=np.float64)
+        if len(solutions) == 0:
+            return out
+
+        arrays = [
+            np.asarray(get_int_list_input_from_dict(solution) if isinstance(solution, dict) else solution, dtype=np.int32).reshape(-1)
+            for solution in solutions
+        ]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int32)
+        np.cumsum([len(arr) for arr in arrays], out=offsets[1:])
+        packed = np.ascontiguousarray(np.concatenate(arrays), dtype=np.int32)
+
+        self.lib.call_main_with_batch_mode(packed, offsets, len(arrays), out, nthreads, mode)
+        return out
+
+def geometry_buffers(grid_size: int, crossing_number: int) -> Dict[str, np.ndarray]:
+    """
+    为 LineChecker.call_with_geometry 分配数组，容量对于不超过 grid_size 的网格和不超过 crossing_number 个交叉点的布局一定足够
+    """
+    return {
+        "arc_offsets": np.zeros(2 * crossing_number + 1, dtype=np.int32),
+        "points": np.zeros((grid_size * grid_size + 4 * crossing_number, 2), dtype=np.int32),
+        "crossings": np.zeros((crossing_number, 4), dtype=np.int32),
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_line_checker() -> LineChecker:
+    """
+    获取当前进程中共享的 LineChecker 实例，只在第一次调用时加载动态链接库
+    编译缓存命中时只需要计算一次源文件的哈希值，进程池中的子进程启动时不会重新编译
+    """
+    return LineChecker()
+
+class IncrementalEvaluator:
+    """
+    增量求解器：保存当前布局的完整布线结果，每次只移动少量交叉点
+
+    移动之后只会拆除与被移动交叉点相连的连线，以及挡住交叉点新位置的连线，再为它们重新布线。
+    每次 propose 之后必须调用 commit 或者 rollback。
+    """
+    def __init__(self, arr: np.ndarray, line_checker: "LineChecker | None" = None):
+        """
+        参数:
+            arr: 完整布局，格式与 call_with_array 的输入相同
+            line_checker: 用于调用动态链接库的 LineChecker 实例，为 None 时新建一个
+        """
+        self.line_checker = line_checker if line_checker is not None else get_line_checker()
+        self.lib = self.line_checker.lib
+        arr = np.ascontiguousarray(arr, dtype=np.int32)
+        self.handle = self.lib.incremental_create(arr, len(arr))
+
+    def propose(self, moves: list) -> float:
+        """
+        尝试移动若干个交叉点
+
+        参数:
+            moves: 移动列表，每一项为 (交叉点下标, 新位置 x, 新位置 y, 新朝向)，交叉点下标从 0 开始
+
+        返回:
+            移动之后的目标函数值；移动不合法（下标越界、交叉点越界或者与其他交叉点重叠）时抛出 ValueError，
+            此时状态保持不变，不需要调用 commit 或者 rollback
+        """
+        arr = np.ascontiguousarray(moves, dtype=np.int32).reshape(-1)
+        value = float(self.lib.incremental_propose(self.handle, arr, len(arr) // 4))
+        if math.isnan(value):
+            raise ValueError(f"移动不合法：{moves}")
+        return value
+
+    def commit(self) -> None:
+        """保留最近一次移动"""
+        self.lib.incremental_commit(self.handle)
+
+    def rollback(self) -> None:
+        """撤销最近一次移动"""
+        self.lib.incremental_rollback(self.handle)
+
+    @property
+    def current_value(self) -> float:
+        """当前布线结果的目标函数值"""
+        return float(self.lib.incremental_current_length(self.handle))
+
+    @property
+    def last_proposal_is_exact(self) -> bool:
+        """最近一次 propose 的结果是否保证与 call_with_array 的结果完全一致"""
+        return bool(self.lib.incremental_last_exact(self.handle))
+
+    def close(self) -> None:
+        """释放 C++ 中的求解器对象"""
+        if self.handle is not None:
+            self.lib.incremental_destroy(self.handle)
+            self.handle = None
+
+    def __del__(self):
+        self.close()
+
+class SolverContext:
+    """
+    可以重复使用的求解上下文：pd_code 和 grid_size 只在创建时解析、检查一次，之后每次只传入交叉点的位置和朝向
+
+    C++ 中的棋盘数组、A* 的节点容器与堆都在多次求解之间复用，按顺序布线时每次求解几乎不需要申请内存；
+    结果与对同一个布局调用 call_with_array_bounded / call_with_array_mode / call_with_stats 完全相同。
+    同一个上下文同一时间只能被一个线程使用。
+    """
+    def __init__(self, pd_code: Any, grid_size: int, line_checker: "LineChecker | None" = None):
+        """
+        参数:
+            pd_code: 扭结的 pd_code，N 个四元组
+            grid_size: 网格大小
+            line_checker: 用于调用动态链接库的 LineChecker 实例，为 None 时使用进程内共享的实例
+        """
+        self.line_checker = line_checker if line_checker is not None else get_line_checker()
+        self.lib = self.line_checker.lib
+        self.handle = None
+        pd_array = np.ascontiguousarray(pd_code, dtype=np.int32).reshape(-1)
+        self.crossing_number = len(pd_array) // 4
+        self.grid_size = int(grid_size)
+        handle = self.lib.create_context(pd_array, self.crossing_number, self.grid_size)
+        if not handle:
+            raise ValueError(f"pd_code 不合法: {pd_code}")
+        self.handle = handle
+
+    def _strided(self, positions: np.ndarray, directions: np.ndarray) -> Tuple[int, int, int, int]:
+        """
+        检查 positions（int32[N, 2]）与 directions（int32[N]）的形状，返回首元素地址与步长（以 int32 为单位）
+        """
+        if positions.shape != (self.crossing_number, 2) or directions.shape != (self.crossing_number,):
+            raise ValueError(f"positions 的形状应为 ({self.crossing_number}, 2)，directions 的形状应为 ({self.crossing_number},)")
+        itemsize = np.dtype(np.int32).itemsize
+        if (positions.strides[1] != itemsize or positions.strides[0] % itemsize != 0 or directions.strides[0] % itemsize != 0
+                or positions.strides[0] <= 0 or directions.strides[0] <= 0):
+            raise ValueError("positions 与 directions 的步长必须是 int32 大小的正整数倍")
+        return positions.ctypes.data, positions.strides[0] // itemsize, directions.ctypes.data, directions.strides[0] // itemsize
+
+    @staticmethod
+    def _as_int32(arr: Any) -> np.ndarray:
+        # Layout 的 pos、direction 视图已经是 int32，直接使用；其他输入转换为 int32 数组
+        if isinstance(arr, np.ndarray) and arr.dtype == np.int32:
+            return arr
+        return np.ascontiguousarray(arr, dtype=np.int32)
+
+    def evaluate(self, positions: Any, directions: Any, ceiling: float = math.inf, mode: int = ROUTING_SEQUENTIAL) -> float:
+        """
+        求解一个布局
+
+        参数:
+            positions: 每个交叉点的位置，int32[N, 2]，可以是 Layout.pos 这样的视图
+            directions: 每个交叉点的朝向，int32[N]，可以是 Layout.direction 这样的视图
+            ceiling: 目标函数值的上界，含义与 call_with_array_bounded 相同（协商布线时忽略）
+            mode: 布线模式
+
+        返回:
+            目标函数值，提前停止时为 math.inf；布局不合法时抛出 ValueError
+        """
+        positions, directions = self._as_int32(positions), self._as_int32(directions)
+        pos_ptr, pos_stride, dir_ptr, dir_stride = self._strided(positions, directions)
+        value = float(self.lib.context_evaluate(self.handle, pos_ptr, pos_stride, dir_ptr, dir_stride, ceiling, mode))
+        if math.isnan(value):
+            raise ValueError("布局不合法：交叉点越界或者互相重叠")
+        return value
+
+    def evaluate_stats(self, positions: Any, directions: Any, ceiling: float = math.inf) -> Tuple[float, np.ndarray]:
+        """
+        与 evaluate 相同（按顺序布线），同时返回每条连线的统计信息，格式与 call_with_stats 相同
+        """
+        positions, directions = self._as_int32(positions), self._as_int32(directions)
+        pos_ptr, pos_stride, dir_ptr, dir_stride = self._strided(positions, directions)
+        stats = np.zeros(2 * self.crossing_number, dtype=ROUTE_STATS_DTYPE)
+        value = float(self.lib.context_evaluate_stats(self.handle, pos_ptr, pos_stride, dir_ptr, dir_stride, ceiling, stats, len(stats)))
+        if math.isnan(value):
+            raise ValueError("布局不合法：交叉点越界或者互相重叠")
+        return value, stats
+
+    @property
+    def status(self) -> str:
+        """最近一次求解的状态，见 SOLVE_STATUS"""
+        return SOLVE_STATUS[self.lib.context_status(self.handle)]
+
+    def close(self) -> None:
+        """释放 C++ 中的求解上下文"""
+        if self.handle is not None:
+            self.lib.destroy_context(self.handle)
+            self.handle = None
+
+    def __del__(self):
+        self.close()
+
 if __name__ == "__main__":
     lc = LineChecker()
     
@@ -103,3 +547,69 @@ if __name__ == "__main__":
         print(f"call_with_array 方法返回结果: {result}")
     except Exception as e:
         print(f"调用 call_with_array 方法失败: {e}")
+
+    # 检查批量计算：结果需要与逐个计算的结果完全相同
+    sample_arr = np.array([51,5,11,36,2,6,1,7,2,13,37,1,10,7,5,8,12,34,3,4,5,1,6,14,39,2,2,10,3,9,16,37,3,8,4,9,3], dtype=np.int32)
+    arr = np.array([51,5,46,39,0,6,1,7,2,29,16,3,10,7,5,8,10,3,2,4,5,1,6,25,37,2,2,10,3,9,9,31,0,8,4,9,3], dtype=np.int32)
+    batch_result = lc.call_batch([sample_arr, arr, sample_arr], nthreads=2)
+    assert batch_result.tolist() == [lc.call_with_array(sample_arr), lc.call_with_array(arr), lc.call_with_array(sample_arr)]
+    print(f"call_batch 方法返回结果: {batch_result}")
+
+    # 检查增量求解器：在能够保证与完整求解一致的情况下，两者的结果必须完全相同
+    # 交叉点挤在一起时几乎所有连线都会互相影响，因此这里使用一个分散的可行布局，并以小范围移动为主
+    import random
+    rng = random.Random(0)
+    grid_size, crossing_number = int(arr[0]), int(arr[1])
+    layout = arr[2:].reshape(crossing_number, 7).copy()  # 每一行：x, y, 朝向, pd_code
+    evaluator = IncrementalEvaluator(arr, lc)
+    assert evaluator.current_value == lc.call_with_array(arr)
+    exact_count = 0
+    for _ in range(2000):
+        moves = []
+        new_layout = layout.copy()
+        radius = rng.choice([1, 2, 3, grid_size])
+        for i in rng.sample(range(crossing_number), rng.randint(1, 2)):
+            x = min(max(int(layout[i, 0]) + rng.randint(-radius, radius), 2), grid_size - 1)
+            y = min(max(int(layout[i, 1]) + rng.randint(-radius, radius), 2), grid_size - 1)
+            d = rng.randint(0, 3) if rng.random() < 0.2 else int(layout[i, 2])
+            new_layout[i, :3] = [x, y, d]
+            moves.append((i, x, y, d))
+        if min(abs(int(new_layout[i, 0] - new_layout[j, 0])) + abs(int(new_layout[i, 1] - new_layout[j, 1]))
+               for i in range(crossing_number) for j in range(i)) < 3:
+            continue  # 交叉点之间存在重叠
+        value_before = evaluator.current_value
+        value = evaluator.propose(moves)
+        if evaluator.last_proposal_is_exact:
+            exact_count += 1
+            full_value = lc.call_with_array(np.concatenate([arr[:2], new_layout.reshape(-1)]))
+            assert value == full_value, (value, full_value)
+        if evaluator.last_proposal_is_exact and rng.random() < 0.5:
+            evaluator.commit()
+            layout = new_layout
+        else:
+            evaluator.rollback()
+            assert evaluator.current_value == value_before
+    evaluator.close()
+    print(f"增量求解器检查通过，其中 {exact_count} 次移动与完整求解结果逐一比对")
+
+    # 检查求解上下文：同一个上下文依次求解多个布局，结果必须与每次重新解析的一次性调用完全相同
+    context = SolverContext(arr[2:].reshape(crossing_number, 7)[:, 3:7], grid_size, lc)
+    context_count = 0
+    for _ in range(500):
+        new_layout = arr[2:].reshape(crossing_number, 7).copy()
+        new_layout[:, 0] = [rng.randint(2, grid_size - 1) for _ in range(crossing_number)]
+        new_layout[:, 1] = [rng.randint(2, grid_size - 1) for _ in range(crossing_number)]
+        new_layout[:, 2] = [rng.randint(0, 3) for _ in range(crossing_number)]
+        if min(abs(int(new_layout[i, 0] - new_layout[j, 0])) + abs(int(new_layout[i, 1] - new_layout[j, 1]))
+               for i in range(crossing_number) for j in range(i)) < 3:
+            continue
+        full_arr = np.concatenate([arr[:2], new_layout.reshape(-1)])
+        ceiling = rng.choice([math.inf, 100.0, 1000.0, 10000.0])
+        assert context.evaluate(new_layout[:, 0:2], new_layout[:, 2], ceiling) == lc.call_with_array_bounded(full_arr, ceiling)
+        assert context.evaluate(new_layout[:, 0:2], new_layout[:, 2], mode=ROUTING_NEGOTIATED) == lc.call_with_array_mode(full_arr, ROUTING_NEGOTIATED)
+        context_value, context_stats = context.evaluate_stats(new_layout[:, 0:2], new_layout[:, 2], ceiling)
+        value, stats = lc.call_with_stats(full_arr, ceiling)
+        assert context_value == value and np.array_equal(context_stats[["socket", "status", "nodes_popped", "length"]], stats[["socket", "status", "nodes_popped", "length"]])
+        context_count += 1
+    context.close()
+    print(f"求解上下文检查通过，共比对 {context_count} 个布局")
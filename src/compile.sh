@@ -8,11 +8,11 @@ SCRIPT_DIR="$(dirname "$SCRIPT_PATH")"
 cd "$SCRIPT_DIR" || exit
 
 # 优化编译：得到动态链接库
-g++ -shared -fPIC -O3 -march=native -flto -fno-semantic-interposition \
+g++ -shared -fPIC -O3 -march=native -flto -fno-semantic-interposition -pthread \
     -funroll-loops -ftree-vectorize \
     -fipa-pta -o line_checker.so line_checker.cpp 
 
 # 优化编译：得到可执行文件
-g++ -O3 -march=native -flto -fno-semantic-interposition \
+g++ -O3 -march=native -flto -fno-semantic-interposition -pthread \
     -funroll-loops -ftree-vectorize \
     -fipa-pta -o line_checker line_checker.cpp 
@@ -0,0 +1,223 @@
+import math
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# 根据 pd_code 中交叉点之间的连接关系，构造性地生成初始布局
+# 基本思想：
+#   1. pd_code 中每个交叉点的四个插头按照逆时针顺序记录，这恰好给出了四度平面图的旋转系统，可以据此求出所有的面
+#   2. 选择最大的面作为外部面，放在圆周上，内部交叉点放在邻居的重心位置（Tutte 嵌入），得到没有交叉的直线画法
+#   3. 将坐标映射并吸附到网格上，每个交叉点选择让四个插头尽量朝向对应邻居的方向
+# 对于每种布局方式，还会尝试镜像以及按照坐标排名拉伸等变体，全部候选布局批量交给 C++ 计算目标函数值，取最优者
+
+# 与 line_checker.cpp 中 DIR_DX、DIR_DY 的顺序保持一致：东、北、西、南
+DIR_VECTORS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.float64)
+
+def get_arc_ends(pd_code: List[List[int]]) -> Dict[int, List[Tuple[int, int]]]:
+    """
+    记录每个弧线编号的两个端点：(交叉点下标, 插头下标)
+    """
+    arc_ends: Dict[int, List[Tuple[int, int]]] = {}
+    for i, crossing in enumerate(pd_code):
+        for j, label in enumerate(crossing):
+            arc_ends.setdefault(label, []).append((i, j))
+    return arc_ends
+
+def get_adjacency(pd_code: List[List[int]]) -> np.ndarray:
+    """
+    交叉点之间的邻接矩阵，两个交叉点之间有几条弧线，对应的值就是几（忽略自环）
+    """
+    n = len(pd_code)
+    adjacency = np.zeros((n, n), dtype=np.float64)
+    for ends in get_arc_ends(pd_code).values():
+        (i1, _), (i2, _) = ends
+        if i1 != i2:
+            adjacency[i1, i2] += 1
+            adjacency[i2, i1] += 1
+    return adjacency
+
+def get_faces(pd_code: List[List[int]]) -> List[List[int]]:
+    """
+    根据旋转系统求出平面图的所有面，每个面记录为沿边界经过的交叉点下标序列
+
+    沿着弧线 (i, j) -> (i', j') 到达交叉点 i' 之后，顺时针转到下一个插头 (i', j' - 1) 继续前进
+    """
+    arc_ends = get_arc_ends(pd_code)
+    def other_end(i: int, j: int) -> Tuple[int, int]:
+        ends = arc_ends[pd_code[i][j]]
+        return ends[1] if ends[0] == (i, j) else ends[0]
+
+    visited = set()
+    faces = []
+    for i in range(len(pd_code)):
+        for j in range(4):
+            if (i, j) in visited:
+                continue
+            face = []
+            dart = (i, j)
+            while dart not in visited:
+                visited.add(dart)
+                face.append(dart[0])
+                i_next, j_next = other_end(*dart)
+                dart = (i_next, (j_next - 1) % 4)
+            faces.append(face)
+    return faces
+
+def circle_coordinates(n: int) -> np.ndarray:
+    """
+    所有交叉点均匀放在圆周上
+    """
+    angles = 2 * math.pi * np.arange(n) / max(n, 1)
+    return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+def tutte_coordinates(pd_code: List[List[int]]) -> Optional[np.ndarray]:
+    """
+    Tutte 嵌入：最大的面放在圆周上，其余交叉点位于邻居的加权重心，平面图不连通或者不是平面图时返回 None
+    """
+    n = len(pd_code)
+    faces = get_faces(pd_code)
+    if len(faces) != n + 2: # 欧拉公式：V - E + F = 2，其中 E = 2V
+        return None
+
+    outer = list(dict.fromkeys(max(faces, key=len))) # 去掉重复经过的交叉点，保持顺序
+    inner = [i for i in range(n) if i not in set(outer)]
+    coords = np.zeros((n, 2), dtype=np.float64)
+    coords[outer] = circle_coordinates(len(outer))
+    if len(inner) == 0:
+        return coords
+
+    adjacency = get_adjacency(pd_code)
+    laplacian = np.diag(adjacency.sum(axis=1)) - adjacency
+    try:
+        coords[inner] = np.linalg.solve(
+            laplacian[np.ix_(inner, inner)],
+            adjacency[np.ix_(inner, outer)] @ coords[outer])
+    except np.linalg.LinAlgError:
+        return None
+    return coords
+
+def spectral_coordinates(pd_code: List[List[int]]) -> Optional[np.ndarray]:
+    """
+    谱布局：使用拉普拉斯矩阵第二、第三小特征值对应的特征向量作为坐标
+    """
+    n = len(pd_code)
+    if n < 3:
+        return None
+    adjacency = get_adjacency(pd_code)
+    laplacian = np.diag(adjacency.sum(axis=1)) - adjacency
+    _, eigenvectors = np.linalg.eigh(laplacian)
+    return eigenvectors[:, 1:3].copy()
+
+def rank_spread(coords: np.ndarray) -> np.ndarray:
+    """
+    用坐标在每个维度上的排名代替坐标本身，避免 Tutte 嵌入中内部交叉点挤在一起
+    """
+    ranks = np.empty_like(coords)
+    for axis in range(2):
+        ranks[np.argsort(coords[:, axis], kind="stable"), axis] = np.arange(len(coords))
+    return ranks
+
+def snap_to_grid(coords: np.ndarray, grid_size: int, spacing: int) -> Optional[List[List[int]]]:
+    """
+    将坐标映射到网格的 [2, grid_size - 1] 范围内，并吸附到整数格点上
+    任意两个交叉点在两个方向上至少有一个方向相距不少于 spacing，找不到位置时返回 None
+    """
+    low, high = 2, grid_size - 1
+    span = coords.max(axis=0) - coords.min(axis=0)
+    span[span == 0] = 1
+    target = low + (coords - coords.min(axis=0)) / span * (high - low)
+
+    placed: List[List[int]] = []
+    center = target.mean(axis=0)
+    order = np.argsort(np.abs(target - center).max(axis=1), kind="stable") # 从中心向外依次放置
+    pos_list: List[Optional[List[int]]] = [None] * len(coords)
+    for i in order:
+        tx, ty = int(round(target[i, 0])), int(round(target[i, 1]))
+        found = None
+        for radius in range(grid_size): # 按照切比雪夫距离由近到远寻找空位
+            candidates = [
+                (tx + dx, ty + dy)
+                for dx in range(-radius, radius + 1)
+                for dy in range(-radius, radius + 1)
+                if max(abs(dx), abs(dy)) == radius
+            ]
+            candidates.sort(key=lambda p: (p[0] - target[i, 0]) ** 2 + (p[1] - target[i, 1]) ** 2)
+            for x, y in candidates:
+                if low <= x <= high and low <= y <= high and all(max(abs(x - px), abs(y - py)) >= spacing for px, py in placed):
+                    found = [x, y]
+                    break
+            if found is not None:
+                break
+        if found is None:
+            return None
+        placed.append(found)
+        pos_list[i] = found
+    return pos_list # type: ignore
+
+def choose_directions(pd_code: List[List[int]], pos_list: List[List[int]]) -> List[int]:
+    """
+    为每个交叉点选择朝向，使得每个插头尽量朝向弧线另一端所在的交叉点
+    """
+    arc_ends = get_arc_ends(pd_code)
+    pos = np.array(pos_list, dtype=np.float64)
+    direction_list = []
+    for i, crossing in enumerate(pd_code):
+        vectors = np.zeros((4, 2), dtype=np.float64)
+        for j, label in enumerate(crossing):
+            ends = arc_ends[label]
+            i_other = ends[1][0] if ends[0] == (i, j) else ends[0][0]
+            vector = pos[i_other] - pos[i]
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vectors[j] = vector / norm
+        scores = [sum(vectors[j] @ DIR_VECTORS[(j + d) % 4] for j in range(4)) for d in range(4)]
+        direction_list.append(int(np.argmax(scores)))
+    return direction_list
+
+def generate_candidates(pd_code: List[List[int]], grid_size: int) -> List[Dict]:
+    """
+    生成所有构造性候选布局，格式与 pd_to_diagram 中的 solution 相同
+    """
+    base_layouts = []
+    for coords in [tutte_coordinates(pd_code), spectral_coordinates(pd_code), circle_coordinates(len(pd_code))]:
+        if coords is not None:
+            base_layouts += [coords, rank_spread(coords)]
+
+    candidates = []
+    for coords in base_layouts:
+        for mirror in [False, True]: # 旋转系统可能与外部面的摆放方向相反，因此也尝试镜像
+            mirrored = coords * np.array([-1.0, 1.0]) if mirror else coords
+            for spacing in [max(3, grid_size // (2 * int(math.ceil(math.sqrt(len(pd_code)))) + 1)), 3]:
+                pos_list = snap_to_grid(mirrored, grid_size, spacing)
+                if pos_list is None:
+                    continue
+                candidates.append({
+                    "grid_size": grid_size,
+                    "crossing_number": len(pd_code),
+                    "pos_list": pos_list,
+                    "direction_list": choose_directions(pd_code, pos_list),
+                    "pd_code": pd_code
+                })
+    return candidates
+
+def constructive_initial_solution(pd_code: List[List[int]], grid_size: Optional[int] = None, routing_mode: int = 0) -> Tuple[Optional[Dict], float]:
+    """
+    返回所有构造性候选布局中目标函数值最小的一个以及对应的目标函数值，整个过程不使用随机数
+    没有任何候选布局时返回 (None, math.inf)，routing_mode 为 call_line_checker 中的布线模式
+    """
+    from call_line_checker import get_line_checker
+
+    if grid_size is None:
+        grid_size = 10 * len(pd_code) + 1
+    candidates = generate_candidates(pd_code, grid_size)
+    if len(candidates) == 0:
+        return None, math.inf
+    values = get_line_checker().call_batch(candidates, mode=routing_mode)
+    best_index = int(np.argmin(values)) # 取值相同时保留靠前的候选，保证结果确定
+    return candidates[best_index], float(values[best_index])
+
+if __name__ == "__main__":
+    pd_code = [[6, 1, 7, 2], [14, 7, 15, 8], [4, 15, 1, 16], [10, 6, 11, 5], [8, 4, 9, 3], [18, 11, 19, 12], [20, 17, 5, 18], [12, 19, 13, 20], [16, 10, 17, 9], [2, 14, 3, 13]]
+    from pd_to_diagram import is_feasible # pd_to_diagram 导入了本模块，只在这里导入
+    solution, value = constructive_initial_solution(pd_code)
+    print("目标函数值：%.6f，是否可行：%s" % (value, solution is not None and is_feasible(solution, value)))
+    print(solution)
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# 与 call_main_with_array 的输入格式一致：[grid_size, crossing_number, (x, y, direction, a, b, c, d) * crossing_number]
+HEADER_SIZE = 2
+RECORD_SIZE = 7
+
+# 曼哈顿距离小于 3 的所有偏移量（共 13 个），两个交叉点之间的曼哈顿距离至少为 3
+NEAR_OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) <= 2]
+
+class Layout:
+    """
+    基于 int32 数组的布局表示，代替 solution 字典参与模拟退火
+
+    buffer 直接按照 call_main_with_array 的格式打包，可以不经转换地传给 C++；
+    pos 和 direction 是 buffer 的视图，pd_code 是只读数组，所有副本共享同一个。
+    通过 move 修改交叉点，undo 撤销上一次 commit 之后的全部修改。
+    occupied 是以坐标为键的空间哈希表，用于在 O(1) 时间内检查交叉点之间的距离是否合法。
+    字典形式（to_dict / from_dict）只用于输出和序列化。
+    挂接 Zobrist 哈希表（attach_zobrist）之后，hash_value 在 move / undo 时增量更新。
+    """
+    __slots__ = ("grid_size", "crossing_number", "buffer", "pos", "direction", "pd_code", "occupied", "undo_stack", "zobrist", "hash_value")
+
+    def __init__(self, buffer: np.ndarray, pd_code: Optional[np.ndarray] = None):
+        """
+        参数:
+            buffer: 按 call_main_with_array 格式打包的 int32 数组，Layout 直接持有该数组而不复制
+            pd_code: 与 buffer 中内容相同的只读 pd_code 数组，为 None 时从 buffer 中取出
+        """
+        assert buffer.dtype == np.int32 and buffer.flags["C_CONTIGUOUS"]
+        self.grid_size = int(buffer[0])
+        self.crossing_number = int(buffer[1])
+        self.buffer = buffer
+        records = buffer[HEADER_SIZE:].reshape(self.crossing_number, RECORD_SIZE)
+        self.pos = records[:, 0:2]
+        self.direction = records[:, 2]
+        if pd_code is None:
+            pd_code = records[:, 3:7].copy()
+            pd_code.flags.writeable = False
+        self.pd_code = pd_code
+        self.occupied: Dict[Tuple[int, int], int] = {}
+        for i, (x, y) in enumerate(self.pos.tolist()):
+            self.occupied[(x, y)] = i
+        self.undo_stack: List[Tuple[int, int, int, int]] = []
+        self.zobrist: Any = None # objective_cache.ZobristTable
+        self.hash_value = 0
+
+    @classmethod
+    def from_dict(cls, solution: Dict[str, Any]) -> "Layout":
+        """
+        由 solution 字典构造布局
+        """
+        n = solution["crossing_number"]
+        buffer = np.empty(HEADER_SIZE + RECORD_SIZE * n, dtype=np.int32)
+        buffer[0] = solution["grid_size"]
+        buffer[1] = n
+        records = buffer[HEADER_SIZE:].reshape(n, RECORD_SIZE)
+        records[:, 0:2] = solution["pos_list"]
+        records[:, 2] = solution["direction_list"]
+        records[:, 3:7] = solution["pd_code"]
+        return cls(buffer)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为 solution 字典
+        """
+        return {
+            "grid_size": self.grid_size,
+            "crossing_number": self.crossing_number,
+            "pos_list": self.pos.tolist(),
+            "direction_list": self.direction.tolist(),
+            "pd_code": self.pd_code.tolist()
+        }
+
+    def copy(self) -> "Layout":
+        """
+        复制当前布局（不包含撤销记录），pd_code 与原布局共享
+        """
+        layout = Layout(self.buffer.copy(), self.pd_code)
+        layout.zobrist = self.zobrist
+        layout.hash_value = self.hash_value
+        return layout
+
+    def attach_zobrist(self, zobrist: Any) -> None:
+        """
+        挂接 Zobrist 哈希表并从头计算一次哈希值，之后 hash_value 随 move / undo 增量更新
+        """
+        self.zobrist = zobrist
+        self.hash_value = zobrist.hash(self.pos.tolist(), self.direction.tolist())
+
+    def __reduce__(self):
+        # 视图不能直接序列化，反序列化时由 buffer 重新建立视图
+        return (Layout, (self.buffer.copy(),))
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    def is_free(self, x: int, y: int, ignore: Tuple[int, ...] = ()) -> bool:
+        """
+        判断 (x, y) 与除 ignore 以外的所有交叉点的曼哈顿距离是否都不小于 3
+        """
+        occupied = self.occupied
+        for dx, dy in NEAR_OFFSETS:
+            i = occupied.get((x + dx, y + dy))
+            if i is not None and i not in ignore:
+                return False
+        return True
+
+    def move(self, i: int, x: int, y: int, direction: int) -> None:
+        """
+        将第 i 个交叉点移动到 (x, y)，朝向改为 direction，调用者需要保证新位置合法
+        """
+        old_x, old_y = int(self.pos[i, 0]), int(self.pos[i, 1])
+        self.undo_stack.append((i, old_x, old_y, int(self.direction[i])))
+        if self.occupied.get((old_x, old_y)) == i:
+            del self.occupied[(old_x, old_y)]
+        self.occupied[(x, y)] = i
+        base = HEADER_SIZE + RECORD_SIZE * i
+        if self.zobrist is not None:
+            self.hash_value ^= self.zobrist.term(i, old_x, old_y, int(self.buffer[base + 2])) ^ self.zobrist.term(i, x, y, direction)
+        self.buffer[base] = x
+        self.buffer[base + 1] = y
+        self.buffer[base + 2] = direction
+
+    def undo(self) -> None:
+        """
+        撤销上一次 commit 之后的全部修改
+        """
+        while self.undo_stack:
+            i, x, y, direction = self.undo_stack.pop()
+            base = HEADER_SIZE + RECORD_SIZE * i
+            old_x, old_y = int(self.buffer[base]), int(self.buffer[base + 1])
+            if self.occupied.get((old_x, old_y)) == i:
+                del self.occupied[(old_x, old_y)]
+            self.occupied[(x, y)] = i
+            if self.zobrist is not None:
+                self.hash_value ^= self.zobrist.term(i, old_x, old_y, int(self.buffer[base + 2])) ^ self.zobrist.term(i, x, y, direction)
+            self.buffer[base] = x
+            self.buffer[base + 1] = y
+            self.buffer[base + 2] = direction
+
+    def commit(self) -> None:
+        """
+        保留上一次 commit 之后的全部修改
+        """
+        self.undo_stack.clear()
@@ -1,12 +1,16 @@
 // 给定一个网格图，上面放置了若干个扭结交叉点
 // 我们需要试图使用最短路原则，将这些交叉点连接起来
 #include <algorithm>
+#include <atomic>
+#include <chrono>
 #include <cmath>
+#include <cstdint>
 #include <cstdio>
 #include <cstdlib>
 #include <limits>
 #include <queue>
 #include <string>
+#include <thread>
 #include <tuple>
 #include <vector>
 #include <map>
@@ -38,6 +42,39 @@ typedef std::vector<int> IntList;
 typedef std::vector<std::tuple<int,int>> IntPairList;
 typedef std::vector<std::tuple<int,int,int,int>> PdCode;
 
+// 布线模式，需要与 call_line_checker.py 中的 ROUTING_* 保持一致
+enum RoutingMode {
+    ROUTING_SEQUENTIAL = 0, // 按照 distance_rank 的顺序依次布线，已经布好的连线成为之后连线的障碍物
+    ROUTING_NEGOTIATED = 1  // 先按顺序布线，再对失败的连线进行拆线重布（协商拥塞）
+};
+
+// 单条连线的统计信息，供 call_main_with_array_stats 使用
+// 内存布局需要与 call_line_checker.py 中的 ROUTE_STATS_DTYPE 保持一致
+enum RouteStatus {
+    ROUTE_OK = 0,          // 连线成功
+    ROUTE_UNREACHABLE = 1, // 终点不可达
+    ROUTE_OVER_BUDGET = 2, // 带上界求解时，搜索因为超出预算而停止
+    ROUTE_SKIPPED = 3      // 带上界求解提前停止，没有尝试布线
+};
+// 求解状态，需要与 call_line_checker.py 中的 SOLVE_STATUS 保持一致
+enum SolveStatus {
+    STATUS_UNSOLVED = 0, // 尚未求解
+    STATUS_FAIL = 1,     // 有连线失败，目标函数值中带有惩罚项
+    STATUS_SUCCESS = 2,  // 所有连线都成功
+    STATUS_ABORT = 3,    // 带上界求解时提前停止
+    STATUS_INVALID = 4   // 输入的布局不合法（越界或者交叉点重叠），只有 SolverContext 会返回这个状态
+};
+struct RouteStats {
+    int32_t socket;         // 弧线编号
+    int32_t status;         // RouteStatus
+    int64_t nodes_popped;   // A* 从堆中弹出的节点数目
+    int64_t nodes_pushed;   // A* 压入堆中的节点数目
+    int64_t peak_heap;      // 堆的最大大小
+    int64_t peak_container; // 节点容器的最大大小
+    double length;          // 连线长度，失败时为 inf
+    double seconds;         // 布线用时
+};
+
 // 抽象输入接口
 class IntInputInterface {
 public:
@@ -46,9 +83,9 @@ public:
 
 // 描述算法的输入
 class AlgorithmInput {
-private:
+protected:
     int grid_size, crossing_number, bad_pair;
-    std::string status = "unsolve"; // 总共有三种状态：unsolve, fail, success
+    SolveStatus status = STATUS_UNSOLVED;
     double answer_length = 0;       // 只有在 sucess 状态下，才有意义，fail 说明结果是 inf
 
     // 三个数组：pos_list、direction_list、pd_code 具有相同的长度，同一个下标描述同一个交叉点
@@ -59,11 +96,33 @@ private:
     // 两个计数数组，用于统计弧线编号以及位置的占据情况，用于冲突检测
     std::map<int, int> count_number;
     std::map<int, IntPairList> socket_position; // 每个插头编号会出现两次，记录出现位置
-    std::map<std::tuple<int, int>, int> chess_board; // 记录棋盘现状，就是每个位置有什么插头
+
+    // 棋盘以及 A* 相关数据全部使用稠密数组存储，下标为 cell_id(x, y) = x * board_width + y
+    // 坐标范围是 0 ~ grid_size + 1，多留出一圈边界，避免越界检查
+    // 每个数组都配有一个“代数戳”数组：戳与当前代数不一致的位置视为空，这样就不需要在每次使用前清空整个数组
+    int board_width = 0;
+    unsigned board_generation = 0;   // 棋盘与链表的当前代数，每次输入新数据时加一
+    unsigned search_generation = 0;  // A* 的当前代数，每次为一个 socket 寻路时加一
+    std::vector<unsigned> board_stamp;
+    std::vector<int> board_value;    // 记录棋盘现状，就是每个位置有什么插头（空位置为 0）
 
     // 用于根据欧氏距离对所有具有相同编号的插头对，进行排序
     std::vector<std::tuple<double, int>> distance_rank;
 
+    // 每个插头编号的两次出现分别属于哪个交叉点的第几个插头，顺序与 socket_position 一致
+    std::map<int, IntPairList> socket_owner;
+
+    // 以下数组使用弧线编号作为下标（编号范围 1 ~ 2 * crossing_number），记录每一条连线的求解结果
+    std::vector<IntList> socket_path;    // 连线经过的所有位置（cell_id），从起点到终点，连线失败时为空
+    std::vector<double> socket_length;   // 连线长度，连线失败时为 inf
+    std::vector<IntList> socket_search_cells; // A* 拓展过的所有位置，拓展时会读取周围一圈的棋盘信息，只在 record_search_cells 时记录
+    bool record_search_cells = false;
+
+    // 为 true 时，solveAll / solveAllBounded 按照布线顺序在 route_stats 中记录每条连线的统计信息
+    bool collect_stats = false;
+    std::vector<RouteStats> route_stats;
+    RouteStats search_stats; // 最近一次 create_path_for_socket 的搜索统计，总是会被更新
+
     // 记录交叉点之间的连接关系
     // 例如一条路经 x1 -> x2 -> ... -> xn
     // 那么：
@@ -73,44 +132,150 @@ private:
     // chain_prev[xn] = x{n-1}, chain_next[xn] = xn（终点的下一个点是自己）
     // 这样我们可以通过两个方向遍历整条链
     // 而谁是起点谁是终点，取决于数组 socket_position 中两次出现之间的顺序
-    std::map<std::tuple<int, int>, std::tuple<int, int>> chain_next;
-    std::map<std::tuple<int, int>, std::tuple<int, int>> chain_prev;
+    // chain_next 与 chain_prev 中存储的是 cell_id，与棋盘共用 board_generation
+    std::vector<unsigned> chain_stamp;
+    std::vector<int> chain_next;
+    std::vector<int> chain_prev;
+
+    // A* 中每个位置目前最小的 G 值，使用 search_generation 判断是否在本次搜索中访问过
+    std::vector<unsigned> g_stamp;
+    std::vector<double> g_value;
+
+    // 从终点出发的广度优先搜索，与 A* 交替进行，用于尽早发现终点不可达，使用独立的代数戳
+    unsigned reach_generation = 0;
+    std::vector<unsigned> reach_stamp;
+    IntList reach_queue;
+    size_t reach_head = 0;
+
+    // 带上界求解时每个后缀的长度下界之和，见 solveAllBounded
+    std::vector<double> suffix_bound;
+
+    // 协商布线使用的数组：每个位置的历史拥塞代价，以及哪些位置是不能被拆除的（交叉点中心以及所有插头）
+    std::vector<double> congestion_history;
+    std::vector<char> fixed_cell;
 
     void clear() {
         grid_size = crossing_number = bad_pair = 0;
-        status = "unsolve";
+        status = STATUS_UNSOLVED;
         pos_list.clear();
         direction_list.clear();
         pd_code.clear();
         count_number.clear();
         socket_position.clear();
-        chess_board.clear();
         distance_rank.clear();
-        chain_next.clear();
-        chain_prev.clear();
+        socket_owner.clear();
+        socket_path.clear();
+        socket_length.clear();
+        socket_search_cells.clear();
+        next_board_generation(); // 棋盘和链表只需要更新代数即可
+    }
+
+    // 代数加一，如果发生了溢出，就真的清空一次戳数组
+    static void bump_generation(unsigned& generation, std::vector<unsigned>& stamp) {
+        generation += 1;
+        if(generation == 0) {
+            std::fill(stamp.begin(), stamp.end(), 0);
+            generation = 1;
+        }
+    }
+    void next_board_generation() {
+        board_generation += 1;
+        if(board_generation == 0) {
+            std::fill(board_stamp.begin(), board_stamp.end(), 0);
+            std::fill(chain_stamp.begin(), chain_stamp.end(), 0);
+            board_generation = 1;
+        }
+    }
+
+    // 根据 grid_size 准备好所有的稠密数组，数组只会变大不会变小
+    void prepare_grid() {
+        board_width = grid_size + 2;
+        size_t cell_count = (size_t)board_width * board_width;
+        if(board_stamp.size() < cell_count) {
+            board_stamp.resize(cell_count, 0);
+            board_value.resize(cell_count, 0);
+            chain_stamp.resize(cell_count, 0);
+            chain_next.resize(cell_count, -1);
+            chain_prev.resize(cell_count, -1);
+            g_stamp.resize(cell_count, 0);
+            g_value.resize(cell_count, 0);
+            reach_stamp.resize(cell_count, 0);
+        }
+    }
+
+    int cell_id(int x, int y) const {
+        return x * board_width + y;
+    }
+    int cell_id(std::tuple<int, int> pos) const {
+        return std::get<0>(pos) * board_width + std::get<1>(pos);
+    }
+    int get_board(int cell) const { // 没有被写过的位置一律视为 0
+        return board_stamp[cell] == board_generation ? board_value[cell] : 0;
+    }
+    void set_board(int cell, int value) {
+        board_stamp[cell] = board_generation;
+        board_value[cell] = value;
+    }
+    bool has_chain(int cell) const {
+        return chain_stamp[cell] == board_generation;
+    }
+    void touch_chain(int cell) { // 第一次写入链表时，前驱与后继都先设置为不存在
+        if(!has_chain(cell)) {
+            chain_stamp[cell] = board_generation;
+            chain_next[cell] = chain_prev[cell] = -1;
+        }
+    }
+    void set_chain_next(int cell, int value) {
+        touch_chain(cell);
+        chain_next[cell] = value;
+    }
+    void set_chain_prev(int cell, int value) {
+        touch_chain(cell);
+        chain_prev[cell] = value;
     }
 
     // 检查 pos1 和 pos2 是否具有边连接关系
     // 在对角线是否可走的判断中，我们需要判断另一条对偶的对角线是否被占用且具有连边关系
-    bool check_is_linked(std::tuple<int, int> pos1, std::tuple<int, int> pos2) const {
+    bool check_is_linked(int cell1, int cell2) const {
 
         // 以下两个 return 的情况，说明两个点中有至少一个没有被占用
-        if(chain_next.find(pos1) == chain_next.end()) return false;
-        if(chain_next.find(pos2) == chain_next.end()) return false; 
-        
-        return 
-            chain_next.find(pos1) -> second == pos2 || // 四个方向都需要检查
-            chain_next.find(pos2) -> second == pos1 ||
-            chain_prev.find(pos1) -> second == pos2 ||
-            chain_prev.find(pos2) -> second == pos1;
+        if(!has_chain(cell1)) return false;
+        if(!has_chain(cell2)) return false;
+
+        return
+            chain_next[cell1] == cell2 || // 四个方向都需要检查
+            chain_next[cell2] == cell1 ||
+            chain_prev[cell1] == cell2 ||
+            chain_prev[cell2] == cell1;
+    }
+
+    void remove_path(int socket_index) { // 拆除一条连线，两端的插头仍然保留在棋盘上
+        const IntList& path = socket_path[socket_index];
+        for(int k = 0; k < (int)path.size(); k += 1) {
+            chain_stamp[path[k]] = 0;
+            if(k != 0 && k + 1 != (int)path.size()) {
+                set_board(path[k], 0);
+            }
+        }
+    }
+    void lay_path(int socket_index) { // 按照 socket_path 中记录的路径重新铺设一条连线
+        const IntList& path = socket_path[socket_index];
+        for(int k = 0; k < (int)path.size(); k += 1) {
+            set_board(path[k], socket_index);
+            set_chain_prev(path[k], k == 0 ? path[k] : path[k - 1]);
+            set_chain_next(path[k], k + 1 == (int)path.size() ? path[k] : path[k + 1]);
+        }
     }
 
     static double sqr(double x) { // 仅仅是算个平方
         return x * x;
     }
 public:
+    void setCollectStats(bool value) {
+        collect_stats = value;
+    }
     double getAnswerLength() const {
-        assert(status != "unsolve");
+        assert(status != STATUS_UNSOLVED);
         return answer_length + bad_pair * sqr(grid_size - 1) * 2.0; // 对 bap pair 引入了很大的惩罚
     }
 
@@ -139,16 +304,19 @@ public:
     // 枚举棋盘上的所有正数，如果该点的值不等于 ignore_color，那么就计算到 pos 的曼哈顿距离，最后再取所有距离中的最小值
     double get_min_manhattan_dis_on_chessboard(std::tuple<int, int> pos, int ignore_color) const {
         double ans = std::numeric_limits<double>::infinity();
-        for(auto [pos_ch, color_ch]: chess_board) {
-            if(color_ch != ignore_color && color_ch > 0) {
-                ans = std::min(ans, get_manhattan_distance(pos, pos_ch));
+        for(int x = 1; x <= grid_size; x += 1) {
+            for(int y = 1; y <= grid_size; y += 1) {
+                int color_ch = get_board(cell_id(x, y));
+                if(color_ch != ignore_color && color_ch > 0) {
+                    ans = std::min(ans, get_manhattan_distance(pos, std::make_tuple(x, y)));
+                }
             }
         }
         return ans;
     }
     double pos_near_punishment(std::tuple<int, int> pos, int ignore_color) const { // 计算走入某个方格的额外惩罚：由于离其他颜色的线比较近
         #ifdef USE_POS_NEAR_PUNISHMENT
-            if(chess_board.count(pos) > 0) {
+            if(get_board(cell_id(pos)) != 0) {
                 return 0; // 不要对障碍物本身使用 pos_near 惩罚：否则会干扰自己的起点和终点
             }
             const int MIN_POS_NEAR = 5;
@@ -168,7 +336,7 @@ public:
     }
     // 从文件或键盘输入一个交叉点布局
     void inputFromIII(bool quiet, IntInputInterface& iii) {
-        status = "unsolve"; // 每次输入新的数据时，需要将所有数据结构清空
+        status = STATUS_UNSOLVED; // 每次输入新的数据时，需要将所有数据结构清空
         clear();
 
         if(!quiet) printf("grid_size:");
@@ -177,6 +345,15 @@ public:
         if(!quiet) printf("crossing_number:");
         crossing_number = iii.getNextInt(); // 输入交叉点的数目
 
+        prepare_grid();
+        int occupied_cell_count = 0; // 统计棋盘上被占据的位置数目，用于冲突检测
+        auto occupy_cell = [&](int cell, int value) {
+            if(board_stamp[cell] != board_generation) {
+                occupied_cell_count += 1;
+            }
+            set_board(cell, value);
+        };
+
         // 输入每个交叉点的：位置，朝向，以及 PD_CODE
         for(int i = 1; i <= crossing_number; i += 1) {
 
@@ -193,7 +370,7 @@ public:
            
             // 每个位置只能被恰好占据一次，不可以重叠
             // -1 表示下方进入弧方向位于正东，-2 表示下方进入弧方向位于正北，-3 表示下方进入弧方向位于正西，-4 表示下方进入弧方向位于正南
-            chess_board[std::make_tuple(posx, posy)] =  -1 -direction_delta;
+            occupy_cell(cell_id(posx, posy), -1 -direction_delta);
 
             if(!quiet) printf("node[%d] pd_code:", i);
             int pd_code_now[4] = {};
@@ -210,10 +387,11 @@ public:
                 socket_position[tmp].push_back(std::make_tuple(
                     pos_now_x, pos_now_y
                 ));
+                socket_owner[tmp].push_back(std::make_tuple(i - 1, j));
                 if(socket_position[tmp].size() == 2) {
                     distance_rank.push_back(std::make_tuple(get_distance_between_socket(tmp), tmp));
                 }
-                chess_board[std::make_tuple(pos_now_x, pos_now_y)] = tmp; // 在棋盘上记录所有信息
+                occupy_cell(cell_id(pos_now_x, pos_now_y), tmp); // 在棋盘上记录所有信息
             }
             pd_code.push_back(std::make_tuple(pd_code_now[0], pd_code_now[1], pd_code_now[2], pd_code_now[3]));
         }
@@ -222,9 +400,13 @@ public:
         for(int i = 1; i <= 2 * crossing_number; i += 1) {
             assert(count_number[i] == 2);
         }
-        assert(chess_board.size() == 5 * crossing_number); // 这意味着所有的交叉点之间没有重叠的可能性
+        assert(occupied_cell_count == 5 * crossing_number); // 这意味着所有的交叉点之间没有重叠的可能性
         assert(distance_rank.size() == crossing_number * 2);
 
+        socket_path.assign(2 * crossing_number + 1, IntList());
+        socket_length.assign(2 * crossing_number + 1, std::numeric_limits<double>::infinity());
+        socket_search_cells.assign(2 * crossing_number + 1, IntList());
+
         std::sort(distance_rank.begin(), distance_rank.end()); // 按照字典序排序，这样能够优先处理距离近的，我觉得离得近的更不容易被破坏
         std::reverse(distance_rank.begin(), distance_rank.end());
     }
@@ -267,7 +449,7 @@ public:
         ymax = 0;
         for(int j = grid_size; j > 0; j -= 1) {
             for(int i = grid_size; i > 0; i -= 1) {
-                if(chess_board.count(std::make_tuple(i, j)) > 0 && chess_board.find(std::make_tuple(i, j))->second > 0) {
+                if(get_board(cell_id(i, j)) > 0) {
                     xmin = std::min(xmin, i);
                     xmax = std::max(xmax, i);
                     ymin = std::min(ymin, j);
@@ -278,10 +460,10 @@ public:
         for(int j = ymax; j >= ymin; j -= 1) {
             fprintf(fpout, "diag: (y = %4d) ", j); // 输出行号
             for(int i = xmin; i <= xmax; i += 1) {
-                if(chess_board.count(std::make_tuple(i, j)) <= 0 || chess_board.find(std::make_tuple(i, j)) -> second == 0) {
+                if(get_board(cell_id(i, j)) == 0) {
                     fprintf(fpout, "    ");
                 }else {
-                    fprintf(fpout, "%4d", chess_board.find(std::make_tuple(i, j)) -> second);
+                    fprintf(fpout, "%4d", get_board(cell_id(i, j)));
                 }
             }
             fprintf(fpout, "\n");
@@ -313,7 +495,22 @@ public:
             return (*asnh_c1)[asnh_i1].f() > (*asnh_c2)[asnh_i2].f();
         }
     };
-    typedef std::priority_queue<AStarNodeHandle, std::vector<AStarNodeHandle>, AStarNodeCmp> AStarHeap; // 小根堆，先弹出的总是综合估价较小的
+    // 小根堆，先弹出的总是综合估价较小的；与 std::priority_queue 一样使用 std::push_heap / std::pop_heap 维护，
+    // 但是底层数组是成员变量，清空之后容量仍然保留，多次搜索之间不需要重新申请内存
+    std::vector<AStarNodeHandle> astar_heap;
+    void heap_push(AStarNodeHandle handle) {
+        astar_heap.push_back(handle);
+        std::push_heap(astar_heap.begin(), astar_heap.end(), AStarNodeCmp());
+    }
+    AStarNodeHandle heap_pop() {
+        std::pop_heap(astar_heap.begin(), astar_heap.end(), AStarNodeCmp());
+        AStarNodeHandle top = astar_heap.back();
+        astar_heap.pop_back();
+        return top;
+    }
+
+    // 搜索树的节点容器，同样在多次搜索之间复用
+    std::vector<AStarNode> astar_container;
 
     // 在容器中申请一个新节点（在容器中申请是为了方便将来回收空间）
     AStarNodeHandle create_new_node(std::vector<AStarNode>& container, double g, double h, std::tuple<int, int> pos_now, AStarNodeHandle prev_astar_node) {
@@ -349,119 +546,239 @@ public:
         return (*std::get<0>(top_node_handle))[std::get<1>(top_node_handle)];
     }
 
+    bool over_budget = false; // 最近一次搜索是否因为超出 budget 而提前停止
+
+    // A* 弹出的节点数达到 REACH_DELAY_FACTOR * 估价 + REACH_DELAY_BASE 时开始广度优先搜索
+    static constexpr int64_t REACH_DELAY_FACTOR = 4;
+    static constexpr int64_t REACH_DELAY_BASE = 32;
+
+    // 广度优先搜索的状态
+    enum ReachState {
+        REACH_RUNNING = 0,     // 尚未得出结论
+        REACH_CONNECTED = 1,   // 遇到了 A* 访问过的位置，起点和终点连通
+        REACH_EXHAUSTED = 2    // 终点所在的连通块已经搜索完毕，其中没有起点
+    };
+
+    // 广度优先搜索拓展一个位置，走法规则与 A* 完全相同：不能越界、不能走入其他插头占据的位置、不能斜穿两条相连的对角
+    // 这些规则在两个方向上是对称的，因此从终点出发能到达的位置，恰好就是能到达终点的位置
+    ReachState reach_step(int socket_index) {
+        if(reach_head >= reach_queue.size()) {
+            return REACH_EXHAUSTED;
+        }
+        int cell_now = reach_queue[reach_head++];
+        int xnow = cell_now / board_width;
+        int ynow = cell_now % board_width;
+        for(int d = 0; d <= 7; d += 1) {
+            bool corner = d >= 4;
+            int xnxt = xnow + (corner ? CORNER_DX[d - 4] : DIR_DX[d]);
+            int ynxt = ynow + (corner ? CORNER_DY[d - 4] : DIR_DY[d]);
+            if(!(1 <= xnxt && xnxt <= grid_size && 1 <= ynxt && ynxt <= grid_size)) {
+                continue;
+            }
+            int cell_nxt = cell_id(xnxt, ynxt);
+            if(reach_stamp[cell_nxt] == reach_generation) {
+                continue;
+            }
+            int board_nxt = get_board(cell_nxt);
+            if(board_nxt != 0 && board_nxt != socket_index) {
+                continue;
+            }
+            if(corner) {
+                auto [pos_cor1, pos_cor2] = get_other_corners(xnow, ynow, xnxt, ynxt);
+                int cor1 = cell_id(pos_cor1);
+                int cor2 = cell_id(pos_cor2);
+                int board_cor1 = get_board(cor1);
+                if(board_cor1 != 0 && board_cor1 == get_board(cor2) && check_is_linked(cor1, cor2)) {
+                    continue;
+                }
+            }
+            if(g_stamp[cell_nxt] == search_generation) { // A* 已经从起点到达过这个位置
+                return REACH_CONNECTED;
+            }
+            reach_stamp[cell_nxt] = reach_generation;
+            reach_queue.push_back(cell_nxt);
+        }
+        return reach_head >= reach_queue.size() ? REACH_EXHAUSTED : REACH_RUNNING;
+    }
+
     // 指定一个 socket 编号
     // 在当前局面下试图将两个编号连起来
-    double create_path_for_socket(int socket_index) {
+    // 堆顶的综合估价超过 budget 时停止搜索（此时连线长度一定超过 budget），over_budget 设为 true，按照无法连接处理
+    double create_path_for_socket(int socket_index, double budget = std::numeric_limits<double>::infinity()) {
         assert(socket_position[socket_index].size() == 2); // 必须恰好有两个插座才能使用
         auto begin_pos = socket_position[socket_index][0];
         auto end_pos   = socket_position[socket_index][1]; // 记录起始位置和终止位置
 
 
-        // 创建树节点容器
-        std::vector<AStarNode> container;
+        // 清空树节点容器与堆，保留已经申请的空间
+        std::vector<AStarNode>& container = astar_container;
+        container.clear();
+        astar_heap.clear();
         AStarNodeHandle nullptr_handle = std::make_tuple(&container, -1);
-        std::map<std::tuple<int, int>, double> minG; // 记录每个访问过的节点的最近的 G 值
+
+        // 每个访问过的节点的最近的 G 值记录在 g_value 中，更新代数之后，上一次搜索留下的数据自动失效
+        bump_generation(search_generation, g_stamp);
+        int end_cell = cell_id(end_pos);
 
         // 搜索树的根节点
         AStarNodeHandle root = create_new_node(
             container, 0, distance_estimate(begin_pos, end_pos), begin_pos, nullptr_handle);
 
         // 最开始的时候堆中只有一个元素
-        AStarHeap astar_heap; astar_heap.push(root);
+        heap_push(root);
+
+        // 从终点出发的广度优先搜索与 A* 交替进行：A* 每弹出一个节点，广度优先搜索拓展一个位置
+        // 两者相遇时说明起点和终点连通，之后只运行 A*；广度优先搜索先结束时说明终点不可达，不必让 A* 搜索完起点所在的整个连通块
+        // 大多数连线 A* 很快就能找到，因此 A* 弹出的节点数超过 reach_start 之后才开始广度优先搜索
+        // A* 本身的搜索顺序不受影响，因此找到的路线与原来完全相同
+        int64_t reach_start = REACH_DELAY_FACTOR * (int64_t)distance_estimate(begin_pos, end_pos) + REACH_DELAY_BASE;
+        bool reach_running = false;
+        bool unreachable = false;
         
         // 记录搜索树中最优的路线对应的结点
         AStarNodeHandle best_route = nullptr_handle;
+
+        IntList& path = socket_path[socket_index];
+        IntList& search_cells = socket_search_cells[socket_index];
+        path.clear();
+        search_cells.clear();
+        socket_length[socket_index] = std::numeric_limits<double>::infinity();
+        over_budget = false;
+        search_stats = RouteStats{socket_index, ROUTE_OK, 0, 1, 1, 1, 0.0, 0.0};
         
         // 每次从堆中弹一个元素出来
-        if(DEBUG_OUTPUT) printf(" - begin astar\n"); fflush(stdout);
+        if(DEBUG_OUTPUT) { printf(" - begin astar\n"); fflush(stdout); }
         while(astar_heap.size() > 0) {
-            if(DEBUG_OUTPUT) printf(" - astar_heap.size() = %d\n", (int)astar_heap.size()); fflush(stdout);
-            auto top_node_handle = astar_heap.top(); astar_heap.pop();
+            if(DEBUG_OUTPUT) { printf(" - astar_heap.size() = %d\n", (int)astar_heap.size()); fflush(stdout); }
+            auto top_node_handle = heap_pop();
+            search_stats.nodes_popped += 1;
+            const AStarNode top_node = get_top_node(top_node_handle);
+            int cell_now = cell_id(top_node.pos_now);
+            if(top_node.f() > budget) { // 估价函数满足三角不等式，弹出的综合估价单调不减，之后找到的路线不会短于 budget
+                over_budget = true;
+                break;
+            }
+            if(search_stats.nodes_popped == reach_start) {
+                bump_generation(reach_generation, reach_stamp);
+                reach_queue.clear();
+                reach_queue.push_back(end_cell);
+                reach_stamp[end_cell] = reach_generation;
+                reach_head = 0;
+                reach_running = true;
+            }
+            if(reach_running) {
+                ReachState reach_state = reach_stamp[cell_now] == reach_generation ? REACH_CONNECTED : reach_step(socket_index);
+                if(reach_state == REACH_CONNECTED) {
+                    reach_running = false;
+                }else if(reach_state == REACH_EXHAUSTED) {
+                    unreachable = true;
+                    break;
+                }
+            }
 
-            if(minG.count(get_top_node(top_node_handle).pos_now) <= 0) { // 这说明，我们第一次访问这个节点
-                minG[get_top_node(top_node_handle).pos_now] = std::numeric_limits<double>::infinity();
+            if(g_stamp[cell_now] != search_generation) { // 这说明，我们第一次访问这个节点
+                g_stamp[cell_now] = search_generation;
+                g_value[cell_now] = std::numeric_limits<double>::infinity();
             }
 
             // 如果之前访问时，使用过的距离小于等于这一次访问时已经走的距离，则没有必要对这一节点进行进一步拓展
-            if(minG[get_top_node(top_node_handle).pos_now] <= get_top_node(top_node_handle).g) continue;
+            if(g_value[cell_now] <= top_node.g) continue;
 
             // 更新最优解
-            minG[get_top_node(top_node_handle).pos_now] = get_top_node(top_node_handle).g;
-            if(get_top_node(top_node_handle).pos_now == end_pos) { // 说明找到了最短路
+            g_value[cell_now] = top_node.g;
+            if(cell_now == end_cell) { // 说明找到了最短路
                 best_route = top_node_handle;
                 break; // 快速退出
             }
 
-            if(DEBUG_OUTPUT) printf(" - considering four sides\n"); fflush(stdout);
+            if(DEBUG_OUTPUT) { printf(" - considering four sides\n"); fflush(stdout); }
 
             // 如果程序成功运行到这里，说明需要对当前节点进行拓展
             // 我们先考虑向水平竖直的四个方向进行拓展，然后再考虑向八个对角进行拓展，一定要注意障碍物相关的问题
-            auto [xnow, ynow] = get_top_node(top_node_handle).pos_now;
+            auto [xnow, ynow] = top_node.pos_now;
+            if(record_search_cells) {
+                search_cells.push_back(cell_now);
+            }
             for(int d = 0; d <= 3; d += 1) {
                 int xnxt = xnow + DIR_DX[d];
                 int ynxt = ynow + DIR_DY[d];
                 auto pos_nxt = std::make_tuple(xnxt, ynxt); //这是下一步要走到的位置
                 double pos_near_punishment_next = pos_near_punishment(pos_nxt, socket_index);  // 惩罚
-                double gnxt  = get_top_node(top_node_handle).g + 1 + pos_near_punishment_next; // 因为多走了一步
+                double gnxt  = top_node.g + 1 + pos_near_punishment_next; // 因为多走了一步
                 if(!(1 <= xnxt && xnxt <= grid_size && 1 <= ynxt && ynxt <= grid_size)) {      // 超出地图外了，不可以走
                     continue;
                 }
-                if(chess_board[pos_nxt] != 0 && chess_board[pos_nxt] != socket_index) { // 说明下一个位置有障碍物，不可以走
+                int board_nxt = get_board(cell_id(xnxt, ynxt));
+                if(board_nxt != 0 && board_nxt != socket_index) { // 说明下一个位置有障碍物，不可以走
                     continue;
                 }
 
                 // 程序执行到这里，说明从起始位置出发，存在一条抵达 pos_nxt 的路径
                 // 送入小根堆
-                astar_heap.push(create_new_node(container,
+                heap_push(create_new_node(container,
                     gnxt, distance_estimate(pos_nxt, end_pos), pos_nxt, top_node_handle));
             }
 
-            if(DEBUG_OUTPUT) printf(" - considering four corners\n"); fflush(stdout);
+            if(DEBUG_OUTPUT) { printf(" - considering four corners\n"); fflush(stdout); }
 
             // 现在再考虑四个角落上的方向
             for(int d = 0; d <= 3; d += 1) {
-                if(DEBUG_OUTPUT) printf(" - corner %d phase 0\n", d); fflush(stdout);
+                if(DEBUG_OUTPUT) { printf(" - corner %d phase 0\n", d); fflush(stdout); }
 
                 int xnxt = xnow + CORNER_DX[d];
                 int ynxt = ynow + CORNER_DY[d];
                 auto pos_nxt = std::make_tuple(xnxt, ynxt); //这是下一步要走到的位置
                 double pos_near_punishment_next = pos_near_punishment(pos_nxt, socket_index);       // 惩罚
-                double gnxt  = get_top_node(top_node_handle).g + SQRT_2 + pos_near_punishment_next; // 因为多走了一步
+                double gnxt  = top_node.g + SQRT_2 + pos_near_punishment_next; // 因为多走了一步
 
-                if(DEBUG_OUTPUT) printf(" - corner %d phase 1\n", d); fflush(stdout);
+                if(DEBUG_OUTPUT) { printf(" - corner %d phase 1\n", d); fflush(stdout); }
 
                 if(!(1 <= xnxt && xnxt <= grid_size && 1 <= ynxt && ynxt <= grid_size)) { // 超出地图外了，不可以走
                     continue;
                 }
-                if(chess_board[pos_nxt] != 0 && chess_board[pos_nxt] != socket_index) { // 说明下一个位置有障碍物，不可以走
+                int board_nxt = get_board(cell_id(xnxt, ynxt));
+                if(board_nxt != 0 && board_nxt != socket_index) { // 说明下一个位置有障碍物，不可以走
                     continue;
                 }
 
-                if(DEBUG_OUTPUT) printf(" - corner %d phase 2\n", d); fflush(stdout);
+                if(DEBUG_OUTPUT) { printf(" - corner %d phase 2\n", d); fflush(stdout); }
 
                 // 四个角点需要额外考虑对偶对角是否被占据的情况
                 // 如果另外两个对角恰好有边，那么就不能这么斜着走过去
-                auto [cor1, cor2] = get_other_corners(xnow, ynow, xnxt, ynxt);
-                if(chess_board[cor1] != 0 && chess_board[cor1] == chess_board[cor2] && check_is_linked(cor1, cor2)) {
+                auto [pos_cor1, pos_cor2] = get_other_corners(xnow, ynow, xnxt, ynxt);
+                int cor1 = cell_id(pos_cor1);
+                int cor2 = cell_id(pos_cor2);
+                int board_cor1 = get_board(cor1);
+                if(board_cor1 != 0 && board_cor1 == get_board(cor2) && check_is_linked(cor1, cor2)) {
                     continue;
                 }
 
-                if(DEBUG_OUTPUT) printf(" - corner %d phase 3\n", d); fflush(stdout);
+                if(DEBUG_OUTPUT) { printf(" - corner %d phase 3\n", d); fflush(stdout); }
 
                 // 程序执行到这里，说明从起始位置出发，存在一条抵达 pos_nxt 的路径
                 // 送入小根堆
-                astar_heap.push(create_new_node(container,
+                heap_push(create_new_node(container,
                     gnxt, distance_estimate(pos_nxt, end_pos), pos_nxt, top_node_handle));
 
-                if(DEBUG_OUTPUT) printf(" - corner %d done\n", d); fflush(stdout);
+                if(DEBUG_OUTPUT) { printf(" - corner %d done\n", d); fflush(stdout); }
             }
 
-            if(DEBUG_OUTPUT) printf(" - next pos analized\n"); fflush(stdout);
+            if(DEBUG_OUTPUT) { printf(" - next pos analized\n"); fflush(stdout); }
+            search_stats.peak_heap = std::max(search_stats.peak_heap, (int64_t)astar_heap.size());
+        }
+        search_stats.nodes_pushed = (int64_t)container.size(); // 每个节点恰好被压入堆中一次
+        search_stats.peak_container = (int64_t)container.size();
+        if(DEBUG_OUTPUT) { printf(" - end astar\n"); fflush(stdout); }
+
+        // 广度优先搜索证明了不可达时，结论只取决于终点所在连通块及其边界，因此用它代替 A* 拓展过的位置
+        if(unreachable && record_search_cells) {
+            search_cells = reach_queue;
         }
-        if(DEBUG_OUTPUT) printf(" - end astar\n"); fflush(stdout);
 
         // 执行到这里如果 best_route 仍没有被赋值，这说明目标位置不可达
         if(best_route == nullptr_handle) {
+            search_stats.status = over_budget ? ROUTE_OVER_BUDGET : ROUTE_UNREACHABLE;
+            search_stats.length = std::numeric_limits<double>::infinity();
             return std::numeric_limits<double>::infinity();
         }
 
@@ -470,34 +787,371 @@ public:
         while(node_now != nullptr_handle && (std::get<1>(node_now) != -1) && node_now != root) { // 维护双向链
             auto node_prev = get_prev_node(node_now);
             assert(get_pos_now(node_prev) != get_pos_now(node_now));
+            int cell_prev = cell_id(get_pos_now(node_prev));
+            int cell_node = cell_id(get_pos_now(node_now));
 
-            chain_next[get_pos_now(node_prev)] = get_pos_now(node_now );
-            chain_prev[get_pos_now(node_now )] = get_pos_now(node_prev);
+            set_chain_next(cell_prev, cell_node);
+            set_chain_prev(cell_node, cell_prev);
 
             // 进一步确保走过的路线全是安全的
-            assert(chess_board[get_pos_now(node_now)] == 0 || chess_board[get_pos_now(node_now)] == socket_index);
-            chess_board[get_pos_now(node_now)] = socket_index;
+            assert(get_board(cell_node) == 0 || get_board(cell_node) == socket_index);
+            set_board(cell_node, socket_index);
+            path.push_back(cell_node);
 
             node_now = node_prev; // 记得前进
         }
-        chain_prev[begin_pos] = begin_pos; // 保证路径上的每一个点都有前驱和后继
-        chain_next[end_pos]   = end_pos;
+        set_chain_prev(cell_id(begin_pos), cell_id(begin_pos)); // 保证路径上的每一个点都有前驱和后继
+        set_chain_next(end_cell, end_cell);
+        path.push_back(cell_id(begin_pos));
+        std::reverse(path.begin(), path.end()); // 路径按照从起点到终点的顺序记录
 
         // 返回路线总长度
-        return minG[end_pos];
+        socket_length[socket_index] = g_value[end_cell];
+        search_stats.length = g_value[end_cell];
+        return g_value[end_cell];
+    }
+
+    // 为一条连线布线，collect_stats 为 true 时记录统计信息
+    double route_socket(int socket_index, double budget = std::numeric_limits<double>::infinity()) {
+        if(!collect_stats) {
+            return create_path_for_socket(socket_index, budget);
+        }
+        auto begin_time = std::chrono::steady_clock::now();
+        double length = create_path_for_socket(socket_index, budget);
+        search_stats.seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - begin_time).count();
+        route_stats.push_back(search_stats);
+        return length;
     }
 
     // 算法核心：计算每一对 socket 之间的连接方式
     // 函数的返回值是所有连线的总长度
     void solveAll() {
-        assert(status == "unsolve");
+        assert(status == STATUS_UNSOLVED);
 
-        double total_len = 0;
+        route_stats.clear();
         for(auto [d, v]: distance_rank) {
-            if(DEBUG_OUTPUT) printf("creating path for %d\n", v); fflush(stdout);
+            if(DEBUG_OUTPUT) { printf("creating path for %d\n", v); fflush(stdout); }
+            route_socket(v); // 按照从近到远的顺序依次为所有 socket 对构建连线
+        }
+        summarize_answer();
+    }
+
+    // 带上界的求解：按照与 solveAll 相同的顺序布线，一旦已经布好的连线长度、失败连线的惩罚与剩余连线的长度下界之和超过 ceiling 就立即停止
+    // 返回 false 表示提前停止，此时目标函数值一定超过 ceiling；返回 true 时布线结果与 solveAll 完全相同
+    bool solveAllBounded(double ceiling) {
+        assert(status == STATUS_UNSOLVED);
 
-            double tmp;
-            tmp = create_path_for_socket(v); // 按照从近到远的顺序依次为所有 socket 对构建连线
+        // suffix_bound[k] 是第 k 条及之后所有连线的长度下界（两个插头之间的估价距离）之和
+        suffix_bound.assign(distance_rank.size() + 1, 0.0);
+        for(int k = (int)distance_rank.size() - 1; k >= 0; k -= 1) {
+            suffix_bound[k] = suffix_bound[k + 1] + std::get<0>(distance_rank[k]);
+        }
+
+        const double penalty = sqr(grid_size - 1) * 2.0; // 与 getAnswerLength 中的惩罚保持一致
+        double spent = 0; // 已经布线的连线长度之和，无法连接的连线按惩罚计算
+        route_stats.clear();
+        for(int k = 0; k < (int)distance_rank.size(); k += 1) {
+            int v = std::get<1>(distance_rank[k]);
+            // 超出预算而停止搜索只说明连线长度超过预算，或者无法连接而计入惩罚；惩罚不超过预算时后者仍然可能不超过 ceiling，
+            // 这时不能提前停止，只能完整搜索
+            double budget = ceiling - spent - suffix_bound[k + 1];
+            double length = route_socket(v, budget >= penalty ? std::numeric_limits<double>::infinity() : budget);
+            spent += std::isinf(length) ? penalty : length;
+            if(over_budget || spent + suffix_bound[k + 1] > ceiling) {
+                status = STATUS_ABORT;
+                return false;
+            }
+        }
+        summarize_answer();
+        return true;
+    }
+
+    // 协商布线的参数：最多迭代 NEGOTIATION_MAX_ITERATIONS 轮，连续 NEGOTIATION_PATIENCE 轮没有得到更好的结果时提前停止，第 k 轮（从 0 开始）穿过其他连线的代价为 PRESENT_BASE * PRESENT_GROWTH^k，
+    // 每次穿过一个位置，这个位置的历史拥塞代价增加 HISTORY_INCREMENT
+    static constexpr int NEGOTIATION_MAX_ITERATIONS = 16;
+    static constexpr int NEGOTIATION_PATIENCE = 4;
+    static constexpr double PRESENT_BASE = 1.0;
+    static constexpr double PRESENT_GROWTH = 1.5;
+    static constexpr double HISTORY_INCREMENT = 0.5;
+
+    // 协商布线使用的 A*：除了交叉点和插头以外，其他连线占据的位置也可以走，斜着穿过其他连线也是允许的，但是要付出拥塞代价
+    // 走入一个位置的代价为 步长 * (1 + 历史拥塞代价)，穿过其他连线时再加上 present_factor；代价不小于步长，因此估价函数仍然可用
+    // 找到路线时返回 true，路线按照从起点到终点的顺序写入 route，需要拆除的连线写入 victims
+    bool search_negotiated_path(int socket_index, double present_factor, IntList& route, IntList& victims) {
+        auto begin_pos = socket_position[socket_index][0];
+        auto end_pos   = socket_position[socket_index][1];
+        int begin_cell = cell_id(begin_pos);
+        int end_cell   = cell_id(end_pos);
+
+        const double inf = std::numeric_limits<double>::infinity();
+        std::vector<double> dist(board_stamp.size(), inf);
+        IntList parent(board_stamp.size(), -1);
+        typedef std::tuple<double, double, int> HeapItem; // 综合估价、已走的代价、位置
+        std::priority_queue<HeapItem, std::vector<HeapItem>, std::greater<HeapItem>> heap;
+        dist[begin_cell] = 0;
+        heap.push(std::make_tuple(distance_estimate(begin_pos, end_pos), 0.0, begin_cell));
+        while(!heap.empty()) {
+            auto [f, g, cell_now] = heap.top(); heap.pop();
+            if(g > dist[cell_now]) {
+                continue;
+            }
+            if(cell_now == end_cell) {
+                break;
+            }
+            int xnow = cell_now / board_width;
+            int ynow = cell_now % board_width;
+            for(int d = 0; d <= 7; d += 1) {
+                bool corner = d >= 4;
+                int xnxt = xnow + (corner ? CORNER_DX[d - 4] : DIR_DX[d]);
+                int ynxt = ynow + (corner ? CORNER_DY[d - 4] : DIR_DY[d]);
+                if(!(1 <= xnxt && xnxt <= grid_size && 1 <= ynxt && ynxt <= grid_size)) {
+                    continue;
+                }
+                int cell_nxt = cell_id(xnxt, ynxt);
+                int board_nxt = get_board(cell_nxt);
+                if(board_nxt != 0 && board_nxt != socket_index && fixed_cell[cell_nxt]) { // 交叉点以及其他连线的插头不能穿过
+                    continue;
+                }
+                double cost = (corner ? SQRT_2 : 1.0) * (1 + congestion_history[cell_nxt]);
+                bool congested = board_nxt != 0 && board_nxt != socket_index;
+                if(corner) {
+                    auto [pos_cor1, pos_cor2] = get_other_corners(xnow, ynow, xnxt, ynxt);
+                    int cor1 = cell_id(pos_cor1);
+                    int cor2 = cell_id(pos_cor2);
+                    int board_cor1 = get_board(cor1);
+                    if(board_cor1 != 0 && board_cor1 == get_board(cor2) && check_is_linked(cor1, cor2)) {
+                        congested = true;
+                    }
+                }
+                if(congested) {
+                    cost += present_factor;
+                }
+                double gnxt = g + cost;
+                if(gnxt < dist[cell_nxt]) {
+                    dist[cell_nxt] = gnxt;
+                    parent[cell_nxt] = cell_now;
+                    heap.push(std::make_tuple(gnxt + distance_estimate(std::make_tuple(xnxt, ynxt), end_pos), gnxt, cell_nxt));
+                }
+            }
+        }
+        if(std::isinf(dist[end_cell])) {
+            return false;
+        }
+
+        route.clear();
+        for(int cell = end_cell; cell != -1; cell = parent[cell]) {
+            route.push_back(cell);
+        }
+        std::reverse(route.begin(), route.end());
+
+        // 找出路线穿过的所有其他连线
+        victims.clear();
+        auto add_victim = [&](int w) {
+            if(std::find(victims.begin(), victims.end(), w) == victims.end()) {
+                victims.push_back(w);
+            }
+        };
+        for(int k = 0; k < (int)route.size(); k += 1) {
+            int board_now = get_board(route[k]);
+            if(board_now != 0 && board_now != socket_index) {
+                add_victim(board_now);
+            }
+            if(k > 0) {
+                int x1 = route[k - 1] / board_width, y1 = route[k - 1] % board_width;
+                int x2 = route[k] / board_width,     y2 = route[k] % board_width;
+                if(x1 != x2 && y1 != y2) {
+                    auto [pos_cor1, pos_cor2] = get_other_corners(x1, y1, x2, y2);
+                    int cor1 = cell_id(pos_cor1);
+                    int cor2 = cell_id(pos_cor2);
+                    int board_cor1 = get_board(cor1);
+                    if(board_cor1 != 0 && board_cor1 == get_board(cor2) && check_is_linked(cor1, cor2)) {
+                        add_victim(board_cor1);
+                    }
+                }
+            }
+        }
+        return true;
+    }
+
+    // 拆除一条连线，插头仍然保留在棋盘上
+    void rip_up(int socket_index) {
+        remove_path(socket_index);
+        socket_path[socket_index].clear();
+        socket_length[socket_index] = std::numeric_limits<double>::infinity();
+    }
+
+    // 协商布线（拆线重布）：先与 solveAll 一样按顺序布线，如果有连线失败，就让失败的连线穿过挡路的连线，
+    // 拆除被穿过的连线，铺设新的连线之后再为被拆除的连线重新布线（仍然按照普通的 A*，其他连线是障碍物）。
+    // 被争抢的位置的历史拥塞代价逐轮增加，穿过其他连线的代价也逐轮增大，从而避免两条连线反复互相拆除。
+    // 所有连线都布好或者达到迭代次数上限时停止，最终保留迭代过程中目标函数值最小的布线结果，因此结果不会比 solveAll 更差
+    void solveNegotiated() {
+        solveAll();
+        if(bad_pair == 0) {
+            return;
+        }
+
+        // 交叉点中心以及所有插头都是不能被拆除的位置
+        fixed_cell.assign(board_stamp.size(), 0);
+        for(int x = 1; x <= grid_size; x += 1) {
+            for(int y = 1; y <= grid_size; y += 1) {
+                if(get_board(cell_id(x, y)) < 0) {
+                    fixed_cell[cell_id(x, y)] = 1;
+                }
+            }
+        }
+        for(auto& [v, positions]: socket_position) {
+            for(auto pos: positions) {
+                fixed_cell[cell_id(pos)] = 1;
+            }
+        }
+        congestion_history.assign(board_stamp.size(), 0.0);
+
+        IntList rank(2 * crossing_number + 1); // 每条连线在 distance_rank 中的位置
+        for(int k = 0; k < (int)distance_rank.size(); k += 1) {
+            rank[std::get<1>(distance_rank[k])] = k;
+        }
+
+        double best_value = getAnswerLength();
+        std::vector<IntList> best_path = socket_path;
+        std::vector<double> best_length = socket_length;
+        IntList route, victims;
+        double present_factor = PRESENT_BASE;
+        int stall = 0;
+        for(int iteration = 0; iteration < NEGOTIATION_MAX_ITERATIONS && bad_pair != 0 && stall < NEGOTIATION_PATIENCE; iteration += 1) {
+            bool changed = false;
+            for(auto [d, v]: distance_rank) {
+                if(!std::isinf(socket_length[v])) {
+                    continue;
+                }
+                if(!search_negotiated_path(v, present_factor, route, victims)) {
+                    continue; // 被交叉点和插头完全挡住了，拆除其他连线也无济于事
+                }
+                changed = true;
+                for(int w: victims) {
+                    rip_up(w);
+                }
+                for(int cell: route) {
+                    if(!fixed_cell[cell]) {
+                        congestion_history[cell] += HISTORY_INCREMENT;
+                    }
+                }
+                socket_path[v] = route;
+                lay_path(v);
+
+                // 被拆除的连线按照原来的布线顺序重新布线，新的连线 v 是障碍物
+                std::sort(victims.begin(), victims.end(), [&](int a, int b) { return rank[a] < rank[b]; });
+                for(int w: victims) {
+                    create_path_for_socket(w);
+                }
+
+                // 协商得到的路线不一定最短，在当前棋盘上重新为 v 寻找最短路线，原来的路线仍然可走，因此一定能找到
+                rip_up(v);
+                create_path_for_socket(v);
+            }
+            summarize_answer();
+            if(getAnswerLength() < best_value) {
+                best_value = getAnswerLength();
+                best_path = socket_path;
+                best_length = socket_length;
+                stall = 0;
+            }else {
+                stall += 1;
+            }
+            if(!changed) {
+                break;
+            }
+            present_factor *= PRESENT_GROWTH;
+        }
+
+        // 恢复到目标函数值最小的布线结果
+        if(getAnswerLength() > best_value) {
+            for(int v = 1; v <= 2 * crossing_number; v += 1) {
+                remove_path(v);
+            }
+            socket_path = best_path;
+            socket_length = best_length;
+            for(int v = 1; v <= 2 * crossing_number; v += 1) {
+                lay_path(v);
+            }
+            summarize_answer();
+        }
+    }
+
+    // 按照指定的布线模式求解
+    void solveWithMode(int mode) {
+        if(mode == ROUTING_NEGOTIATED) {
+            solveNegotiated();
+        }else {
+            solveAll();
+        }
+    }
+
+    // 按照布线顺序输出每条连线的统计信息，最多输出 capacity 条，返回输出的条数
+    // 带上界求解提前停止时，没有尝试布线的连线也会输出，状态为 ROUTE_SKIPPED
+    int exportRouteStats(RouteStats* out, int capacity) const {
+        int count = 0;
+        for(int k = 0; k < (int)distance_rank.size() && count < capacity; k += 1) {
+            if(k < (int)route_stats.size()) {
+                out[count] = route_stats[k];
+            }else {
+                out[count] = RouteStats{std::get<1>(distance_rank[k]), ROUTE_SKIPPED, 0, 0, 0, 0,
+                    std::numeric_limits<double>::infinity(), 0.0};
+            }
+            count += 1;
+        }
+        return count;
+    }
+
+    // 导出布线结果的几何信息，所有数组由调用者分配，Python 中可以直接传入 numpy 数组
+    // arc_offsets[0 ~ 2 * crossing_number]：弧线 v（编号 1 ~ 2 * crossing_number）的点为 points 中的第 arc_offsets[v - 1] ~ arc_offsets[v] - 1 个点
+    // points[2 * k], points[2 * k + 1]：第 k 个点的坐标 x, y；每条弧线从一端交叉点的中心出发，依次经过插头、连线、另一端的插头，
+    //     到达另一端交叉点的中心；连线失败的弧线没有点
+    // crossings[4 * i ~ 4 * i + 3]：第 i 个交叉点的 x, y, 朝向，以及从下方穿过的弧线的方向（0 表示沿 x 轴，1 表示沿 y 轴）
+    // 最多写入 point_capacity 个点，返回需要的总点数；每个位置至多属于一条连线，
+    // 因此 point_capacity 不小于 grid_size * grid_size + 4 * crossing_number 时一定足够
+    int exportGeometry(int* arc_offsets, int* points, int point_capacity, int* crossings) const {
+        for(int i = 0; i < crossing_number; i += 1) {
+            auto [posx, posy] = pos_list[i];
+            crossings[4 * i + 0] = posx;
+            crossings[4 * i + 1] = posy;
+            crossings[4 * i + 2] = direction_list[i];
+            crossings[4 * i + 3] = DIR_DX[direction_list[i]] != 0 ? 0 : 1; // pd_code 中第 0、2 个插头属于从下方穿过的弧线
+        }
+        int count = 0;
+        auto emit = [&](int x, int y) {
+            if(count < point_capacity) {
+                points[2 * count + 0] = x;
+                points[2 * count + 1] = y;
+            }
+            count += 1;
+        };
+        arc_offsets[0] = 0;
+        for(int v = 1; v <= 2 * crossing_number; v += 1) {
+            const IntList& path = socket_path[v];
+            if(!path.empty()) {
+                const IntPairList& owners = socket_owner.find(v) -> second;
+                const IntPairList& positions = socket_position.find(v) -> second;
+                int first = cell_id(positions[0]) == path.front() ? 0 : 1; // 连线的起点属于哪一个交叉点
+                auto [start_x, start_y] = pos_list[std::get<0>(owners[first])];
+                auto [end_x, end_y] = pos_list[std::get<0>(owners[1 - first])];
+                emit(start_x, start_y);
+                for(int cell: path) {
+                    emit(cell / board_width, cell % board_width);
+                }
+                emit(end_x, end_y);
+            }
+            arc_offsets[v] = std::min(count, point_capacity);
+        }
+        return count;
+    }
+
+    // 根据每条连线的长度统计总长度以及无法连接的 socket 数目
+    // 累加顺序与 distance_rank 一致，保证结果与逐条布线时累加的结果完全相同
+    void summarize_answer() {
+        double total_len = 0;
+        bad_pair = 0;
+        for(auto [d, v]: distance_rank) {
+            double tmp = socket_length[v];
             if(std::isinf(tmp)) {
                 bad_pair += 1;
             }else {
@@ -507,28 +1161,505 @@ public:
         answer_length = total_len;
 
         if(bad_pair != 0) { // 有无法连接的 socket 共计 bad_pair 个
-            status = "fail";
+            status = STATUS_FAIL;
         }else {
-            status = "success";
+            status = STATUS_SUCCESS;
         }
     }
 
     // 输出节点之间的连接关系
     void outputChainMap() {
-        if(status == "unsolve") { // 调用时自动求解即可
+        if(status == STATUS_UNSOLVED) { // 调用时自动求解即可
             solveAll();
         }
-        for(auto [pos_now, pos_nxt]: chain_next) {
-            auto [x1, y1] = pos_now;
-            auto [x2, y2] = pos_nxt;
-            if(pos_now != pos_nxt) {
-                printf("link: %d %d and %d %d\n", x1, y1, x2, y2);
+        for(int x1 = 1; x1 <= grid_size; x1 += 1) { // 按照坐标的字典序输出
+            for(int y1 = 1; y1 <= grid_size; y1 += 1) {
+                int cell_now = cell_id(x1, y1);
+                if(!has_chain(cell_now) || chain_next[cell_now] < 0) {
+                    continue;
+                }
+                int x2 = chain_next[cell_now] / board_width;
+                int y2 = chain_next[cell_now] % board_width;
+                if(chain_next[cell_now] != cell_now) {
+                    printf("link: %d %d and %d %d\n", x1, y1, x2, y2);
+                }
             }
         }
         printf("json: %s\n", serialize().c_str()); // 输出一个 json 字符串版本
     }
 };
 
+// 增量求解器：保存当前布局的完整布线结果
+// 每次移动少量交叉点时，只拆除与被移动交叉点相连的连线，以及挡住交叉点新位置的连线，然后重新布线
+// 通过 commit / rollback 决定保留本次移动，还是恢复到移动之前的状态
+class IncrementalSolver: public AlgorithmInput {
+private:
+    struct RippedSocket { // 被拆除的连线的原始信息，用于回滚
+        int socket_index;
+        IntList path;
+        double length;
+        IntList search_cells;
+    };
+    struct MovedCrossing { // 被移动的交叉点的原始位置和朝向，用于回滚
+        int crossing_index;
+        std::tuple<int, int> pos;
+        int direction;
+    };
+
+    bool pending = false;     // 是否有尚未 commit / rollback 的移动
+    bool exact_state = true;  // 当前布线结果是否与对当前布局调用 solveAll 的结果完全一致
+    int last_exact = 1;       // 最近一次移动之后的布线结果是否与调用 solveAll 的结果完全一致，-1 表示尚未计算
+    IntList moved_index;      // 本次移动涉及的交叉点编号（去重）
+    IntList footprint_cells;  // 被移动的交叉点在移动前后占据的所有位置
+    std::vector<MovedCrossing> moved_crossings;
+    std::vector<RippedSocket> ripped_sockets;
+    std::vector<std::tuple<double, int>> old_distance_rank;
+    std::vector<char> is_ripped; // 使用弧线编号作为下标
+    IntPairList new_pos_list;    // validMoves 中移动之后的交叉点位置
+    unsigned mark_generation = 0;  // 用于在 check_exact 中标记一条连线在搜索时读取过的位置
+    std::vector<unsigned> mark_stamp;
+
+    int get_pd_label(int i, int j) const { // 第 i 个交叉点的第 j 个插头的弧线编号
+        auto [a, b, c, d] = pd_code[i];
+        int labels[4] = {a, b, c, d};
+        return labels[j];
+    }
+    std::tuple<int, int> get_socket_pos(int i, int j) const { // 第 i 个交叉点的第 j 个插头的位置
+        auto [posx, posy] = pos_list[i];
+        return std::make_tuple(
+            posx + DIR_DX[(j + direction_list[i]) % 4],
+            posy + DIR_DY[(j + direction_list[i]) % 4]);
+    }
+    void get_crossing_cells(int i, int* cells) const { // 交叉点占据的五个位置：中心以及四个插头
+        cells[0] = cell_id(pos_list[i]);
+        for(int j = 0; j <= 3; j += 1) {
+            cells[j + 1] = cell_id(get_socket_pos(i, j));
+        }
+    }
+    void remove_crossing(int i) { // 从棋盘上拿走一个交叉点，与之相连的连线需要事先拆除
+        int cells[5];
+        get_crossing_cells(i, cells);
+        for(int cell: cells) {
+            set_board(cell, 0);
+            chain_stamp[cell] = 0;
+        }
+    }
+    void place_crossing(int i) { // 在棋盘上放置一个交叉点
+        set_board(cell_id(pos_list[i]), -1 - direction_list[i]);
+        for(int j = 0; j <= 3; j += 1) {
+            set_board(cell_id(get_socket_pos(i, j)), get_pd_label(i, j));
+        }
+    }
+    void refresh_socket_position(int socket_index) { // 根据交叉点的新位置更新插头位置
+        auto& owners = socket_owner[socket_index];
+        auto& positions = socket_position[socket_index];
+        for(int k = 0; k < 2; k += 1) {
+            auto [i, j] = owners[k];
+            positions[k] = get_socket_pos(i, j);
+        }
+    }
+    void rebuild_distance_rank() { // 与 inputFromIII 中的排序规则保持一致
+        distance_rank.clear();
+        for(int v = 1; v <= 2 * crossing_number; v += 1) {
+            distance_rank.push_back(std::make_tuple(get_distance_between_socket(v), v));
+        }
+        std::sort(distance_rank.begin(), distance_rank.end());
+        std::reverse(distance_rank.begin(), distance_rank.end());
+    }
+    void rip_socket(int socket_index) { // 拆除一条连线，并记录下原始信息
+        if(is_ripped[socket_index]) {
+            return;
+        }
+        is_ripped[socket_index] = 1;
+        ripped_sockets.push_back((RippedSocket){
+            .socket_index=socket_index,
+            .path=socket_path[socket_index],
+            .length=socket_length[socket_index],
+            .search_cells=socket_search_cells[socket_index]
+        });
+        remove_path(socket_index);
+        socket_path[socket_index].clear();
+        socket_length[socket_index] = std::numeric_limits<double>::infinity();
+    }
+
+    // 标记连线 v 在搜索时读取过的所有位置：拓展过的位置以及它们周围一圈
+    void mark_search_cells(int v) {
+        bump_generation(mark_generation, mark_stamp);
+        for(int cell: socket_search_cells[v]) {
+            mark_around(cell);
+        }
+    }
+    void mark_around(int cell) { // 标记一个位置及其周围一圈
+        for(int dx = -1; dx <= 1; dx += 1) {
+            for(int dy = -1; dy <= 1; dy += 1) {
+                mark_stamp[cell + dx * board_width + dy] = mark_generation;
+            }
+        }
+    }
+    bool marked_any(const IntList& cells) const {
+        for(int cell: cells) {
+            if(mark_stamp[cell] == mark_generation) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    // 判断本次移动之后的布线结果能否与 solveAll 完全一致
+    // 假设 solveAll 得到的每条连线与当前结果相同，那么每条连线在 solveAll 中搜索时看到的棋盘，
+    // 只要在它读取过的位置上与它上一次实际搜索时看到的棋盘相同，搜索过程就完全相同，假设成立
+    // 1. 保留的连线上一次搜索时看到的是：旧的交叉点位置，以及旧顺序中排在它前面的连线的旧路径
+    // 2. 重新布线的连线看到的是：新的交叉点位置，所有保留的连线，以及新顺序中排在它前面的重新布线的连线
+    bool check_exact() {
+        IntList old_rank(2 * crossing_number + 1), new_rank(2 * crossing_number + 1);
+        for(int k = 0; k < (int)distance_rank.size(); k += 1) {
+            old_rank[std::get<1>(old_distance_rank[k])] = k;
+            new_rank[std::get<1>(distance_rank[k])] = k;
+        }
+        for(int v = 1; v <= 2 * crossing_number; v += 1) {
+            mark_search_cells(v);
+            if(!is_ripped[v]) {
+                if(marked_any(footprint_cells)) {
+                    return false;
+                }
+                for(auto& ripped: ripped_sockets) {
+                    int u = ripped.socket_index;
+                    if(old_rank[u] < old_rank[v] && marked_any(ripped.path)) {
+                        return false;
+                    }
+                    if(new_rank[u] < new_rank[v] && marked_any(socket_path[u])) {
+                        return false;
+                    }
+                }
+            }else {
+                for(int u = 1; u <= 2 * crossing_number; u += 1) {
+                    if(!is_ripped[u] && new_rank[u] > new_rank[v] && marked_any(socket_path[u])) {
+                        return false;
+                    }
+                }
+            }
+        }
+        return true;
+    }
+
+public:
+    // 输入完整布局，并对其进行完整的求解
+    void initialize(IntInputInterface& iii) {
+        record_search_cells = true;
+        inputFromIII(true, iii);
+        mark_stamp.assign(board_stamp.size(), 0);
+        solveAll();
+        is_ripped.assign(2 * crossing_number + 1, 0);
+        pending = false;
+        exact_state = true;
+        last_exact = 1;
+    }
+
+    // 检查移动之后的布局是否合法：下标在范围内，交叉点不越界，朝向为 0 ~ 3，任意两个交叉点的曼哈顿距离不小于 3
+    // 同一个交叉点出现多次时以最后一次为准，与 propose 中的处理方式一致
+    bool validMoves(const int* moves, int move_count) {
+        if(move_count < 0) {
+            return false;
+        }
+        new_pos_list = pos_list;
+        for(int k = 0; k < move_count; k += 1) {
+            int i = moves[4 * k], posx = moves[4 * k + 1], posy = moves[4 * k + 2], direction_delta = moves[4 * k + 3];
+            if(!(0 <= i && i < crossing_number && 2 <= posx && posx <= grid_size - 1 && 2 <= posy && posy <= grid_size - 1
+                    && 0 <= direction_delta && direction_delta <= 3)) {
+                return false;
+            }
+            new_pos_list[i] = std::make_tuple(posx, posy);
+        }
+        for(int k = 0; k < move_count; k += 1) {
+            int i = moves[4 * k];
+            for(int t = 0; t < crossing_number; t += 1) {
+                if(t != i && get_manhattan_distance(new_pos_list[i], new_pos_list[t]) < 3) {
+                    return false;
+                }
+            }
+        }
+        return true;
+    }
+
+    // 尝试移动若干个交叉点，moves 中每四个整数描述一次移动：交叉点下标（从 0 开始），新位置 x，新位置 y，新朝向
+    // 返回移动之后的目标函数值，之后必须调用 commit 或者 rollback；移动不合法时返回 NaN，状态保持不变，也不需要 commit 或者 rollback
+    double propose(const int* moves, int move_count) {
+        assert(status != STATUS_UNSOLVED);
+        assert(!pending);
+        if(!validMoves(moves, move_count)) {
+            return std::numeric_limits<double>::quiet_NaN();
+        }
+        pending = true;
+        moved_index.clear();
+        moved_crossings.clear();
+        ripped_sockets.clear();
+        old_distance_rank = distance_rank;
+        std::fill(is_ripped.begin(), is_ripped.end(), 0);
+        footprint_cells.clear();
+        last_exact = -1;
+
+        // 记录被移动的交叉点的原始信息，同一个交叉点只记录一次
+        for(int k = 0; k < move_count; k += 1) {
+            int i = moves[4 * k];
+            assert(0 <= i && i < crossing_number);
+            if(std::find(moved_index.begin(), moved_index.end(), i) == moved_index.end()) {
+                moved_index.push_back(i);
+                moved_crossings.push_back((MovedCrossing){
+                    .crossing_index=i,
+                    .pos=pos_list[i],
+                    .direction=direction_list[i]
+                });
+            }
+        }
+
+        // 拆除与被移动的交叉点相连的连线，然后把交叉点从棋盘上拿走
+        for(int i: moved_index) {
+            for(int j = 0; j <= 3; j += 1) {
+                rip_socket(get_pd_label(i, j));
+            }
+        }
+        for(int i: moved_index) {
+            int cells[5];
+            get_crossing_cells(i, cells);
+            footprint_cells.insert(footprint_cells.end(), cells, cells + 5);
+            remove_crossing(i);
+        }
+
+        // 更新位置和朝向，检查方式与 inputFromIII 保持一致
+        for(int k = 0; k < move_count; k += 1) {
+            int i = moves[4 * k], posx = moves[4 * k + 1], posy = moves[4 * k + 2], direction_delta = moves[4 * k + 3];
+            assert(1 <= posx - 1 && posx + 1 <= grid_size);
+            assert(1 <= posy - 1 && posy + 1 <= grid_size);
+            assert(0 <= direction_delta && direction_delta <= 3);
+            pos_list[i] = std::make_tuple(posx, posy);
+            direction_list[i] = direction_delta;
+        }
+        for(int i: moved_index) { // 曼哈顿距离小于 3 的两个交叉点一定会重叠
+            for(int t = 0; t < crossing_number; t += 1) {
+                assert(t == i || get_manhattan_distance(pos_list[i], pos_list[t]) >= 3);
+            }
+        }
+
+        // 拆除挡住交叉点新位置的连线，然后放置交叉点
+        for(int i: moved_index) {
+            int cells[5];
+            get_crossing_cells(i, cells);
+            for(int cell: cells) {
+                if(get_board(cell) > 0) {
+                    rip_socket(get_board(cell));
+                }
+            }
+        }
+
+        // 之前连线失败的连线，如果搜索时读取过的位置被腾空了，就有可能连线成功，也需要重新布线
+        // 否则它能到达的区域只会变小，仍然会失败
+        bump_generation(mark_generation, mark_stamp);
+        for(int k = 0; k < (int)footprint_cells.size(); k += 1) { // 此时 footprint_cells 中只有旧位置
+            mark_around(footprint_cells[k]);
+        }
+        for(auto& ripped: ripped_sockets) {
+            for(int cell: ripped.path) {
+                mark_around(cell);
+            }
+        }
+        for(int v = 1; v <= 2 * crossing_number; v += 1) {
+            if(!is_ripped[v] && std::isinf(socket_length[v]) && marked_any(socket_search_cells[v])) {
+                rip_socket(v);
+            }
+        }
+        for(int i: moved_index) {
+            int cells[5];
+            get_crossing_cells(i, cells);
+            footprint_cells.insert(footprint_cells.end(), cells, cells + 5);
+            place_crossing(i);
+            for(int j = 0; j <= 3; j += 1) {
+                refresh_socket_position(get_pd_label(i, j));
+            }
+        }
+        rebuild_distance_rank();
+
+        // 按照 distance_rank 的顺序为被拆除的连线重新布线
+        for(auto [d, v]: distance_rank) {
+            if(is_ripped[v]) {
+                create_path_for_socket(v);
+            }
+        }
+        summarize_answer();
+        return getAnswerLength();
+    }
+
+    // 保留最近一次移动
+    void commit() {
+        assert(pending);
+        exact_state = exact_state && lastProposalIsExact();
+        pending = false;
+    }
+
+    // 撤销最近一次移动，恢复到移动之前的布线结果
+    void rollback() {
+        assert(pending);
+        for(auto& ripped: ripped_sockets) {
+            remove_path(ripped.socket_index);
+        }
+        for(auto& moved: moved_crossings) {
+            remove_crossing(moved.crossing_index);
+        }
+        for(auto& moved: moved_crossings) {
+            pos_list[moved.crossing_index] = moved.pos;
+            direction_list[moved.crossing_index] = moved.direction;
+        }
+        for(auto& moved: moved_crossings) {
+            place_crossing(moved.crossing_index);
+            for(int j = 0; j <= 3; j += 1) {
+                refresh_socket_position(get_pd_label(moved.crossing_index, j));
+            }
+        }
+        distance_rank = old_distance_rank;
+        for(auto& ripped: ripped_sockets) {
+            socket_path[ripped.socket_index] = ripped.path;
+            socket_length[ripped.socket_index] = ripped.length;
+            socket_search_cells[ripped.socket_index] = ripped.search_cells;
+            lay_path(ripped.socket_index);
+        }
+        summarize_answer();
+        pending = false;
+        if(last_exact < 0) { // 回滚之后已经无法再计算，视为不一致
+            last_exact = 0;
+        }
+    }
+
+    // 检查的代价不低，所以只在需要的时候计算，并且需要在 commit / rollback 之前调用
+    // 一旦当前状态已经与 solveAll 不一致，之后的检查也就没有必要了
+    bool lastProposalIsExact() {
+        if(last_exact < 0) {
+            last_exact = (exact_state && check_exact()) ? 1 : 0;
+        }
+        return last_exact == 1;
+    }
+};
+
+// 可以重复使用的求解上下文：创建时解析并检查一次 pd_code，之后每次只输入交叉点的位置和朝向
+// 棋盘、链表与 A* 使用的数组都依靠代数戳清空，socket_position、socket_owner 等映射的键在创建时就已经确定，
+// 搜索树的节点容器、堆以及每条连线的路径数组在多次求解之间保留容量，因此按顺序布线时每次求解几乎不需要申请内存
+// 求解结果与对同一个布局调用 call_main_with_array（以及 _bounded、_stats、_mode 版本）完全相同
+// 一个上下文同一时间只能被一个线程使用
+class SolverContext: public AlgorithmInput {
+private:
+    std::vector<int> labels; // labels[4 * i + j] 为第 i 个交叉点的第 j 个插头的弧线编号
+
+public:
+    // pd_code 中依次存放每个交叉点的四个弧线编号，要求每个编号（1 ~ 2 * crossing_number）恰好出现两次
+    // 返回 false 表示输入不合法
+    bool create(const int* pd_code_arr, int crossing_number_in, int grid_size_in) {
+        clear();
+        if(crossing_number_in <= 0 || grid_size_in < 3) {
+            return false;
+        }
+        grid_size = grid_size_in;
+        crossing_number = crossing_number_in;
+        prepare_grid();
+        labels.assign(pd_code_arr, pd_code_arr + 4 * crossing_number);
+        for(int i = 0; i < crossing_number; i += 1) {
+            const int* l = pd_code_arr + 4 * i;
+            for(int j = 0; j <= 3; j += 1) {
+                if(l[j] < 1 || l[j] > 2 * crossing_number) {
+                    return false;
+                }
+                count_number[l[j]] += 1;
+                socket_owner[l[j]].push_back(std::make_tuple(i, j));
+                socket_position[l[j]].push_back(std::make_tuple(0, 0));
+            }
+            pd_code.push_back(std::make_tuple(l[0], l[1], l[2], l[3]));
+            pos_list.push_back(std::make_tuple(0, 0));
+            direction_list.push_back(0);
+        }
+        for(int v = 1; v <= 2 * crossing_number; v += 1) {
+            if(count_number[v] != 2) {
+                return false;
+            }
+        }
+        socket_path.assign(2 * crossing_number + 1, IntList());
+        socket_length.assign(2 * crossing_number + 1, std::numeric_limits<double>::infinity());
+        socket_search_cells.assign(2 * crossing_number + 1, IntList());
+        distance_rank.reserve(2 * crossing_number);
+        route_stats.reserve(2 * crossing_number);
+        return true;
+    }
+
+    // 输入一个布局：第 i 个交叉点的位置为 positions[i * pos_stride], positions[i * pos_stride + 1]，朝向为 directions[i * dir_stride]
+    // 使用步长读取，因此 Layout 中的 pos、direction 视图可以不经复制直接传入
+    // 返回 false 表示布局不合法（越界或者交叉点重叠），此时状态为 STATUS_INVALID
+    bool load(const int* positions, int pos_stride, const int* directions, int dir_stride) {
+        status = STATUS_UNSOLVED;
+        bad_pair = 0;
+        answer_length = 0;
+        route_stats.clear();
+        next_board_generation();
+        int occupied_cell_count = 0;
+        auto occupy_cell = [&](int cell, int value) {
+            if(board_stamp[cell] != board_generation) {
+                occupied_cell_count += 1;
+            }
+            set_board(cell, value);
+        };
+        for(int i = 0; i < crossing_number; i += 1) {
+            int posx = positions[i * pos_stride], posy = positions[i * pos_stride + 1];
+            int direction_delta = directions[i * dir_stride];
+            if(!(2 <= posx && posx <= grid_size - 1 && 2 <= posy && posy <= grid_size - 1 && 0 <= direction_delta && direction_delta <= 3)) {
+                status = STATUS_INVALID;
+                return false;
+            }
+            pos_list[i] = std::make_tuple(posx, posy);
+            direction_list[i] = direction_delta;
+            occupy_cell(cell_id(posx, posy), -1 - direction_delta);
+            for(int j = 0; j <= 3; j += 1) {
+                occupy_cell(cell_id(posx + DIR_DX[(j + direction_delta) % 4], posy + DIR_DY[(j + direction_delta) % 4]), labels[4 * i + j]);
+            }
+        }
+        if(occupied_cell_count != 5 * crossing_number) {
+            status = STATUS_INVALID;
+            return false;
+        }
+
+        // 两个映射的键相同（都是 1 ~ 2 * crossing_number），同时遍历，不需要查找
+        distance_rank.clear();
+        auto position_iter = socket_position.begin();
+        for(auto& [v, owners]: socket_owner) {
+            IntPairList& positions_v = position_iter -> second;
+            for(int k = 0; k < 2; k += 1) {
+                auto [i, j] = owners[k];
+                auto [posx, posy] = pos_list[i];
+                positions_v[k] = std::make_tuple(posx + DIR_DX[(j + direction_list[i]) % 4], posy + DIR_DY[(j + direction_list[i]) % 4]);
+            }
+            distance_rank.push_back(std::make_tuple(distance_estimate(positions_v[0], positions_v[1]), v));
+            socket_path[v].clear();
+            socket_length[v] = std::numeric_limits<double>::infinity();
+            ++position_iter;
+        }
+        std::sort(distance_rank.begin(), distance_rank.end()); // 与 inputFromIII 中的排序规则保持一致
+        std::reverse(distance_rank.begin(), distance_rank.end());
+        return true;
+    }
+
+    // 输入并求解一个布局，mode 为 RoutingMode；按顺序布线时目标函数值一定超过 ceiling 就提前停止并返回正无穷（协商布线忽略 ceiling）
+    // 布局不合法时返回 NaN
+    double evaluate(const int* positions, int pos_stride, const int* directions, int dir_stride, double ceiling, int mode) {
+        if(!load(positions, pos_stride, directions, dir_stride)) {
+            return std::numeric_limits<double>::quiet_NaN();
+        }
+        if(mode == ROUTING_NEGOTIATED) {
+            solveNegotiated();
+        }else if(!solveAllBounded(ceiling)) { // ceiling 为正无穷时与 solveAll 完全相同
+            return std::numeric_limits<double>::infinity();
+        }
+        return getAnswerLength();
+    }
+
+    SolveStatus getStatus() const {
+        return status;
+    }
+};
+
 class FileIntInputInterface: public IntInputInterface{
 private:
     FILE* fpin;
@@ -598,6 +1729,170 @@ extern "C" double call_main_with_array(int* arr, int cnt) {
     return algo_input.getAnswerLength();
 }
 
+// 与 call_main_with_array 相同，mode 为 RoutingMode，选择按顺序布线还是协商布线
+// mode 为 ROUTING_SEQUENTIAL 时与 call_main_with_array 完全相同
+extern "C" double call_main_with_array_mode(int* arr, int cnt, int mode) {
+    auto iii = ArrayIntInputInterface(arr, cnt);
+
+    AlgorithmInput algo_input;
+    algo_input.inputFromIII(true, iii);
+    algo_input.solveWithMode(mode);
+    return algo_input.getAnswerLength();
+}
+
+// 与 call_main_with_array 相同，但是当目标函数值一定超过 ceiling 时提前停止布线，并返回正无穷
+// 没有提前停止时，返回值与 call_main_with_array 完全相同
+extern "C" double call_main_with_array_bounded(int* arr, int cnt, double ceiling) {
+    auto iii = ArrayIntInputInterface(arr, cnt);
+
+    AlgorithmInput algo_input;
+    algo_input.inputFromIII(true, iii);
+    if(!algo_input.solveAllBounded(ceiling)) {
+        return std::numeric_limits<double>::infinity();
+    }
+    return algo_input.getAnswerLength();
+}
+
+// 与 call_main_with_array_bounded 相同，同时按照布线顺序把每条连线的统计信息写入 out（最多 capacity 条，通常为 2 * crossing_number）
+// ceiling 为正无穷时与 call_main_with_array 完全相同
+extern "C" double call_main_with_array_stats(int* arr, int cnt, double ceiling, RouteStats* out, int capacity) {
+    auto iii = ArrayIntInputInterface(arr, cnt);
+
+    AlgorithmInput algo_input;
+    algo_input.inputFromIII(true, iii);
+    algo_input.setCollectStats(true);
+    bool finished = algo_input.solveAllBounded(ceiling);
+    algo_input.exportRouteStats(out, capacity);
+    if(!finished) {
+        return std::numeric_limits<double>::infinity();
+    }
+    return algo_input.getAnswerLength();
+}
+
+// 与 call_main_with_array_mode 相同，同时把布线结果的几何信息写入调用者提供的数组，格式见 AlgorithmInput::exportGeometry
+// arc_offsets 的长度为 2 * crossing_number + 1，points 至少可以容纳 point_capacity 个点（2 * point_capacity 个整数），crossings 的长度为 4 * crossing_number
+// 需要的总点数写入 *point_count，超过 point_capacity 时多出的点被丢弃
+extern "C" double call_main_with_array_geometry(int* arr, int cnt, int mode, int* arc_offsets, int* points, int point_capacity, int* crossings, int* point_count) {
+    auto iii = ArrayIntInputInterface(arr, cnt);
+
+    AlgorithmInput algo_input;
+    algo_input.inputFromIII(true, iii);
+    algo_input.solveWithMode(mode);
+    *point_count = algo_input.exportGeometry(arc_offsets, points, point_capacity, crossings);
+    return algo_input.getAnswerLength();
+}
+
+// 批量计算多个布局的目标函数值，使用多个线程并行计算
+// arr 中依次存放 k 个布局，每个布局的格式与 call_main_with_array 相同
+// 第 i 个布局为 arr[offsets[i]] ~ arr[offsets[i + 1] - 1]，因此 offsets 的长度为 k + 1
+// 结果写入 out[0] ~ out[k - 1]，nthreads <= 0 时使用所有可用的硬件线程，mode 为 RoutingMode
+extern "C" void call_main_with_batch_mode(int* arr, int* offsets, int k, double* out, int nthreads, int mode) {
+    if(nthreads <= 0) {
+        nthreads = (int)std::thread::hardware_concurrency();
+    }
+    nthreads = std::max(1, std::min(nthreads, k));
+
+    std::atomic<int> next_index(0); // 每个线程每次领取一个布局
+    auto worker = [&]() {
+        AlgorithmInput algo_input; // 同一个线程内复用，棋盘数组不需要重新申请
+        for(int i = next_index++; i < k; i = next_index++) {
+            auto iii = ArrayIntInputInterface(arr + offsets[i], offsets[i + 1] - offsets[i]);
+            algo_input.inputFromIII(true, iii);
+            algo_input.solveWithMode(mode);
+            out[i] = algo_input.getAnswerLength();
+        }
+    };
+
+    std::vector<std::thread> threads;
+    for(int t = 1; t < nthreads; t += 1) {
+        threads.emplace_back(worker);
+    }
+    worker(); // 当前线程也参与计算
+    for(auto& thread: threads) {
+        thread.join();
+    }
+}
+
+// 按顺序布线的批量计算，与 call_main_with_batch_mode(..., ROUTING_SEQUENTIAL) 相同
+extern "C" void call_main_with_batch(int* arr, int* offsets, int k, double* out, int nthreads) {
+    call_main_with_batch_mode(arr, offsets, k, out, nthreads, ROUTING_SEQUENTIAL);
+}
+
+// 以下函数用于操作增量求解器，handle 由 incremental_create 创建，使用完毕后需要调用 incremental_destroy
+// arr 和 cnt 的格式与 call_main_with_array 完全相同
+extern "C" void* incremental_create(int* arr, int cnt) {
+    auto iii = ArrayIntInputInterface(arr, cnt);
+
+    auto solver = new IncrementalSolver();
+    solver -> initialize(iii);
+    return solver;
+}
+
+// moves 中每四个整数描述一次移动：交叉点下标（从 0 开始），新位置 x，新位置 y，新朝向
+extern "C" double incremental_propose(void* handle, int* moves, int move_count) {
+    return ((IncrementalSolver*)handle) -> propose(moves, move_count);
+}
+
+extern "C" void incremental_commit(void* handle) {
+    ((IncrementalSolver*)handle) -> commit();
+}
+
+extern "C" void incremental_rollback(void* handle) {
+    ((IncrementalSolver*)handle) -> rollback();
+}
+
+// 当前布线结果的目标函数值
+extern "C" double incremental_current_length(void* handle) {
+    return ((IncrementalSolver*)handle) -> getAnswerLength();
+}
+
+// 最近一次 propose 的结果是否与直接调用 call_main_with_array 的结果完全一致
+extern "C" int incremental_last_exact(void* handle) {
+    return ((IncrementalSolver*)handle) -> lastProposalIsExact() ? 1 : 0;
+}
+
+extern "C" void incremental_destroy(void* handle) {
+    delete (IncrementalSolver*)handle;
+}
+
+// 以下函数用于操作求解上下文，context 由 create_context 创建，使用完毕后需要调用 destroy_context
+// pd_code 中依次存放每个交叉点的四个弧线编号（共 4 * crossing_number 个整数），pd_code 不合法时返回空指针
+extern "C" void* create_context(int* pd_code, int crossing_number, int grid_size) {
+    auto context = new SolverContext();
+    if(!context -> create(pd_code, crossing_number, grid_size)) {
+        delete context;
+        return nullptr;
+    }
+    return context;
+}
+
+// 第 i 个交叉点的位置为 positions[i * pos_stride], positions[i * pos_stride + 1]，朝向为 directions[i * dir_stride]
+// 返回值与对同一个布局调用 call_main_with_array_bounded（mode 为 ROUTING_NEGOTIATED 时为 call_main_with_array_mode）相同，布局不合法时返回 NaN
+extern "C" double context_evaluate(void* context, int* positions, int pos_stride, int* directions, int dir_stride, double ceiling, int mode) {
+    return ((SolverContext*)context) -> evaluate(positions, pos_stride, directions, dir_stride, ceiling, mode);
+}
+
+// 与 context_evaluate 相同（按顺序布线），同时把每条连线的统计信息写入 out，含义与 call_main_with_array_stats 相同
+extern "C" double context_evaluate_stats(void* context, int* positions, int pos_stride, int* directions, int dir_stride, double ceiling, RouteStats* out, int capacity) {
+    auto solver = (SolverContext*)context;
+    solver -> setCollectStats(true);
+    double value = solver -> evaluate(positions, pos_stride, directions, dir_stride, ceiling, ROUTING_SEQUENTIAL);
+    solver -> setCollectStats(false);
+    if(solver -> getStatus() != STATUS_INVALID) {
+        solver -> exportRouteStats(out, capacity);
+    }
+    return value;
+}
+
+// 最近一次求解的状态，见 enum SolveStatus
+extern "C" int context_status(void* context) {
+    return ((SolverContext*)context) -> getStatus();
+}
+
+extern "C" void destroy_context(void* context) {
+    delete (SolverContext*)context;
+}
+
 // 程序使用方式
 // 1. ./line_checker.out 直接使用：这样的话会启用 stdin 并交互式输入数据
 // 2. ./line_checker.out "文件路径"：从文件路径中读取出数据，不输出交互信息
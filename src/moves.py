@@ -0,0 +1,276 @@
+import math
+import random
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import call_line_checker
+from layout import Layout
+
+# 根据布线结果引导的邻域：layout_neighbor_generator 每次把两个交叉点随机跳到整个网格上的任意位置，
+# 绝大多数邻域解都会让连线失败而被拒绝。MoveEngine 利用 C++ 返回的每条连线的统计信息（call_with_stats）
+# 计算每个交叉点的代价：连线失败记为 failure_cost，连线成功时记为绕路的长度（连线长度减去两个插头之间的八方向距离），
+# 每条连线的代价同时计入两端的交叉点；代价越大的交叉点越容易被选中移动
+#
+# 移动方式：
+#     jump    跳到整个网格上的任意位置（保留全局探索能力）
+#     shift   在 radius 范围内小幅平移
+#     rotate  只改变朝向
+#     swap    与另一个交叉点交换位置，朝向不变
+#     slide   向一个与之有连线的交叉点靠近
+# 每种移动方式被选中的概率随最近的接受率自适应调整：接受率以指数滑动平均的方式记录，
+# 概率为 min_probability + (1 - 移动方式数目 * min_probability) * 接受率 / 接受率之和
+#
+# 与 layout_neighbor_generator 一样原地修改 Layout，需要把 on_accept、on_reject 以及 objective / bounded_objective
+# 一起交给 SimulatedAnnealing，见 pd_to_diagram.solve_diagram_for_pd_code 的 neighborhood 参数
+
+MOVE_TYPES = ["jump", "shift", "rotate", "swap", "slide"]
+
+# 与 line_checker.cpp 中的 DIR_DX、DIR_DY 一致
+DIR_DX = np.array([+1, 0, -1, 0])
+DIR_DY = np.array([0, +1, 0, -1])
+
+class MoveEngine:
+    """
+    根据布线代价选择交叉点、并且自适应选择移动方式的邻域生成器
+    """
+    def __init__(
+        self,
+        pd_code: List[List[int]],
+        grid_size: int,
+        radius: int = 3,
+        failure_cost: Optional[float] = None,
+        cost_floor: float = 0.1,
+        adapt_rate: float = 0.05,
+        min_probability: float = 0.05,
+        move_types: Optional[List[str]] = None
+    ):
+        """
+        参数:
+            pd_code: 扭结的 pd_code
+            grid_size: 网格大小
+            radius: shift 与 slide 的最大移动距离
+            failure_cost: 一条连线失败时计入两端交叉点的代价，默认为 2 * grid_size
+            cost_floor: 选择交叉点时每个交叉点至少带有平均代价的 cost_floor 倍，保证代价为 0 的交叉点也可能被移动
+            adapt_rate: 接受率滑动平均的更新速率
+            min_probability: 每种移动方式被选中的最小概率
+            move_types: 使用的移动方式，默认为 MOVE_TYPES 中的全部
+        """
+        self.crossing_number = len(pd_code)
+        self.grid_size = grid_size
+        self.radius = radius
+        self.failure_cost = failure_cost if failure_cost is not None else 2.0 * grid_size
+        self.cost_floor = cost_floor
+        self.adapt_rate = adapt_rate
+        self.move_types = list(move_types) if move_types is not None else list(MOVE_TYPES)
+        assert all(move_type in MOVE_TYPES for move_type in self.move_types)
+        self.min_probability = min(min_probability, 1.0 / len(self.move_types))
+        # pd_code 只在创建求解上下文时解析一次，之后每次求解直接传入 Layout 中交叉点位置和朝向的视图
+        self.context = call_line_checker.SolverContext(pd_code, grid_size)
+
+        # owner_crossing[v], owner_slot[v]：弧线 v 的两个插头分别属于哪个交叉点的第几个插头（下标 0 不使用）
+        n = self.crossing_number
+        self.owner_crossing = np.zeros((2 * n + 1, 2), dtype=np.int64)
+        self.owner_slot = np.zeros((2 * n + 1, 2), dtype=np.int64)
+        seen = np.zeros(2 * n + 1, dtype=np.int64)
+        for i, labels in enumerate(pd_code):
+            for j, label in enumerate(labels):
+                self.owner_crossing[label, seen[label]] = i
+                self.owner_slot[label, seen[label]] = j
+                seen[label] += 1
+        # 与每个交叉点有连线的其他交叉点，slide 时使用
+        self.neighbors: List[List[int]] = [[] for _ in range(n)]
+        for label in range(1, 2 * n + 1):
+            a, b = int(self.owner_crossing[label, 0]), int(self.owner_crossing[label, 1])
+            if a != b:
+                self.neighbors[a].append(b)
+                self.neighbors[b].append(a)
+
+        self.crossing_cost: Optional[np.ndarray] = None # 当前解中每个交叉点的代价
+        self.pending_cost: Optional[np.ndarray] = None  # 最近一次计算的邻域解中每个交叉点的代价
+        self.last_stats: Optional[np.ndarray] = None
+        self.last_move: Optional[str] = None
+        self.acceptance = {move_type: 1.0 for move_type in self.move_types} # 每种移动方式接受率的滑动平均
+        self.proposed = {move_type: 0 for move_type in self.move_types}
+        self.accepted = {move_type: 0 for move_type in self.move_types}
+
+    # ---------- 目标函数：计算目标函数值的同时记录每个交叉点的代价 ----------
+
+    def costs_from_stats(self, layout: Layout, stats: np.ndarray) -> np.ndarray:
+        """
+        根据每条连线的统计信息计算每个交叉点的代价
+        """
+        pos, direction = layout.pos, layout.direction
+        crossing, slot = self.owner_crossing[1:], self.owner_slot[1:]
+        rotation = (slot + direction[crossing]) % 4
+        socket_x = pos[crossing, 0] + DIR_DX[rotation]
+        socket_y = pos[crossing, 1] + DIR_DY[rotation]
+        dx = np.abs(socket_x[:, 0] - socket_x[:, 1])
+        dy = np.abs(socket_y[:, 0] - socket_y[:, 1])
+        straight = math.sqrt(2) * np.minimum(dx, dy) + np.abs(dx - dy) # 与 C++ 中的 distance_estimate 相同
+
+        wire_cost = np.full(2 * self.crossing_number + 1, self.failure_cost)
+        ok = stats["status"] == call_line_checker.ROUTE_OK
+        labels = stats["socket"][ok]
+        wire_cost[labels] = np.maximum(stats["length"][ok] - straight[labels - 1], 0.0)
+        return np.bincount(crossing.ravel(), weights=np.repeat(wire_cost[1:], 2), minlength=self.crossing_number)
+
+    def bounded_objective(self, layout: Layout, ceiling: float) -> float:
+        """
+        与 bounded_objective_function 相同，同时记录每个交叉点的代价；提前停止的布局一定会被拒绝，不需要记录
+        """
+        value = math.inf
+        self.last_stats = None
+        try:
+            value, self.last_stats = self.context.evaluate_stats(layout.pos, layout.direction, ceiling)
+        except Exception as e:
+            print(f"Error calling LineChecker: {e}")
+        if math.isfinite(value) and self.last_stats is not None:
+            self.pending_cost = self.costs_from_stats(layout, self.last_stats)
+            if self.crossing_cost is None: # 第一次计算的是初始解
+                self.crossing_cost = self.pending_cost
+        return value
+
+    def objective(self, layout: Layout) -> float:
+        """
+        与 objective_function 相同，同时记录每个交叉点的代价
+        """
+        return self.bounded_objective(layout, math.inf)
+
+    def last_summary(self) -> Optional[Dict[str, float]]:
+        """
+        最近一次计算的统计信息汇总，可以作为 SimulatedAnnealing 的 stats_function
+        """
+        if self.last_stats is None:
+            return None
+        return call_line_checker.summarize_route_stats(self.last_stats)
+
+    # ---------- 接受与拒绝：更新当前解的代价以及移动方式的接受率 ----------
+
+    def feedback(self, accepted: bool) -> None:
+        if self.last_move is None:
+            return
+        self.acceptance[self.last_move] += self.adapt_rate * (float(accepted) - self.acceptance[self.last_move])
+        if accepted:
+            self.accepted[self.last_move] += 1
+        self.last_move = None
+
+    def on_accept(self, layout: Layout) -> None:
+        layout.commit()
+        if self.pending_cost is None: # 目标函数值来自置换表（CachedObjective 没有调用 bounded_objective），为被接受的解重新计算代价
+            self.bounded_objective(layout, math.inf)
+        if self.pending_cost is not None:
+            self.crossing_cost = self.pending_cost
+        self.feedback(True)
+
+    def on_reject(self, layout: Layout) -> None:
+        layout.undo()
+        self.feedback(False)
+
+    def probabilities(self) -> Dict[str, float]:
+        """
+        当前每种移动方式被选中的概率
+        """
+        total = sum(self.acceptance.values())
+        k = len(self.move_types)
+        return {move_type: self.min_probability + (1 - k * self.min_probability) * (self.acceptance[move_type] / total if total > 0 else 1.0 / k)
+                for move_type in self.move_types}
+
+    # ---------- 生成邻域解 ----------
+
+    def choose_crossing(self) -> int:
+        """
+        按照代价选择一个交叉点，还没有代价信息时均匀选择
+        """
+        if self.crossing_cost is None:
+            return random.randint(0, self.crossing_number - 1)
+        weights = self.crossing_cost + self.cost_floor * float(self.crossing_cost.mean()) + 1e-9
+        return random.choices(range(self.crossing_number), weights=weights.tolist())[0]
+
+    def in_grid(self, x: int, y: int) -> bool:
+        return 2 <= x <= self.grid_size - 1 and 2 <= y <= self.grid_size - 1
+
+    def jump(self, layout: Layout, i: int) -> bool:
+        x, y = random.randint(2, self.grid_size - 1), random.randint(2, self.grid_size - 1)
+        if not layout.is_free(x, y, (i,)):
+            return False
+        layout.move(i, x, y, random.randint(0, 3))
+        return True
+
+    def shift(self, layout: Layout, i: int) -> bool:
+        x = int(layout.pos[i, 0]) + random.randint(-self.radius, self.radius)
+        y = int(layout.pos[i, 1]) + random.randint(-self.radius, self.radius)
+        if (x, y) == (int(layout.pos[i, 0]), int(layout.pos[i, 1])) or not self.in_grid(x, y) or not layout.is_free(x, y, (i,)):
+            return False
+        layout.move(i, x, y, int(layout.direction[i]))
+        return True
+
+    def rotate(self, layout: Layout, i: int) -> bool:
+        layout.move(i, int(layout.pos[i, 0]), int(layout.pos[i, 1]), (int(layout.direction[i]) + random.randint(1, 3)) % 4)
+        return True
+
+    def swap(self, layout: Layout, i: int) -> bool:
+        if self.crossing_number < 2:
+            return False
+        j = random.randint(0, self.crossing_number - 2)
+        j += j >= i
+        x_i, y_i = int(layout.pos[i, 0]), int(layout.pos[i, 1])
+        x_j, y_j = int(layout.pos[j, 0]), int(layout.pos[j, 1])
+        layout.move(i, x_j, y_j, int(layout.direction[i])) # 其余交叉点不动，交换之后的距离仍然合法
+        layout.move(j, x_i, y_i, int(layout.direction[j]))
+        return True
+
+    def slide(self, layout: Layout, i: int) -> bool:
+        if len(self.neighbors[i]) == 0:
+            return False
+        k = random.choice(self.neighbors[i])
+        x_i, y_i = int(layout.pos[i, 0]), int(layout.pos[i, 1])
+        dx, dy = int(layout.pos[k, 0]) - x_i, int(layout.pos[k, 1]) - y_i
+        step = random.randint(1, self.radius)
+        distance = max(abs(dx), abs(dy))
+        if distance == 0:
+            return False
+        x = x_i + int(round(dx * min(step, distance) / distance))
+        y = y_i + int(round(dy * min(step, distance) / distance))
+        if (x, y) == (x_i, y_i) or not self.in_grid(x, y) or not layout.is_free(x, y, (i,)):
+            return False
+        layout.move(i, x, y, int(layout.direction[i]))
+        return True
+
+    def __call__(self, layout: Layout) -> Layout:
+        """
+        原地生成一个邻域解，可以直接作为 SimulatedAnnealing 的 neighbor_function
+        """
+        assert layout is not None
+        self.pending_cost = None
+        self.last_stats = None
+        probabilities = self.probabilities()
+        moves: Dict[str, Callable[[Layout, int], bool]] = {
+            "jump": self.jump, "shift": self.shift, "rotate": self.rotate, "swap": self.swap, "slide": self.slide}
+        while True:
+            move_type = random.choices(self.move_types, weights=[probabilities[t] for t in self.move_types])[0]
+            if moves[move_type](layout, self.choose_crossing()):
+                self.last_move = move_type
+                self.proposed[move_type] += 1
+                return layout
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        继续运行时需要恢复的内部状态：当前解的代价以及各移动方式的接受率和计数，用作 SimulatedAnnealing 的 state_handlers
+        """
+        return {"crossing_cost": self.crossing_cost, "acceptance": dict(self.acceptance),
+                "proposed": dict(self.proposed), "accepted": dict(self.accepted)}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.crossing_cost = state["crossing_cost"]
+        self.acceptance = dict(state["acceptance"])
+        self.proposed = dict(state["proposed"])
+        self.accepted = dict(state["accepted"])
+        self.pending_cost = None
+        self.last_move = None
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        每种移动方式的尝试次数、接受次数以及当前被选中的概率
+        """
+        probabilities = self.probabilities()
+        return {move_type: {"proposed": self.proposed[move_type], "accepted": self.accepted[move_type],
+                            "probability": round(probabilities[move_type], 4)} for move_type in self.move_types}
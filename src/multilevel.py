@@ -0,0 +1,238 @@
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sa import SimulatedAnnealing
+from layout import Layout
+from constructive_init import constructive_initial_solution
+import pd_to_diagram
+from pd_to_diagram import objective_function, bounded_objective_function, batch_objective_function, min_manhattan_distance, is_feasible
+
+# 由粗到细的多层优化：gen_init 使用固定的 10N+1 网格，网格面积随交叉点数目平方增长，A* 的代价也随之增长
+# 这里先在很小的粗网格上从构造性初始解出发，用较大范围的局部移动做模拟退火，然后把布局放大一倍（坐标 x -> 2x - 1），
+# 在更细的网格上只做局部移动的模拟退火进行微调，最后删除没有交叉点的空行空列压缩布局（每次删除之后重新布线确认仍然可行），并与微调交替进行
+#
+# 放大之后交叉点之间的曼哈顿距离也翻倍，因此放大后的布局仍然合法；连线之间的空隙变大，粗网格上因为拥挤而失败的连线通常可以布通
+
+COARSE_FACTOR = 3 # 最粗一层的网格大小为 COARSE_FACTOR * N + 1
+MIN_COARSE_GRID = 11
+COMPACT_ROUNDS = 2 # 压缩与微调交替进行的轮数
+
+def upscale_solution(solution: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将布局放大一倍：网格大小 g -> 2g - 1，坐标 x -> 2x - 1，朝向不变
+    """
+    return {
+        "grid_size": 2 * solution["grid_size"] - 1,
+        "crossing_number": solution["crossing_number"],
+        "pos_list": [[2 * x - 1, 2 * y - 1] for x, y in solution["pos_list"]],
+        "direction_list": list(solution["direction_list"]),
+        "pd_code": solution["pd_code"]
+    }
+
+def make_local_neighbor_generator(radius: int, rotate_probability: float = 0.25) -> Callable[[Layout], Layout]:
+    """
+    局部邻域：随机选择一个交叉点，在 radius 范围内移动，或者只改变它的朝向
+    与 layout_neighbor_generator 一样原地修改 Layout，需要配合 Layout.commit、Layout.undo 和 Layout.copy 使用
+    """
+    def local_neighbor_generator(layout: Layout) -> Layout:
+        N = layout.grid_size
+        while True:
+            i = random.randint(0, layout.crossing_number - 1)
+            x, y = int(layout.pos[i, 0]), int(layout.pos[i, 1])
+            if random.random() < rotate_probability:
+                direction = (int(layout.direction[i]) + random.randint(1, 3)) % 4
+                layout.move(i, x, y, direction)
+                return layout
+            x_new = x + random.randint(-radius, radius)
+            y_new = y + random.randint(-radius, radius)
+            if (x_new, y_new) == (x, y) or not (2 <= x_new <= N - 1 and 2 <= y_new <= N - 1):
+                continue
+            if layout.is_free(x_new, y_new, (i,)):
+                layout.move(i, x_new, y_new, int(layout.direction[i]))
+                return layout
+    return local_neighbor_generator
+
+def anneal(
+    solution: Dict[str, Any],
+    neighbor_function: Callable[[Layout], Layout],
+    initial_temperature: float,
+    cooling_rate: float = 0.95,
+    equilibrium_iterations: int = 200,
+    verbose: bool = False
+) -> Tuple[Dict[str, Any], float]:
+    """
+    以 solution 为初始解运行一次模拟退火，使用 Layout 原地生成邻域以及带上界的目标函数，返回最优解（字典）及其目标函数值
+    """
+    sa = SimulatedAnnealing(objective_function, neighbor_function, initial_temperature=initial_temperature,
+                            cooling_rate=cooling_rate, equilibrium_iterations=equilibrium_iterations, seed=None, verbose=verbose,
+                            on_accept=Layout.commit, on_reject=Layout.undo, snapshot_function=Layout.copy,
+                            bounded_objective_function=bounded_objective_function)
+    best_solution, best_value = sa.run(Layout.from_dict(solution))
+    return best_solution.to_dict(), best_value
+
+def footprint_lines(solution: Dict[str, Any], axis: int) -> set:
+    """
+    所有交叉点（中心以及四个插头）在 axis 方向上占据的行号（axis = 0）或列号（axis = 1）
+    """
+    lines = set()
+    for pos in solution["pos_list"]:
+        lines.update((pos[axis] - 1, pos[axis], pos[axis] + 1))
+    return lines
+
+def remove_lines(solution: Dict[str, Any], axis: int, lines: List[int], grid_size: int) -> Optional[Dict[str, Any]]:
+    """
+    删除 axis 方向上的若干个空行（空列），坐标大于被删除行号的交叉点向前平移，网格大小改为 grid_size
+    删除之后交叉点之间的距离不合法时返回 None
+    """
+    lines = sorted(lines)
+    pos_list = []
+    for pos in solution["pos_list"]:
+        pos = list(pos)
+        pos[axis] -= sum(1 for line in lines if line < pos[axis])
+        pos_list.append(pos)
+    if len(pos_list) >= 2 and min_manhattan_distance(pos_list) < 3:
+        return None
+    return {
+        "grid_size": grid_size,
+        "crossing_number": solution["crossing_number"],
+        "pos_list": pos_list,
+        "direction_list": list(solution["direction_list"]),
+        "pd_code": solution["pd_code"]
+    }
+
+def compact_solution(solution: Dict[str, Any], value: float, verbose: bool = False) -> Tuple[Dict[str, Any], float]:
+    """
+    压缩布局：反复删除不被任何交叉点占据的行或列，只保留删除之后仍然可行的结果
+
+    每一轮把所有单独删除一行（一列）的候选布局批量计算目标函数值，先尝试一次性删除所有可行的行列，
+    不可行时退回到只删除其中目标函数值最小的一行（一列）；没有任何可行的候选时停止。
+    压缩之后连线变短，但是可能因为变得拥挤而绕路，因此只要求可行，不要求目标函数值不增加
+
+    网格是正方形的，两个方向上实际使用的范围分别是 1 ~ 原网格大小减去累计删除的行数（列数），
+    只在这个范围内寻找空行空列，网格大小取两个范围中较大的一个
+    """
+    assert is_feasible(solution, value)
+    original_grid_size = solution["grid_size"]
+    removed = [0, 0] # 累计删除的行数与列数
+    def grid_after(axis: int, count: int) -> int:
+        total = list(removed)
+        total[axis] += count
+        return original_grid_size - min(total)
+    while True:
+        candidates: List[Tuple[int, int, Dict[str, Any]]] = []
+        for axis in (0, 1):
+            occupied = footprint_lines(solution, axis)
+            for line in range(1, original_grid_size - removed[axis] + 1):
+                if line not in occupied:
+                    candidate = remove_lines(solution, axis, [line], grid_after(axis, 1))
+                    if candidate is not None:
+                        candidates.append((axis, line, candidate))
+        if len(candidates) == 0:
+            break
+        values = batch_objective_function([candidate for _, _, candidate in candidates])
+        feasible = [(candidate_value, axis, line) for (axis, line, candidate), candidate_value in zip(candidates, values)
+                    if is_feasible(candidate, candidate_value)]
+        if len(feasible) == 0:
+            break
+
+        # 先尝试同时删除所有可行的行列
+        rows = [line for _, axis, line in feasible if axis == 0]
+        columns = [line for _, axis, line in feasible if axis == 1]
+        combined = None
+        if len(feasible) > 1:
+            combined_grid_size = original_grid_size - min(removed[0] + len(rows), removed[1] + len(columns))
+            combined = remove_lines(solution, 0, rows, combined_grid_size)
+            if combined is not None:
+                combined = remove_lines(combined, 1, columns, combined_grid_size)
+        combined_value = objective_function(combined) if combined is not None else math.inf
+        if combined is not None and is_feasible(combined, combined_value):
+            solution, value = combined, combined_value
+            removed[0] += len(rows)
+            removed[1] += len(columns)
+        else:
+            best_value, axis, line = min(feasible)
+            solution, value = remove_lines(solution, axis, [line], grid_after(axis, 1)), best_value # type: ignore
+            removed[axis] += 1
+        if verbose:
+            print("压缩: 网格大小 %4d, 目标函数值 %13.6f" % (solution["grid_size"], value))
+    return solution, value
+
+def random_initial_solution(pd_code: List[List[int]], grid_size: int) -> Dict[str, Any]:
+    """
+    随机生成一个交叉点距离合法的布局（不保证可行）
+    """
+    while True:
+        pos_list = [[random.randint(2, grid_size - 1), random.randint(2, grid_size - 1)] for _ in pd_code]
+        if len(pos_list) < 2 or min_manhattan_distance(pos_list) >= 3:
+            return {
+                "grid_size": grid_size,
+                "crossing_number": len(pd_code),
+                "pos_list": pos_list,
+                "direction_list": [random.randint(0, 3) for _ in pd_code],
+                "pd_code": pd_code
+            }
+
+def multilevel_solve(
+    pd_code: List[List[int]],
+    seed: int = 42,
+    coarse_grid_size: Optional[int] = None,
+    refine_levels: int = 1,
+    compact: bool = True,
+    verbose: bool = True
+) -> Tuple[Dict[str, Any], float]:
+    """
+    由粗到细的多层优化
+
+    参数:
+        pd_code: 扭结的 pd_code
+        seed: 随机数种子
+        coarse_grid_size: 最粗一层的网格大小，默认为 max(COARSE_FACTOR * N + 1, MIN_COARSE_GRID)
+        refine_levels: 放大的次数，每次放大之后做局部微调，最终网格大小约为粗网格的 2^refine_levels 倍
+        compact: 是否在最后压缩空行空列
+        verbose: 是否输出每一层的结果
+
+    返回:
+        最优解（solution 字典）及其目标函数值
+    """
+    random.seed(seed)
+    n = len(pd_code)
+    begin_time = time.time()
+    if coarse_grid_size is None:
+        coarse_grid_size = max(COARSE_FACTOR * n + 1, MIN_COARSE_GRID)
+
+    # 第一层：在粗网格上从构造性初始解出发进行模拟退火
+    # 交叉点较多时，随机跳到整个网格任意位置的邻域几乎总是不可行，而不可行的布局布线代价很高，因此只使用范围为网格八分之一的局部移动
+    solution, value = constructive_initial_solution(pd_code, coarse_grid_size)
+    if solution is None:
+        solution = random_initial_solution(pd_code, coarse_grid_size)
+    solution, value = anneal(solution, make_local_neighbor_generator(radius=max(2, coarse_grid_size // 8)),
+                             initial_temperature=n, cooling_rate=0.9, equilibrium_iterations=200)
+    if verbose:
+        print("用时 %10.3f, 粗网格 %4d, 目标函数值 %13.6f, 是否可行: %s" % (time.time() - begin_time, solution["grid_size"], value, is_feasible(solution, value)))
+
+    # 之后每一层：放大一倍，再用局部移动微调，温度从较低的位置开始，避免破坏粗网格上得到的整体结构
+    for level in range(refine_levels):
+        solution = upscale_solution(solution)
+        solution, value = anneal(solution, make_local_neighbor_generator(radius=2 ** (level + 1)),
+                                 initial_temperature=max(1.0, n / 2), cooling_rate=0.9, equilibrium_iterations=100)
+        if verbose:
+            print("用时 %10.3f, 细网格 %4d, 目标函数值 %13.6f, 是否可行: %s" % (time.time() - begin_time, solution["grid_size"], value, is_feasible(solution, value)))
+
+    # 最后压缩空行空列，压缩之后交叉点周围的空间变化了，因此再微调一次，然后重复压缩，共 COMPACT_ROUNDS 轮
+    for _ in range(COMPACT_ROUNDS if compact else 0):
+        if not is_feasible(solution, value):
+            break
+        solution, value = compact_solution(solution, value)
+        solution, value = anneal(solution, make_local_neighbor_generator(radius=2),
+                                 initial_temperature=max(1.0, n / 4), cooling_rate=0.9, equilibrium_iterations=100)
+        if verbose:
+            print("用时 %10.3f, 压缩后 %4d, 目标函数值 %13.6f, 是否可行: %s" % (time.time() - begin_time, solution["grid_size"], value, is_feasible(solution, value)))
+    return solution, value
+
+if __name__ == "__main__":
+    pd_to_diagram.auto_compile()
+    from benchmark import torus_knot_pd_code
+    pd_code = torus_knot_pd_code(21)
+    solution, value = multilevel_solve(pd_code)
+    print(solution)
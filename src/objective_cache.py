@@ -0,0 +1,277 @@
+import hashlib
+import json
+import math
+import random
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from layout import Layout
+
+# 目标函数值的置换表：对于固定的 pd_code 和网格大小，以布局（pos_list, direction_list）的 Zobrist 哈希值为键缓存目标函数值
+# 缓存保存在 multiprocessing.shared_memory 中，同一次运行中的多条马尔可夫链（例如并行回火的各个副本）可以共享
+# 哈希值共 128 位：低 64 位作为键，高 64 位与目标函数值的二进制表示异或之后作为校验值，用于排除哈希冲突以及多进程同时写入造成的不一致
+# 目标函数值总是非负的，带上界的目标函数提前停止时，以负数 -(ceiling + 1) 的形式记录“目标函数值超过 ceiling”这一下界
+
+MASK_64 = (1 << 64) - 1
+
+# 共享内存开头的计数器：命中、未命中、写入、淘汰
+COUNTER_NAMES = ["hits", "misses", "stores", "evictions"]
+HEADER_BYTES = 8 * len(COUNTER_NAMES)
+ENTRY_BYTES = 8 + 8 + 8 + 1 # 键、校验值、目标函数值、CLOCK 引用标记
+
+# CLOCK 引用标记：0 表示空，1 表示最近没有被访问，2 表示最近被访问过
+REF_EMPTY, REF_COLD, REF_HOT = 0, 1, 2
+
+class ZobristTable:
+    """
+    Zobrist 哈希表：每个交叉点的 x 坐标、y 坐标、朝向各对应一组 128 位随机数，布局的哈希值是所有对应随机数的异或
+
+    随机数由 pd_code 和网格大小决定，不同进程中独立构造得到的哈希表完全相同
+    """
+    def __init__(self, pd_code: List[List[int]], grid_size: int):
+        seed_text = json.dumps({"grid_size": grid_size, "pd_code": [list(map(int, crossing)) for crossing in pd_code]})
+        rng = random.Random(hashlib.sha256(seed_text.encode("utf-8")).digest())
+        n = len(pd_code)
+        self.x_keys = [[rng.getrandbits(128) for _ in range(grid_size + 1)] for _ in range(n)]
+        self.y_keys = [[rng.getrandbits(128) for _ in range(grid_size + 1)] for _ in range(n)]
+        self.direction_keys = [[rng.getrandbits(128) for _ in range(4)] for _ in range(n)]
+
+    def term(self, i: int, x: int, y: int, direction: int) -> int:
+        """
+        第 i 个交叉点位于 (x, y)、朝向为 direction 时对哈希值的贡献
+        """
+        return self.x_keys[i][x] ^ self.y_keys[i][y] ^ self.direction_keys[i][direction]
+
+    def hash(self, pos_list: List[List[int]], direction_list: List[int]) -> int:
+        """
+        从头计算整个布局的哈希值
+        """
+        value = 0
+        for i, ((x, y), direction) in enumerate(zip(pos_list, direction_list)):
+            value ^= self.term(i, x, y, direction)
+        return value
+
+class ObjectiveCache:
+    """
+    保存在共享内存中的组相联缓存，每组 ways 个位置，组内使用 CLOCK 算法淘汰
+
+    同一个缓存对象可以被 pickle 传给子进程，子进程按照共享内存的名字重新连接。
+    各个进程之间不加锁：计数器只是近似值，写入过程中被读到的不完整条目会因为校验值不匹配而被当作未命中。
+    创建缓存的进程负责调用 unlink 释放共享内存。
+    """
+    def __init__(
+        self,
+        pd_code: List[List[int]],
+        grid_size: int,
+        max_bytes: int = 32 * 2**20,
+        ways: int = 4,
+        name: Optional[str] = None
+    ):
+        """
+        参数:
+            pd_code: 缓存对应的 pd_code，不同的 pd_code 不能共享缓存
+            grid_size: 缓存对应的网格大小
+            max_bytes: 共享内存大小的上限，缓存条目数目按此计算（组数取不超过上限的最大的 2 的幂）
+            ways: 每组的条目数目
+            name: 已经存在的共享内存的名字，为 None 时新建共享内存
+        """
+        self.pd_code = [list(map(int, crossing)) for crossing in pd_code]
+        self.grid_size = grid_size
+        self.max_bytes = max_bytes
+        self.ways = ways
+        self.zobrist = ZobristTable(self.pd_code, grid_size)
+
+        set_bytes = ways * ENTRY_BYTES + 1
+        n_sets = 1
+        while HEADER_BYTES + 2 * n_sets * set_bytes <= max_bytes:
+            n_sets *= 2
+        if HEADER_BYTES + n_sets * set_bytes > max_bytes:
+            raise ValueError("max_bytes 太小，至少需要 %d 字节" % (HEADER_BYTES + set_bytes))
+        self.n_sets = n_sets
+        self.capacity = n_sets * ways
+
+        size = HEADER_BYTES + n_sets * set_bytes
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        buf = self.shm.buf
+        offset = 0
+        def view(dtype, count):
+            nonlocal offset
+            arr = np.ndarray((count,), dtype=dtype, buffer=buf, offset=offset)
+            offset += arr.nbytes
+            return arr
+        self.counters = view(np.int64, len(COUNTER_NAMES))
+        self.keys = view(np.uint64, self.capacity)
+        self.checks = view(np.uint64, self.capacity)
+        self.values = view(np.float64, self.capacity)
+        self.refs = view(np.uint8, self.capacity)
+        self.hands = view(np.uint8, n_sets)
+        self.value_bits = self.values.view(np.uint64)
+        if self.owner:
+            self.clear()
+
+    def __reduce__(self):
+        # 子进程中按照共享内存的名字重新连接，而不是复制缓存内容
+        return (ObjectiveCache, (self.pd_code, self.grid_size, self.max_bytes, self.ways, self.shm.name))
+
+    def clear(self) -> None:
+        """
+        清空所有条目和计数器
+        """
+        self.counters[:] = 0
+        self.refs[:] = REF_EMPTY
+        self.hands[:] = 0
+
+    def hash_solution(self, solution: Dict | Layout) -> int:
+        """
+        计算布局的 128 位哈希值，Layout 已经挂接了本缓存的 Zobrist 哈希表时直接使用增量维护的哈希值
+        """
+        if isinstance(solution, Layout):
+            if solution.zobrist is self.zobrist:
+                return solution.hash_value
+            return self.zobrist.hash(solution.pos.tolist(), solution.direction.tolist())
+        return self.zobrist.hash(solution["pos_list"], solution["direction_list"])
+
+    def attach(self, layout: Layout) -> Layout:
+        """
+        让 layout 在 move / undo 时增量维护本缓存使用的哈希值
+        """
+        layout.attach_zobrist(self.zobrist)
+        return layout
+
+    def lookup(self, hash_value: int) -> Optional[float]:
+        """
+        查询哈希值对应的目标函数值，未命中时返回 None
+        """
+        key = hash_value & MASK_64
+        base = (key & (self.n_sets - 1)) * self.ways
+        check = hash_value >> 64
+        for index in range(base, base + self.ways):
+            if self.refs[index] != REF_EMPTY and int(self.keys[index]) == key:
+                if int(self.checks[index]) ^ int(self.value_bits[index]) == check:
+                    self.refs[index] = REF_HOT
+                    self.counters[0] += 1
+                    return float(self.values[index])
+        self.counters[1] += 1
+        return None
+
+    def store(self, hash_value: int, value: float) -> None:
+        """
+        写入哈希值对应的目标函数值，组内没有空位时按照 CLOCK 算法淘汰一个条目
+        """
+        key = hash_value & MASK_64
+        set_index = key & (self.n_sets - 1)
+        base = set_index * self.ways
+        target = -1
+        for index in range(base, base + self.ways): # 优先覆盖相同的键，其次使用空位
+            if self.refs[index] != REF_EMPTY and int(self.keys[index]) == key:
+                target = index
+                break
+            if target < 0 and self.refs[index] == REF_EMPTY:
+                target = index
+        if target < 0:
+            hand = int(self.hands[set_index])
+            while self.refs[base + hand] == REF_HOT: # 最近被访问过的条目获得第二次机会
+                self.refs[base + hand] = REF_COLD
+                hand = (hand + 1) % self.ways
+            target = base + hand
+            self.hands[set_index] = (hand + 1) % self.ways
+            self.counters[3] += 1
+
+        self.refs[target] = REF_EMPTY # 写入过程中先标记为空，避免其他进程读到不完整的条目
+        self.values[target] = value
+        self.keys[target] = key
+        self.checks[target] = (hash_value >> 64) ^ int(self.value_bits[target])
+        self.refs[target] = REF_COLD
+        self.counters[2] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回命中、未命中、写入、淘汰次数以及缓存容量
+        """
+        result = {name: int(self.counters[k]) for k, name in enumerate(COUNTER_NAMES)}
+        result["capacity"] = self.capacity
+        return result
+
+    def close(self) -> None:
+        """
+        断开与共享内存的连接
+        """
+        self.counters = self.keys = self.checks = self.values = self.refs = self.hands = self.value_bits = None # type: ignore
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """
+        断开连接并释放共享内存，只应当由创建缓存的进程调用
+        """
+        self.close()
+        self.shm.unlink()
+
+class CachedObjective:
+    """
+    在目标函数前面加上置换表：相同的布局只计算一次
+
+    带上界的目标函数提前停止时只知道目标函数值超过了上界，此时把上界作为下界写入缓存，
+    之后遇到相同的布局且上界不超过该下界时直接返回 math.inf
+    """
+    def __init__(
+        self,
+        objective_function: Callable[[Any], float],
+        cache: ObjectiveCache,
+        bounded_objective_function: Optional[Callable[[Any, float], float]] = None
+    ):
+        self.objective_function = objective_function
+        self.cache = cache
+        self.bounded_objective_function = bounded_objective_function
+
+    def __call__(self, solution: Any) -> float:
+        hash_value = self.cache.hash_solution(solution)
+        value = self.cache.lookup(hash_value)
+        if value is None or value < 0: # 未命中，或者只记录了下界
+            value = self.objective_function(solution)
+            if not math.isinf(value):
+                self.cache.store(hash_value, value)
+        return value
+
+    def bounded(self, solution: Any, ceiling: float) -> float:
+        """
+        带上界的版本，用于 SimulatedAnnealing 的 bounded_objective_function
+        """
+        assert self.bounded_objective_function is not None
+        hash_value = self.cache.hash_solution(solution)
+        value = self.cache.lookup(hash_value)
+        if value is not None and value < 0:
+            if ceiling <= -value - 1: # 已知目标函数值超过了更大的上界
+                return math.inf
+            value = None
+        if value is None:
+            value = self.bounded_objective_function(solution, ceiling)
+            if not math.isinf(value):
+                self.cache.store(hash_value, value)
+            elif not math.isinf(ceiling):
+                self.cache.store(hash_value, -ceiling - 1)
+        return value
+
+if __name__ == "__main__":
+    # 检查缓存的基本功能：写入、命中、淘汰以及跨进程共享
+    import pickle
+    pd_code = [[2, 8, 3, 7], [4, 10, 5, 9], [6, 2, 7, 1], [8, 4, 9, 3], [10, 6, 1, 5]]
+    cache = ObjectiveCache(pd_code, 51, max_bytes=4096)
+    try:
+        rng = random.Random(0)
+        stored = {}
+        for _ in range(1000):
+            hash_value = rng.getrandbits(128)
+            stored[hash_value] = rng.random()
+            cache.store(hash_value, stored[hash_value])
+        found = 0
+        for hash_value, value in stored.items():
+            result = cache.lookup(hash_value)
+            assert result is None or result == value
+            found += result is not None
+        other = pickle.loads(pickle.dumps(cache)) # 模拟子进程连接同一块共享内存
+        assert other.lookup(hash_value) == value
+        other.close()
+        print("容量 %d，写入 %d 个条目之后还能找到 %d 个" % (cache.capacity, len(stored), found), cache.stats())
+    finally:
+        cache.unlink()
@@ -3,12 +3,19 @@ import os
 import time
 import numpy as np
 import call_line_checker
+import build_cache
 from get_int_list_input_from_dict import get_int_list_input_from_dict
 import math
 import random
 from typing import Dict, List, Any
 import json
-from sa import SimulatedAnnealing # 模拟退火程序
+import functools
+from sa import SimulatedAnnealing, ParallelTempering, AdaptiveSchedule, read_checkpoint # 模拟退火程序
+from constructive_init import constructive_initial_solution # 构造性初始解
+from layout import Layout # 基于数组的布局表示
+from moves import MoveEngine # 根据布线代价引导的邻域
+from objective_cache import ObjectiveCache, CachedObjective # 目标函数值的置换表
+from result_store import ResultStore # 保存求解结果的数据库
 
 def run_command(command: str, directory: str = '.') -> tuple[int, str, str]:
     """
@@ -43,34 +50,185 @@ def run_command(command: str, directory: str = '.') -> tuple[int, str, str]:
     except Exception as e:
         return 1, "", str(e)
 
-# 如果当前没有找到可执行文件
-# 那么就自动重新编译一个，需要保证 bash 和 g++ 可用
+# 确保当前的 line_checker.cpp 已经编译到缓存中（见 build_cache.py），需要保证 g++ 可用
+# 缓存以源文件、编译选项以及 CPU 型号的哈希值为键，命中时不会重新编译；force_compile 为 True 时总是重新编译
+# 返回动态链接库的路径
 def auto_compile(force_compile=False):
-    if not os.path.isfile(call_line_checker.LIBPATH) or force_compile: # 确保可执行文件被生成出来了
-        print("compiling ...")
-        returncode, stdout, stderr = run_command("bash compile.sh", call_line_checker.DIRNOW)
-        if returncode != 0:
-            print(f"编译失败: {stderr}")
-        assert os.path.isfile(call_line_checker.LIBPATH)
-    # 保证可执行权限
-    run_command("chmod +x '%s'" % call_line_checker.LIBPATH)
+    return build_cache.library_path(force=force_compile)
+
+# 目标函数值中每条无法连接的连线带来 2 * (grid_size - 1) ** 2 的惩罚，目标函数值小于一份惩罚时布局可行（所有连线都已连通）
+def is_feasible(solution: Dict | Layout, value: float) -> bool:
+    grid_size = solution.grid_size if isinstance(solution, Layout) else solution["grid_size"]
+    return value < 2 * (grid_size - 1) ** 2
 
 # solution 结构示例：
 #     {"grid_size":6,"crossing_number":3,"pos_list":[[4,4],[5,2],[2,2]],"direction_list":[2,1,0],"pd_code":[[6,4,1,3],[4,2,5,1],[2,6,3,5]]}
 #     其中 pos_list 和 direction_list 核心参与优化部分
-def objective_function(solution: Dict) -> float:
+#     solution 也可以是 Layout，此时直接把其中打包好的 int32 数组传给 C++
+#     routing_mode 为 call_line_checker.ROUTING_SEQUENTIAL（按顺序布线）或 call_line_checker.ROUTING_NEGOTIATED（协商布线）
+def objective_function(solution: Dict | Layout, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL) -> float:
     answer_now = math.inf  # 默认设为无穷大，处理异常情况
-    arr = get_int_list_input_from_dict(solution)
+    arr = solution.buffer if isinstance(solution, Layout) else np.array(get_int_list_input_from_dict(solution))
     
     try:
-        lc = call_line_checker.LineChecker()
-        answer_now = lc.call_with_array(np.array(arr))  # 使用 numpy 数组向 C 语言代码传递信息
+        lc = call_line_checker.get_line_checker()     # 进程内共享一个 LineChecker，避免反复加载动态链接库
+        if routing_mode == call_line_checker.ROUTING_SEQUENTIAL:
+            answer_now = lc.call_with_array(arr)        # 使用 numpy 数组向 C 语言代码传递信息
+        else:
+            answer_now = lc.call_with_array_mode(arr, routing_mode)
     except Exception as e:
         # 记录异常信息以便调试
         print(f"Error calling LineChecker: {e}")
     
     return answer_now
 
+# 带上界的目标函数：目标函数值一定超过 ceiling 时提前停止布线并返回 math.inf，用于 SimulatedAnnealing 的 bounded_objective_function
+def bounded_objective_function(solution: Dict | Layout, ceiling: float) -> float:
+    answer_now = math.inf
+    arr = solution.buffer if isinstance(solution, Layout) else np.array(get_int_list_input_from_dict(solution))
+
+    try:
+        lc = call_line_checker.get_line_checker()
+        answer_now = lc.call_with_array_bounded(arr, ceiling)
+    except Exception as e:
+        print(f"Error calling LineChecker: {e}")
+
+    return answer_now
+
+class InstrumentedObjective:
+    """
+    带统计信息的目标函数：每次计算时由 C++ 记录每条连线的搜索节点数、用时等信息
+
+    __call__ 和 bounded 分别对应 objective_function 和 bounded_objective_function，
+    last_stats 是最近一次计算的统计信息（结构化数组），last_summary 可以作为 SimulatedAnnealing 的 stats_function
+    """
+    def __init__(self):
+        self.last_stats = None
+
+    def bounded(self, solution: Dict | Layout, ceiling: float) -> float:
+        answer_now = math.inf
+        self.last_stats = None
+        arr = solution.buffer if isinstance(solution, Layout) else np.array(get_int_list_input_from_dict(solution))
+
+        try:
+            lc = call_line_checker.get_line_checker()
+            answer_now, self.last_stats = lc.call_with_stats(arr, ceiling)
+        except Exception as e:
+            print(f"Error calling LineChecker: {e}")
+
+        return answer_now
+
+    def __call__(self, solution: Dict | Layout) -> float:
+        return self.bounded(solution, math.inf)
+
+    def last_summary(self) -> Dict[str, float] | None:
+        if self.last_stats is None:
+            return None
+        return call_line_checker.summarize_route_stats(self.last_stats)
+
+class ContextObjective:
+    """
+    使用 call_line_checker.SolverContext 的目标函数：pd_code 只在创建时解析一次，C++ 中的搜索缓冲区在多次求解之间复用
+
+    只接受 Layout，直接传入 Layout.pos 和 Layout.direction 两个视图，不需要复制；
+    __call__ 和 bounded 分别对应 objective_function 和 bounded_objective_function，结果与它们完全相同
+    """
+    def __init__(self, pd_code: list, grid_size: int, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL):
+        self.context = call_line_checker.SolverContext(pd_code, grid_size)
+        self.routing_mode = routing_mode
+
+    def bounded(self, layout: Layout, ceiling: float) -> float:
+        answer_now = math.inf
+        try:
+            answer_now = self.context.evaluate(layout.pos, layout.direction, ceiling, self.routing_mode)
+        except Exception as e:
+            print(f"Error calling LineChecker: {e}")
+        return answer_now
+
+    def __call__(self, layout: Layout) -> float:
+        return self.bounded(layout, math.inf)
+
+# 一次计算多个 solution 的目标函数值，C++ 中使用多线程并行计算
+def batch_objective_function(solutions: List[Dict | Layout], nthreads: int = 0, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL) -> List[float]:
+    try:
+        lc = call_line_checker.get_line_checker()
+        return lc.call_batch([solution.buffer if isinstance(solution, Layout) else solution for solution in solutions], nthreads, routing_mode).tolist()
+    except Exception as e:
+        print(f"Error calling LineChecker: {e}")
+        return [math.inf] * len(solutions)
+
+class IncrementalObjective:
+    """
+    增量目标函数：保存当前解的完整布线结果，只对发生变化的交叉点重新布线
+
+    与 SimulatedAnnealing 的 on_accept / on_reject 配合使用，
+    调用时与当前解比较得到被移动的交叉点，被接受时保留本次修改，被拒绝时撤销本次修改。
+    """
+    def __init__(self):
+        self.evaluator = None  # call_line_checker.IncrementalEvaluator
+        self.solution = None   # 与 evaluator 中的布线结果对应的解
+        self.pending = None    # 已经 propose 但还没有被接受或拒绝的解
+
+    def _reset(self, solution: Dict) -> float:
+        if self.evaluator is not None:
+            self.evaluator.close()
+        arr = get_int_list_input_from_dict(solution)
+        self.evaluator = call_line_checker.IncrementalEvaluator(np.array(arr, dtype=np.int32))
+        self.solution = solution
+        return self.evaluator.current_value
+
+    def __call__(self, solution: Dict) -> float:
+        if self.pending is not None: # 上一次的修改没有被处理，视为被拒绝
+            self.reject(self.pending)
+
+        try:
+            if (self.solution is None
+                    or solution["grid_size"] != self.solution["grid_size"]
+                    or solution["pd_code"] != self.solution["pd_code"]):
+                return self._reset(solution)
+
+            moves = [] # 找出所有发生变化的交叉点
+            for i in range(solution["crossing_number"]):
+                if (solution["pos_list"][i] != self.solution["pos_list"][i]
+                        or solution["direction_list"][i] != self.solution["direction_list"][i]):
+                    moves.append((i, *solution["pos_list"][i], solution["direction_list"][i]))
+            if len(moves) == 0:
+                return self.evaluator.current_value # type: ignore
+
+            answer_now = self.evaluator.propose(moves) # type: ignore
+            self.pending = solution
+            return answer_now
+        except Exception as e:
+            print(f"Error calling IncrementalEvaluator: {e}")
+            return math.inf
+
+    def accept(self, solution: Dict) -> None:
+        if self.pending is not None and self.pending is solution:
+            self.evaluator.commit() # type: ignore
+            self.solution = solution
+            self.pending = None
+
+    def reject(self, solution: Dict) -> None:
+        if self.pending is not None and self.pending is solution:
+            self.evaluator.rollback() # type: ignore
+            self.pending = None
+
+    def confirm(self, solution: Dict) -> float:
+        """
+        返回 solution 用完整布线计算的目标函数值，作为 SimulatedAnnealing 的 confirm_function
+
+        增量布线的结果依赖于历史，可能与完整布线不同（甚至把完整布线失败的布局算成可行的），
+        不能保证一致时对 solution 重新完整布线，之后的增量计算也从这个结果出发
+        """
+        try:
+            if solution is self.solution and self.pending is None and self.evaluator.last_proposal_is_exact: # type: ignore
+                return self.evaluator.current_value # type: ignore
+            self.pending = None
+            return self._reset(solution)
+        except Exception as e:
+            print(f"Error calling IncrementalEvaluator: {e}")
+            return math.inf
+
 def min_manhattan_distance(points: list[list[int | float]]) -> float:
     """
     计算二维点序列中两两之间的曼哈顿距离的最小值
@@ -130,63 +288,281 @@ def neighbor_generator(solution_now:dict) -> dict:
         if min_manhattan_distance(new_solution["pos_list"]) >= 3:
             return new_solution
 
+# 与 neighbor_generator 相同的邻域，但是原地修改 Layout 并返回同一个对象，不复制任何数据
+# 随机数的抽取顺序与 neighbor_generator 完全相同，因此相同种子下两者生成的邻域序列一致
+# 需要与 SimulatedAnnealing 的 on_accept（Layout.commit）、on_reject（Layout.undo）以及 snapshot_function（Layout.copy）配合使用
+def layout_neighbor_generator(layout: Layout) -> Layout:
+    global neighbor_generator_called_time
+    assert layout is not None
+    neighbor_generator_called_time += 1
+    N = layout.grid_size
+    n = layout.crossing_number
+
+    while True:
+        fixed_index  = neighbor_generator_called_time % n # 先修改一个固定的
+        random_index = random.randint(0, n - 1)           # 再修改一个随机的
+        direction_1, x_1, y_1 = random.randint(0, 3), random.randint(2, N-1), random.randint(2, N-1)
+        direction_2, x_2, y_2 = random.randint(0, 3), random.randint(2, N-1), random.randint(2, N-1)
+
+        # 只需要检查被修改的交叉点，两次修改同一个交叉点时以后一次为准
+        if fixed_index == random_index:
+            if layout.is_free(x_2, y_2, (random_index,)):
+                layout.move(random_index, x_2, y_2, direction_2)
+                return layout
+        elif (abs(x_1 - x_2) + abs(y_1 - y_2) >= 3
+                and layout.is_free(x_1, y_1, (fixed_index, random_index))
+                and layout.is_free(x_2, y_2, (fixed_index, random_index))):
+            layout.move(fixed_index, x_1, y_1, direction_1)
+            layout.move(random_index, x_2, y_2, direction_2)
+            return layout
+
 # 生成初始解，跑半个小时才跑出初始可行解都是有可能的
 # 感觉这个地方可能需要想一些好方法生成初始解
-OUTPUT_PERIOD   = 10
-MAX_RANDOM_TIME = 300
-def gen_init(pd_code) -> dict: 
-    print("正在生成初始解 ....")
+# 每次随机生成 GEN_INIT_BATCH_SIZE 个候选解，并行计算目标函数值之后再按顺序检查
+OUTPUT_PERIOD       = 10
+MAX_RANDOM_TIME     = 300
+GEN_INIT_BATCH_SIZE = 32
+# use_constructive 为 False 时跳过构造性初始解，只使用随机采样
+# routing_mode 为计算目标函数值时使用的布线模式，协商布线可以把很多按顺序布线时失败的布局判定为可行
+# verbose 为 False 时不输出进度信息；time_limit 不为 None 时，随机采样超过这个时间（秒）之后返回当前最好的初始解
+def gen_init(pd_code, use_constructive=True, routing_mode=call_line_checker.ROUTING_SEQUENTIAL, verbose=True, time_limit=None) -> dict: 
+    if verbose:
+        print("正在生成初始解 ....")
     cnt = 0
     begin_time = time.time()
     best_obj_func = math.inf # 记录当前最优初始可行解
     best_solution_now = {}
     last_output_time = begin_time - OUTPUT_PERIOD
+    grid_size = 10 * len(pd_code) + 1
+
+    # 先尝试根据 pd_code 的平面结构构造初始解，这一步不消耗随机数，找不到可行解时再随机采样
+    constructive_solution, constructive_obj_func = constructive_initial_solution(pd_code, grid_size, routing_mode) if use_constructive else (None, math.inf)
+    if constructive_solution is not None:
+        if is_feasible(constructive_solution, constructive_obj_func):
+            if verbose:
+                print("用时 %13.6f, 构造得到了初始可行解，目标函数值：%13.6f" % (time.time() - begin_time, constructive_obj_func))
+            return constructive_solution
+        best_obj_func     = constructive_obj_func
+        best_solution_now = constructive_solution
+        if verbose:
+            print("用时 %13.6f, 构造得到的初始解不可行，改为随机采样" % (time.time() - begin_time))
+
     while True:
-        grid_size = 10 * len(pd_code) + 1
-        initial_solution = {
-            "grid_size": grid_size,
-            "crossing_number": len(pd_code),
-            "pos_list": [],
-            "direction_list": [],
-            "pd_code": pd_code
-        }
-        for _ in range(len(pd_code)):
-            N = initial_solution["grid_size"]
-            initial_solution["pos_list"].append([random.randint(2, N-1), random.randint(2, N-1)])
-            initial_solution["direction_list"].append(random.randint(0, 3))
-        
-        if  min_manhattan_distance(initial_solution["pos_list"])  <= 2: # 跳过不可行的解
-            continue
-        cnt += 1
-
-        # 遇到可行解的时候就返回，感觉初始可行解也不太好找
-        obj_func = objective_function(initial_solution)
-        if obj_func < best_obj_func:
-            best_obj_func     = obj_func
-            best_solution_now = initial_solution # 记录当前找到的最优解
-        
-        if obj_func < 2 * (grid_size - 1) ** 2:
-            print("用时 %13.6f, 已检查 %10d 个初始解, 找到了初始可行解，当前最优解：%13.6f" % (time.time() - begin_time, cnt, best_obj_func))
-            return initial_solution
-        else:
-            if time.time() - last_output_time > OUTPUT_PERIOD:
-                print("用时 %13.6f, 已检查 %10d 个初始解, 尚未找到初始可行解，当前最优解：%13.6f" % (time.time() - begin_time, cnt, best_obj_func))
-                last_output_time = time.time()
+        candidate_list = []
+        while len(candidate_list) < min(GEN_INIT_BATCH_SIZE, MAX_RANDOM_TIME - cnt):
+            initial_solution = {
+                "grid_size": grid_size,
+                "crossing_number": len(pd_code),
+                "pos_list": [],
+                "direction_list": [],
+                "pd_code": pd_code
+            }
+            for _ in range(len(pd_code)):
+                N = initial_solution["grid_size"]
+                initial_solution["pos_list"].append([random.randint(2, N-1), random.randint(2, N-1)])
+                initial_solution["direction_list"].append(random.randint(0, 3))
+
+            if  min_manhattan_distance(initial_solution["pos_list"])  <= 2: # 跳过不可行的解
+                continue
+            candidate_list.append(initial_solution)
 
-        if cnt >= MAX_RANDOM_TIME:
-            print("用时 %13.6f, 已检查 %10d 个初始解, 当前最优解：%13.6f，由于没有找到可行解，因而先返回" % (time.time() - begin_time, cnt, best_obj_func))
+        for initial_solution, obj_func in zip(candidate_list, batch_objective_function(candidate_list, routing_mode=routing_mode)):
+            cnt += 1
+
+            # 遇到可行解的时候就返回，感觉初始可行解也不太好找
+            if obj_func < best_obj_func:
+                best_obj_func     = obj_func
+                best_solution_now = initial_solution # 记录当前找到的最优解
+
+            if is_feasible(initial_solution, obj_func):
+                if verbose:
+                    print("用时 %13.6f, 已检查 %10d 个初始解, 找到了初始可行解，当前最优解：%13.6f" % (time.time() - begin_time, cnt, best_obj_func))
+                return initial_solution
+            else:
+                if verbose and time.time() - last_output_time > OUTPUT_PERIOD:
+                    print("用时 %13.6f, 已检查 %10d 个初始解, 尚未找到初始可行解，当前最优解：%13.6f" % (time.time() - begin_time, cnt, best_obj_func))
+                    last_output_time = time.time()
+
+        if cnt >= MAX_RANDOM_TIME or (time_limit is not None and time.time() - begin_time >= time_limit):
+            if verbose:
+                print("用时 %13.6f, 已检查 %10d 个初始解, 当前最优解：%13.6f，由于没有找到可行解，因而先返回" % (time.time() - begin_time, cnt, best_obj_func))
             return best_solution_now
 
+# 根据名字构造降温策略："geometric" 为原来的等比降温（返回 None），"adaptive" 为 AdaptiveSchedule
+# 自动确定初始温度时，忽略让连线失败的邻域解：每条失败的连线带来 2 * (grid_size - 1) ** 2 的惩罚，远大于连线长度的变化
+SCHEDULE_NAMES = ("geometric", "adaptive")
+def make_schedule(name, grid_size):
+    assert name in SCHEDULE_NAMES
+    if name == "geometric":
+        return None
+    return AdaptiveSchedule(max_delta=(grid_size - 1) ** 2)
+
+# 邻域的名字，见 solve_diagram_for_pd_code 的 neighborhood 参数
+NEIGHBORHOOD_NAMES = ("random", "guided")
+
 # 给定一个 pd_code 求一个扭结图出来
-def solve_diagram_for_pd_code(pd_code:list, seed=42):
+# incremental 为 True 时使用增量目标函数，每次只对被移动的交叉点相关的连线重新布线
+# n_chains 大于 1 时使用并行回火，多个副本在多个进程中以不同温度同时运行，每个副本的迭代次数与单链模拟退火大致相同
+# cache_bytes 大于 0 时在目标函数前面加上保存在共享内存中的置换表（例如 32 * 2**20），并行回火的各个副本共享同一个置换表；增量目标函数不使用置换表
+# collect_stats 为 True 时记录每次布线的统计信息（搜索节点数、失败连线数、布线用时等），按温度汇总后输出，只对默认的单链模拟退火有效
+# store_path 为 SQLite 数据库的路径，数据库以 pd_code 的标准形式为键保存最优布局：
+#     store_policy 为 "return" 时，数据库中已有记录则直接返回；为 "warm" 时，以数据库中的布局作为初始解继续优化
+#     求解结束后，比数据库中已有记录更好的结果会被写入数据库
+# routing_mode 为 call_line_checker.ROUTING_NEGOTIATED 时，生成初始解和模拟退火都使用协商布线计算目标函数值；
+#     协商布线不支持带上界的目标函数，也不能与 incremental、collect_stats 同时使用
+# verbose 为 False 时不输出任何进度信息（批量求解时在子进程中使用）
+# time_limit 为整个求解过程的时间上限（秒），生成初始解之后剩下的时间留给模拟退火，超时后返回已经找到的最优解；并行回火不支持时间上限
+# schedule 为单链模拟退火的降温策略（见 sa.py），为 None 时使用原来的等比降温，例如 AdaptiveSchedule() 自动确定初始温度并在停滞时提前停止；
+#     也可以是 SCHEDULE_NAMES 中的名字，由 make_schedule 根据初始解的网格大小构造
+# neighborhood 为 "random" 时使用原来的 layout_neighbor_generator；为 "guided" 时使用 moves.MoveEngine，根据每条连线的布线结果
+#     优先移动代价大的交叉点，并混合使用小幅平移、旋转、交换、向相邻交叉点靠近等局部移动，只对默认的单链模拟退火有效
+# checkpoint_path 不为 None 时，模拟退火每隔 checkpoint_interval 秒把完整状态原子地写入这个文件（包括随机数状态与邻域函数的计数器）；
+#     文件已经存在时不再生成初始解，而是从检查点继续，结果与不中断时相同；不支持增量目标函数与并行回火
+# on_new_best 不为 None 时，每找到一个更优的解就以 (解的字典, 目标函数值) 调用一次，第一次调用时为初始解，只对单链模拟退火有效
+def solve_diagram_for_pd_code(pd_code:list, seed=42, incremental=False, n_chains=1, cache_bytes=0, store_path=None, store_policy="return", collect_stats=False,
+                              routing_mode=call_line_checker.ROUTING_SEQUENTIAL, verbose=True, time_limit=None, schedule=None, neighborhood="random",
+                              checkpoint_path=None, checkpoint_interval=60.0, on_new_best=None):
+    assert store_policy in ("return", "warm")
+    assert routing_mode == call_line_checker.ROUTING_SEQUENTIAL or not (incremental or collect_stats)
+    assert n_chains == 1 or time_limit is None
+    assert neighborhood in NEIGHBORHOOD_NAMES
+    assert neighborhood == "random" or (n_chains == 1 and not incremental and routing_mode == call_line_checker.ROUTING_SEQUENTIAL)
+    assert checkpoint_path is None or (n_chains == 1 and not incremental)
     random.seed(seed)
+    begin_time = time.time()
+
+    store = ResultStore(store_path) if store_path is not None else None
+    stored = store.lookup(pd_code) if store is not None else None
+    if stored is not None and store_policy == "return":
+        # 距离相同的连线按照弧线编号决定布线顺序，换一种写法之后目标函数值可能略有不同，因此重新计算一次
+        stored_solution = stored[0]
+        stored_value = objective_function(stored_solution, routing_mode)
+        if verbose:
+            print("从数据库中找到了结果，目标函数值：%13.6f" % stored_value)
+        store.close() # type: ignore
+        return stored_solution, stored_value
+
+    if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+        # 检查点中保存了最初的初始解，用来以相同的方式构造优化器，之后由 SimulatedAnnealing.load_checkpoint 恢复状态
+        checkpoint_metadata = read_checkpoint(checkpoint_path)["metadata"]
+        if checkpoint_metadata.get("pd_code") != pd_code:
+            raise ValueError(f"检查点 {checkpoint_path} 对应的 pd_code 与输入不同")
+        initial_solution = checkpoint_metadata["initial_solution"]
+    elif stored is not None:
+        if verbose:
+            print("从数据库中找到了结果，以此作为初始解，保存时的目标函数值：%13.6f" % stored[1])
+        initial_solution = stored[0]
+    else:
+        initial_solution = gen_init(pd_code, routing_mode=routing_mode, verbose=verbose, time_limit=time_limit) # 生成初始解
+    remaining_time = None if time_limit is None else max(0.0, time_limit - (time.time() - begin_time))
+    best_solution, best_value = _solve_from_initial_solution(pd_code, initial_solution, seed, incremental, n_chains, cache_bytes, collect_stats, routing_mode,
+                                                             verbose, remaining_time, schedule, neighborhood,
+                                                             checkpoint_path, checkpoint_interval, on_new_best)
 
-    initial_solution = gen_init(pd_code) # 生成初始解
-    sa = SimulatedAnnealing(objective_function, neighbor_generator, initial_temperature= 4 * len(pd_code)* len(pd_code), seed=None)
-    sa.run(initial_solution)
+    if store is not None:
+        metadata = {"seed": seed, "incremental": incremental, "n_chains": n_chains, "warm_start": stored is not None, "elapsed": time.time() - begin_time,
+                    "routing_mode": routing_mode, "schedule": schedule if schedule is None or isinstance(schedule, str) else type(schedule).__name__,
+                    "neighborhood": neighborhood}
+        if store.save(best_solution, best_value, metadata) and verbose:
+            print("结果已经写入数据库：%s" % store_path)
+        store.close()
+    return best_solution, best_value
+
+# 从给定的初始解出发求解，参数的含义与 solve_diagram_for_pd_code 相同
+def _solve_from_initial_solution(pd_code:list, initial_solution:dict, seed, incremental, n_chains, cache_bytes, collect_stats=False,
+                                 routing_mode=call_line_checker.ROUTING_SEQUENTIAL, verbose=True, time_limit=None, schedule=None,
+                                 neighborhood="random", checkpoint_path=None, checkpoint_interval=60.0, on_new_best=None):
+    # 协商布线时使用绑定了布线模式的目标函数，并且不使用带上界的目标函数（之后的拆线重布可能让目标函数值降到上界以下）
+    mode_objective = objective_function
+    mode_bounded_objective = bounded_objective_function
+    if routing_mode != call_line_checker.ROUTING_SEQUENTIAL:
+        mode_objective = functools.partial(objective_function, routing_mode=routing_mode)
+        mode_bounded_objective = None
+    if isinstance(schedule, str):
+        schedule = make_schedule(schedule, initial_solution["grid_size"])
+    # 检查点中除了优化器本身的状态，还需要保存邻域函数的计数器（以及 MoveEngine 的内部状态）
+    def set_neighbor_generator_called_time(value):
+        global neighbor_generator_called_time
+        neighbor_generator_called_time = value
+    state_handlers = {"neighbor_generator_called_time": (lambda: neighbor_generator_called_time, set_neighbor_generator_called_time)}
+    checkpoint_options = {"checkpoint_path": checkpoint_path, "checkpoint_interval": checkpoint_interval, "state_handlers": state_handlers,
+                          "checkpoint_metadata": {"pd_code": pd_code, "initial_solution": initial_solution}}
+    sa_on_new_best = None
+    if on_new_best is not None:
+        sa_on_new_best = lambda solution, value: on_new_best(solution.to_dict() if isinstance(solution, Layout) else solution, value)
+    cache = None
+    if cache_bytes > 0 and not incremental:
+        cache = ObjectiveCache(pd_code, initial_solution["grid_size"], max_bytes=cache_bytes)
+    try:
+        move_engine = None
+        if n_chains > 1:
+            pt_objective = CachedObjective(mode_objective, cache) if cache is not None else mode_objective
+            pt = ParallelTempering(pt_objective, neighbor_generator, n_replicas=n_chains,
+                                   max_temperature=4 * len(pd_code) * len(pd_code), min_temperature=0.1,
+                                   swap_interval=200, n_rounds=200, seed=seed, verbose=verbose)
+            return pt.run(initial_solution)
+        if incremental:
+            incremental_objective = IncrementalObjective()
+            sa = SimulatedAnnealing(incremental_objective, neighbor_generator, initial_temperature= 4 * len(pd_code)* len(pd_code), seed=None,
+                                    verbose=verbose, on_accept=incremental_objective.accept, on_reject=incremental_objective.reject,
+                                    time_limit=time_limit, schedule=schedule, on_new_best=sa_on_new_best,
+                                    confirm_function=incremental_objective.confirm) # 记录最优解之前先用完整布线确认
+        else: # 使用 Layout 原地生成邻域，被拒绝时撤销修改，记录最优解时才复制；目标函数值一定会被拒绝的邻域解提前停止布线
+            context_objective = ContextObjective(pd_code, initial_solution["grid_size"], routing_mode)
+            sa_objective = context_objective
+            sa_bounded_objective = context_objective.bounded if mode_bounded_objective is not None else None
+            stats_function = None
+            neighbor_function, on_accept, on_reject = layout_neighbor_generator, Layout.commit, Layout.undo
+            if neighborhood == "guided": # MoveEngine 的目标函数同时记录每个交叉点的代价，也可以提供统计信息
+                move_engine = MoveEngine(pd_code, initial_solution["grid_size"])
+                state_handlers["move_engine"] = (move_engine.get_state, move_engine.set_state)
+                sa_objective, sa_bounded_objective = move_engine.objective, move_engine.bounded_objective
+                neighbor_function, on_accept, on_reject = move_engine, move_engine.on_accept, move_engine.on_reject
+                if collect_stats:
+                    stats_function = move_engine.last_summary
+            elif collect_stats:
+                instrumented_objective = InstrumentedObjective()
+                sa_objective, sa_bounded_objective = instrumented_objective, instrumented_objective.bounded
+                stats_function = instrumented_objective.last_summary
+            initial_solution = Layout.from_dict(initial_solution)
+            if cache is not None:
+                cached_objective = CachedObjective(sa_objective, cache, sa_bounded_objective)
+                sa_objective = cached_objective
+                if sa_bounded_objective is not None:
+                    sa_bounded_objective = cached_objective.bounded
+                cache.attach(initial_solution) # 邻域生成时增量维护哈希值
+            sa = SimulatedAnnealing(sa_objective, neighbor_function, initial_temperature= 4 * len(pd_code)* len(pd_code), seed=None,
+                                    verbose=verbose, on_accept=on_accept, on_reject=on_reject, snapshot_function=Layout.copy,
+                                    bounded_objective_function=sa_bounded_objective, stats_function=stats_function, time_limit=time_limit,
+                                    schedule=schedule, on_new_best=sa_on_new_best, **checkpoint_options)
+        if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+            sa.load_checkpoint()
+            if cache is not None:
+                cache.attach(sa.current_solution) # 反序列化得到的 Layout 没有挂接哈希表
+            best_solution, best_value = sa.run(resume=True)
+        else:
+            best_solution, best_value = sa.run(initial_solution)
+        if not incremental and collect_stats:
+            total: Dict[str, float] = {}
+            for step_stats in sa.history["stats"]:
+                sa.merge_stats(total, step_stats)
+            if verbose:
+                print("布线统计: ", total)
+        if not incremental and move_engine is not None and verbose:
+            print("移动方式统计: ", move_engine.summary())
+        if incremental and verbose: # 增量布线的结果依赖于历史布线过程，这里给出完整布线时的目标函数值作为参考
+            print("完整布线时的目标函数值: %13.6f" % objective_function(best_solution))
+        if isinstance(best_solution, Layout):
+            best_solution = best_solution.to_dict()
+        return best_solution, best_value
+    finally:
+        if cache is not None:
+            if verbose:
+                print("置换表统计: ", cache.stats())
+            cache.unlink()
 
 if __name__ == "__main__":    
-    auto_compile(True)
+    auto_compile()
     # print(objective_function({"grid_size":6,"crossing_number":3,"pos_list":[[4,4],[5,2],[2,2]],"direction_list":[2,1,0],"pd_code":[[6,4,1,3],[4,2,5,1],[2,6,3,5]]}))
     # solve_diagram_for_pd_code([[2, 8, 3, 7], [4, 10, 5, 9], [6, 2, 7, 1], [8, 4, 9, 3], [10, 6, 1, 5]])
     # solve_diagram_for_pd_code([[6, 1, 7, 2], [10, 7, 5, 8], [4, 5, 1, 6], [2, 10, 3, 9], [8, 4, 9, 3]])
@@ -0,0 +1,158 @@
+import math
+import os
+import struct
+import sys
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import call_line_checker
+from get_int_list_input_from_dict import get_int_list_input_from_dict
+from layout import Layout
+
+# 把布线结果绘制成 SVG 或 PNG：几何信息由 C++ 直接写入 numpy 数组（LineChecker.call_with_geometry），不需要启动子进程，也不需要解析文本
+# 网格中的位置 (x, y) 对应图片中边长为 cell_size 的方格，x 向右，y 向下
+# 从下方穿过交叉点的弧线在交叉点中心两侧各断开一格，从上方穿过的弧线经过交叉点中心
+# PNG 的光栅化与编码只使用 numpy 和 zlib，不依赖其他图像库
+
+def diagram_geometry(solution: Dict[str, Any] | Layout, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL,
+                     buffers: Optional[Dict[str, np.ndarray]] = None) -> Tuple[float, Dict[str, np.ndarray]]:
+    """
+    对 solution 布线，返回目标函数值以及几何信息（格式见 LineChecker.call_with_geometry）
+    批量绘图时可以传入 call_line_checker.geometry_buffers 分配的 buffers 重复使用
+    """
+    if isinstance(solution, Layout):
+        solution = solution.to_dict()
+    arr = np.array(get_int_list_input_from_dict(solution), dtype=np.int32)
+    return call_line_checker.get_line_checker().call_with_geometry(arr, routing_mode, buffers)
+
+def arc_polylines(geometry: Dict[str, np.ndarray], gap: bool = True) -> List[np.ndarray]:
+    """
+    每条弧线的折线（int32[点数, 2]），连线失败的弧线被跳过
+    gap 为 True 时，弧线在从下方穿过的交叉点处去掉交叉点中心这个端点，从而在交叉点处断开
+    """
+    arc_offsets, points, crossings = geometry["arc_offsets"], geometry["points"], geometry["crossings"]
+    grid_size = int(geometry["grid_size"])
+    under_axis = np.full((grid_size + 2, grid_size + 2), -1, dtype=np.int32) # 以交叉点中心的坐标为下标
+    under_axis[crossings[:, 0], crossings[:, 1]] = crossings[:, 3]
+
+    polylines = []
+    for begin, end in zip(arc_offsets[:-1], arc_offsets[1:]):
+        if end - begin < 2:
+            continue
+        polyline = points[begin:end]
+        if gap:
+            # 端点处的线段沿 x 轴时方向为 0，否则为 1，与交叉点下方弧线的方向相同时说明这一端从下方穿过
+            first_axis = 0 if polyline[1, 0] != polyline[0, 0] else 1
+            last_axis = 0 if polyline[-1, 0] != polyline[-2, 0] else 1
+            keep_first = under_axis[polyline[0, 0], polyline[0, 1]] != first_axis
+            keep_last = under_axis[polyline[-1, 0], polyline[-1, 1]] != last_axis
+            polyline = polyline[(0 if keep_first else 1):(len(polyline) if keep_last else len(polyline) - 1)]
+        polylines.append(polyline)
+    return polylines
+
+def to_pixel(points: np.ndarray, cell_size: float) -> np.ndarray:
+    """
+    网格坐标（从 1 开始）转换为方格中心的像素坐标
+    """
+    return (points - 0.5) * cell_size
+
+def render_svg(geometry: Dict[str, np.ndarray], cell_size: float = 10.0, line_width: Optional[float] = None, color: str = "black") -> str:
+    """
+    绘制 SVG，每条弧线是一个 polyline
+
+    参数:
+        geometry: diagram_geometry 或 LineChecker.call_with_geometry 返回的几何信息
+        cell_size: 每个格子的边长（像素）
+        line_width: 线宽，默认为 cell_size 的 0.4 倍
+        color: 线的颜色
+    """
+    line_width = line_width if line_width is not None else 0.4 * cell_size
+    size = int(geometry["grid_size"]) * cell_size
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" viewBox="0 0 %g %g">' % (size, size, size, size),
+             '<rect width="100%" height="100%" fill="white"/>',
+             '<g fill="none" stroke="%s" stroke-width="%g" stroke-linecap="round" stroke-linejoin="round">' % (color, line_width)]
+    for polyline in arc_polylines(geometry):
+        pixels = to_pixel(polyline, cell_size)
+        lines.append('<polyline points="%s"/>' % " ".join("%g,%g" % (x, y) for x, y in pixels))
+    lines.append('</g>')
+    lines.append('</svg>')
+    return "\n".join(lines) + "\n"
+
+def rasterize(geometry: Dict[str, np.ndarray], cell_size: int = 8, line_width: Optional[float] = None,
+              color: Tuple[int, int, int] = (0, 0, 0)) -> np.ndarray:
+    """
+    把所有弧线光栅化为 uint8[高, 宽, 3] 的 RGB 图像（白色背景）
+
+    所有线段一次性处理：每条线段上均匀取若干个采样点，每个采样点盖上一个圆形笔刷
+    """
+    line_width = line_width if line_width is not None else 0.4 * cell_size
+    size = int(geometry["grid_size"]) * cell_size
+    image = np.full((size, size, 3), 255, dtype=np.uint8)
+    polylines = arc_polylines(geometry)
+    if len(polylines) == 0:
+        return image
+    starts = np.concatenate([to_pixel(polyline[:-1], cell_size) for polyline in polylines])
+    ends = np.concatenate([to_pixel(polyline[1:], cell_size) for polyline in polylines])
+
+    samples = int(math.ceil(math.sqrt(2) * cell_size)) + 1 # 相邻格子之间（包括斜向）的距离不超过 sqrt(2) * cell_size
+    t = np.linspace(0.0, 1.0, samples)
+    centers = starts[:, None, :] + t[None, :, None] * (ends - starts)[:, None, :] # [线段数, 采样点数, 2]
+
+    radius = line_width / 2
+    r = int(math.ceil(radius))
+    offsets = np.array([(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1) if dx * dx + dy * dy <= radius * radius + 0.25])
+    if len(offsets) == 0:
+        offsets = np.zeros((1, 2), dtype=np.int64)
+    pixels = (np.floor(centers).astype(np.int64)[:, :, None, :] + offsets[None, None, :, :]).reshape(-1, 2)
+    pixels = pixels[((pixels >= 0) & (pixels < size)).all(axis=1)]
+    image[pixels[:, 1], pixels[:, 0]] = color
+    return image
+
+def encode_png(image: np.ndarray) -> bytes:
+    """
+    把 uint8[高, 宽, 3] 的 RGB 图像编码为 PNG（每行使用 None 过滤器，zlib 压缩）
+    """
+    height, width = image.shape[:2]
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)], axis=1).tobytes()
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b""))
+
+def render_png(geometry: Dict[str, np.ndarray], cell_size: int = 8, line_width: Optional[float] = None,
+               color: Tuple[int, int, int] = (0, 0, 0)) -> bytes:
+    """
+    绘制 PNG，参数的含义与 render_svg 相同，颜色为 RGB 三元组
+    """
+    return encode_png(rasterize(geometry, cell_size, line_width, color))
+
+def save_diagram(solution: Dict[str, Any] | Layout, path: str, routing_mode: int = call_line_checker.ROUTING_SEQUENTIAL, **kwargs) -> float:
+    """
+    对 solution 布线并保存为图片，根据扩展名（.svg 或 .png）选择格式，其余参数传给 render_svg / render_png
+    返回目标函数值
+    """
+    value, geometry = diagram_geometry(solution, routing_mode)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".svg":
+        with open(path, "w") as fp:
+            fp.write(render_svg(geometry, **kwargs))
+    elif extension == ".png":
+        with open(path, "wb") as fp:
+            fp.write(render_png(geometry, **kwargs))
+    else:
+        raise ValueError(f"不支持的图片格式: {path}")
+    return value
+
+if __name__ == "__main__":
+    import json
+    # 用法：python render.py solution.json output.svg|output.png，solution.json 的格式与 sample_k3a1.json 相同
+    if len(sys.argv) == 3:
+        input_path, output_path = sys.argv[1], sys.argv[2]
+    else:
+        input_path, output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_k3a1.json"), "k3a1.svg"
+    with open(input_path, "r") as fp:
+        solution = json.load(fp)
+    value = save_diagram(solution, output_path)
+    print("目标函数值: %13.6f, 已保存到 %s" % (value, output_path))
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 将求解结果保存在 SQLite 数据库中，以 pd_code 的标准形式为键
+# 标准形式与弧线编号方式、每个交叉点四元组的循环移位、交叉点的排列顺序都无关，
+# 因此同一个扭结图换一种 pd_code 写法时，也可以直接使用保存的布局
+#
+# 四元组的循环移位只改变插头与朝向之间的对应关系：将第 i 个交叉点的四元组循环左移 r 位，同时把朝向加 r，得到的布局在几何上完全相同
+# 注意：C++ 中距离相同的连线按照弧线编号决定布线顺序，因此换一种写法之后，同一个布局的目标函数值可能有微小的差别
+
+CanonicalForm = Tuple[str, List[int], List[int]]
+
+def canonical_pd_code(pd_code: List[List[int]]) -> Optional[CanonicalForm]:
+    """
+    计算 pd_code 的标准形式
+
+    以每个交叉点的每个插头作为起点（共 4N 种），按照广度优先的顺序重新给交叉点和弧线编号：
+    起点交叉点的第 0 个插头为选定的插头，之后发现的交叉点以发现它时经过的插头作为第 0 个插头；
+    弧线按照第一次遇到的顺序从 1 开始编号。在所有起点得到的编号结果中取字典序最小者。
+
+    返回:
+        (标准形式的 json 字符串, crossing_index, rotation)，其中原来的第 i 个交叉点在标准形式中是第 crossing_index[i] 个，
+        并且标准形式中的第 k 个插头对应原来的第 (k + rotation[i]) % 4 个插头；
+        图不连通时返回 None
+    """
+    n = len(pd_code)
+    if n == 0:
+        return None
+    arc_ends: Dict[int, List[Tuple[int, int]]] = {}
+    for i, crossing in enumerate(pd_code):
+        for j, label in enumerate(crossing):
+            arc_ends.setdefault(label, []).append((i, j))
+    if any(len(ends) != 2 for ends in arc_ends.values()):
+        return None
+    def other_end(i: int, j: int) -> Tuple[int, int]:
+        ends = arc_ends[pd_code[i][j]]
+        return ends[1] if ends[0] == (i, j) else ends[0]
+
+    best = None
+    for root in range(n):
+        for root_rotation in range(4):
+            crossing_index = [-1] * n
+            rotation = [0] * n
+            order = [root]
+            crossing_index[root] = 0
+            rotation[root] = root_rotation
+            arc_label: Dict[int, int] = {}
+            code = []
+            for i in order: # order 在遍历过程中不断增长
+                for k in range(4):
+                    j = (k + rotation[i]) % 4
+                    label = pd_code[i][j]
+                    if label not in arc_label:
+                        arc_label[label] = len(arc_label) + 1
+                        i_other, j_other = other_end(i, j)
+                        if crossing_index[i_other] < 0:
+                            crossing_index[i_other] = len(order)
+                            rotation[i_other] = j_other
+                            order.append(i_other)
+                    code.append(arc_label[label])
+            if len(order) != n:
+                return None
+            if best is None or code < best[0]:
+                best = (code, crossing_index, rotation)
+
+    code, crossing_index, rotation = best # type: ignore
+    canonical = json.dumps([code[4 * k: 4 * k + 4] for k in range(n)], separators=(",", ":"))
+    return canonical, crossing_index, rotation
+
+def to_canonical_layout(solution: Dict[str, Any], form: CanonicalForm) -> Tuple[List[List[int]], List[int]]:
+    """
+    将 solution 中的布局转换为标准形式下的 pos_list 和 direction_list
+    """
+    _, crossing_index, rotation = form
+    n = len(crossing_index)
+    pos_list: List[List[int]] = [[0, 0] for _ in range(n)]
+    direction_list = [0] * n
+    for i in range(n):
+        k = crossing_index[i]
+        pos_list[k] = list(solution["pos_list"][i])
+        direction_list[k] = (solution["direction_list"][i] + rotation[i]) % 4
+    return pos_list, direction_list
+
+def from_canonical_layout(pos_list: List[List[int]], direction_list: List[int], form: CanonicalForm) -> Tuple[List[List[int]], List[int]]:
+    """
+    将标准形式下的 pos_list 和 direction_list 转换回原来的编号方式
+    """
+    _, crossing_index, rotation = form
+    n = len(crossing_index)
+    original_pos_list = [list(pos_list[crossing_index[i]]) for i in range(n)]
+    original_direction_list = [(direction_list[crossing_index[i]] - rotation[i]) % 4 for i in range(n)]
+    return original_pos_list, original_direction_list
+
+class ResultStore:
+    """
+    保存求解结果的 SQLite 数据库，每个标准形式只保留目标函数值最小的布局
+    """
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                canonical       TEXT PRIMARY KEY,
+                crossing_number INTEGER NOT NULL,
+                grid_size       INTEGER NOT NULL,
+                pos_list        TEXT NOT NULL,
+                direction_list  TEXT NOT NULL,
+                cost            REAL NOT NULL,
+                metadata        TEXT NOT NULL,
+                updated_at      REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def lookup(self, pd_code: List[List[int]]) -> Optional[Tuple[Dict[str, Any], float, Dict[str, Any]]]:
+        """
+        查询 pd_code 对应的结果，布局已经转换为 pd_code 的编号方式
+
+        返回:
+            (solution, 保存时的目标函数值, 元数据)，没有记录时返回 None
+        """
+        form = canonical_pd_code(pd_code)
+        if form is None:
+            return None
+        row = self.conn.execute(
+            "SELECT grid_size, pos_list, direction_list, cost, metadata FROM results WHERE canonical = ?", (form[0],)).fetchone()
+        if row is None:
+            return None
+        grid_size, pos_list, direction_list, cost, metadata = row
+        pos_list, direction_list = from_canonical_layout(json.loads(pos_list), json.loads(direction_list), form)
+        solution = {
+            "grid_size": grid_size,
+            "crossing_number": len(pd_code),
+            "pos_list": pos_list,
+            "direction_list": direction_list,
+            "pd_code": pd_code
+        }
+        return solution, cost, json.loads(metadata)
+
+    def save(self, solution: Dict[str, Any], cost: float, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        保存 solution 及其目标函数值，只有比已有记录更好时才会覆盖
+
+        返回:
+            是否写入了数据库
+        """
+        form = canonical_pd_code(solution["pd_code"])
+        if form is None:
+            return False
+        pos_list, direction_list = to_canonical_layout(solution, form)
+        with self.conn:
+            row = self.conn.execute("SELECT cost FROM results WHERE canonical = ?", (form[0],)).fetchone()
+            if row is not None and row[0] <= cost:
+                return False
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (form[0], solution["crossing_number"], solution["grid_size"], json.dumps(pos_list), json.dumps(direction_list),
+                 cost, json.dumps(metadata or {}), time.time()))
+        return True
+
+    def close(self) -> None:
+        self.conn.close()
+
+if __name__ == "__main__":
+    # 检查标准形式与弧线编号、循环移位、交叉点顺序无关，并且布局可以正确地转换回来
+    import random
+    pd_code = [[6, 1, 7, 2], [14, 7, 15, 8], [4, 15, 1, 16], [10, 6, 11, 5], [8, 4, 9, 3], [18, 11, 19, 12], [20, 17, 5, 18], [12, 19, 13, 20], [16, 10, 17, 9], [2, 14, 3, 13]]
+    form = canonical_pd_code(pd_code)
+    assert form is not None
+    rng = random.Random(0)
+    for _ in range(100):
+        relabel = list(range(1, 2 * len(pd_code) + 1))
+        rng.shuffle(relabel)
+        shifts = [rng.randint(0, 3) for _ in pd_code]
+        other = [[relabel[label - 1] for label in crossing[s:] + crossing[:s]] for crossing, s in zip(pd_code, shifts)]
+        rng.shuffle(other)
+        other_form = canonical_pd_code(other)
+        assert other_form is not None and other_form[0] == form[0]
+
+        # 同一个几何布局在两种写法下的转换结果一致
+        pos_list = [[rng.randint(2, 100), rng.randint(2, 100)] for _ in pd_code]
+        direction_list = [rng.randint(0, 3) for _ in pd_code]
+        pos_back, direction_back = from_canonical_layout(pos_list, direction_list, other_form)
+        assert to_canonical_layout({"pos_list": pos_back, "direction_list": direction_back}, other_form) == (pos_list, direction_list)
+    print("标准形式：", form[0])
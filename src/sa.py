@@ -1,7 +1,183 @@
 import math
+import os
+import pickle
 import random
+import tempfile
 import time
-from typing import Callable, Any, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Any, Dict, Iterator, Tuple, Optional, List
+
+CHECKPOINT_VERSION = 1
+
+def read_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    读取 SimulatedAnnealing.save_checkpoint 写入的检查点，返回状态字典；其中 metadata 为构造优化器时传入的 checkpoint_metadata
+    """
+    with open(path, "rb") as fp:
+        state = pickle.load(fp)
+    if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"不是可以识别的检查点文件: {path}")
+    return state
+
+def write_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """
+    原子地写入检查点：先写入同一目录下的临时文件并刷新到磁盘，再用 os.replace 改名，中途被打断时原有的检查点不受影响
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".checkpoint-", suffix=".pkl", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            pickle.dump(state, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class GeometricSchedule:
+    """
+    等比降温：温度从 initial_temperature 开始，每个温度下迭代 equilibrium_iterations 次，之后乘以 cooling_rate，
+    降到 final_temperature 以下时停止；参数均取自 SimulatedAnnealing，是 SimulatedAnnealing 默认使用的降温策略
+
+    降温策略需要实现以下方法，均以优化器本身为第一个参数：
+        start(sa): 在 initialize 的最后调用，返回初始温度
+        should_continue(sa): 在每个温度开始之前调用，返回 False 时停止
+        equilibrium_iterations(sa): 当前温度下最多迭代的次数
+        equilibrium_reached(sa, accepted, tried): 每次迭代之后调用，返回 True 时提前结束当前温度
+        update(sa, accepted, uphill, tried, improved): 每个温度结束之后调用，accepted、tried 为接受与尝试的次数，
+            uphill 为被接受的变差的邻域解数目，improved 表示最优解是否更新过，负责修改 sa.temperature
+    """
+    def start(self, sa: "SimulatedAnnealing") -> float:
+        return sa.initial_temperature
+
+    def should_continue(self, sa: "SimulatedAnnealing") -> bool:
+        return sa.temperature > sa.final_temperature
+
+    def equilibrium_iterations(self, sa: "SimulatedAnnealing") -> int:
+        return sa.equilibrium_iterations
+
+    def equilibrium_reached(self, sa: "SimulatedAnnealing", accepted: int, tried: int) -> bool:
+        return False
+
+    def update(self, sa: "SimulatedAnnealing", accepted: int, uphill: int, tried: int, improved: bool) -> None:
+        sa.update_temperature()
+
+
+class AdaptiveSchedule(GeometricSchedule):
+    """
+    自适应降温：
+        1. initial_temperature 为 None 时，从初始解出发采样 sample_size 个邻域解，取目标值增加量的平均值 delta，
+           令 T0 = -delta / ln(initial_acceptance)，即变差的邻域解在开始时大约以 initial_acceptance 的概率被接受；
+           增加量超过 max_delta 的邻域解（例如目标函数中违反约束的惩罚项）不参与平均
+        2. 每个温度下最多迭代 sa.equilibrium_iterations 次，接受了 accepted_fraction * sa.equilibrium_iterations 次之后提前结束，
+           高温下几乎所有邻域解都被接受，不需要在每个温度下都迭代满
+        3. 接受率高于 fast_acceptance 时按 fast_cooling_rate 快速降温，否则按 sa.cooling_rate 降温
+        4. 没有接受任何变差的邻域解、最优解也没有更新的温度视为停滞（此时模拟退火已经退化为贪心下降），
+           连续 stall_steps 个温度停滞时，如果还有重新升温的次数，就把温度恢复到最近一次更新最优解时温度的 reheat_factor 倍
+           （不超过初始温度的 max_reheat_fraction 倍，避免回到代价很高、几乎随机游走的高温阶段），否则停止；温度降到 sa.final_temperature 以下时同样停止
+           （高温下大部分邻域解可能因为违反约束而被拒绝，接受率本身不能说明搜索已经停滞）
+    运行时间上限由 SimulatedAnnealing 的 time_limit 控制
+    """
+    def __init__(
+        self,
+        initial_temperature: Optional[float] = None,
+        initial_acceptance: float = 0.8,
+        sample_size: int = 100,
+        max_delta: Optional[float] = None,
+        accepted_fraction: float = 0.2,
+        fast_acceptance: float = 0.9,
+        fast_cooling_rate: float = 0.8,
+        stall_steps: int = 30,
+        max_reheats: int = 2,
+        reheat_factor: float = 2.0,
+        max_reheat_fraction: float = 0.1
+    ):
+        """
+        参数:
+            initial_temperature: 初始温度，为 None 时根据采样结果自动确定
+            initial_acceptance: 自动确定初始温度时，变差的邻域解在初始温度下被接受的概率
+            sample_size: 自动确定初始温度时采样的邻域解数目
+            max_delta: 自动确定初始温度时忽略目标值增加量超过 max_delta 的邻域解，为 None 时不忽略
+            accepted_fraction: 每个温度下接受的次数达到 accepted_fraction * equilibrium_iterations 时进入下一个温度
+            fast_acceptance: 接受率高于这个值时快速降温
+            fast_cooling_rate: 快速降温时的降温速率
+            stall_steps: 连续多少个温度停滞时重新升温或停止
+            max_reheats: 最多重新升温的次数
+            reheat_factor: 重新升温时，温度为最近一次更新最优解时温度的多少倍
+            max_reheat_fraction: 重新升温之后的温度不超过初始温度的多少倍
+        """
+        self.initial_temperature = initial_temperature
+        self.initial_acceptance = initial_acceptance
+        self.sample_size = sample_size
+        self.max_delta = max_delta
+        self.accepted_fraction = accepted_fraction
+        self.fast_acceptance = fast_acceptance
+        self.fast_cooling_rate = fast_cooling_rate
+        self.stall_steps = stall_steps
+        self.max_reheats = max_reheats
+        self.reheat_factor = reheat_factor
+        self.max_reheat_fraction = max_reheat_fraction
+        self.stall = 0
+        self.reheats = 0
+        self.improvement_temperature = 0.0
+        self.start_temperature = 0.0
+        self.stopped = False
+
+    def sample_temperature(self, sa: "SimulatedAnnealing") -> Optional[float]:
+        """
+        采样邻域解估计初始温度，每个邻域解计算之后都按照被拒绝处理（调用 on_reject），当前解保持不变
+        没有采样到变差的邻域解时返回 None
+        """
+        deltas = []
+        for _ in range(self.sample_size):
+            neighbor = sa.neighbor_function(sa.current_solution)
+            delta = sa.objective_function(neighbor) - sa.current_value
+            if sa.on_reject is not None:
+                sa.on_reject(neighbor)
+            if delta > 0 and math.isfinite(delta) and (self.max_delta is None or delta <= self.max_delta):
+                deltas.append(delta)
+        if len(deltas) == 0:
+            return None
+        return -(sum(deltas) / len(deltas)) / math.log(self.initial_acceptance)
+
+    def start(self, sa: "SimulatedAnnealing") -> float:
+        self.stall = 0
+        self.reheats = 0
+        self.stopped = False
+        temperature = self.initial_temperature
+        if temperature is None:
+            temperature = self.sample_temperature(sa)
+        if temperature is None:
+            temperature = sa.initial_temperature
+        self.improvement_temperature = self.start_temperature = temperature
+        return temperature
+
+    def should_continue(self, sa: "SimulatedAnnealing") -> bool:
+        return not self.stopped and sa.temperature > sa.final_temperature
+
+    def equilibrium_reached(self, sa: "SimulatedAnnealing", accepted: int, tried: int) -> bool:
+        return accepted >= max(1, int(self.accepted_fraction * sa.equilibrium_iterations))
+
+    def update(self, sa: "SimulatedAnnealing", accepted: int, uphill: int, tried: int, improved: bool) -> None:
+        if improved:
+            self.stall = 0
+            self.improvement_temperature = sa.temperature
+        elif uphill == 0:
+            self.stall += 1
+        if self.stall >= self.stall_steps:
+            if self.reheats >= self.max_reheats:
+                self.stopped = True
+                return
+            self.reheats += 1
+            self.stall = 0
+            sa.temperature = min(self.improvement_temperature * self.reheat_factor, self.start_temperature * self.max_reheat_fraction)
+            if sa.verbose:
+                print(f"连续 {self.stall_steps} 个温度停滞，重新升温到 {sa.temperature:.6f}（第 {self.reheats} 次）")
+            return
+        acceptance = accepted / tried if tried > 0 else 0.0
+        sa.temperature *= self.fast_cooling_rate if acceptance > self.fast_acceptance else sa.cooling_rate
+
 
 class SimulatedAnnealing:
     """
@@ -17,7 +193,20 @@ class SimulatedAnnealing:
         equilibrium_iterations: int = 200,
         seed: Optional[int] = None,
         verbose: bool = True,  # 新增参数：是否输出信息
-        log_interval: int = 1  # 新增参数：输出间隔（温度更新次数）
+        log_interval: int = 1,  # 新增参数：输出间隔（温度更新次数）
+        on_accept: Optional[Callable[[Any], None]] = None,
+        on_reject: Optional[Callable[[Any], None]] = None,
+        snapshot_function: Optional[Callable[[Any], Any]] = None,
+        bounded_objective_function: Optional[Callable[[Any, float], float]] = None,
+        stats_function: Optional[Callable[[], Optional[Dict[str, float]]]] = None,
+        time_limit: Optional[float] = None,
+        schedule: Optional[GeometricSchedule] = None,
+        on_new_best: Optional[Callable[[Any, float], None]] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: float = 60.0,
+        state_handlers: Optional[Dict[str, Tuple[Callable[[], Any], Callable[[Any], None]]]] = None,
+        checkpoint_metadata: Optional[Dict[str, Any]] = None,
+        confirm_function: Optional[Callable[[Any], float]] = None
     ):
         """
         初始化模拟退火优化器
@@ -32,6 +221,26 @@ class SimulatedAnnealing:
             seed: 随机数种子，用于结果可复现
             verbose: 是否输出优化过程信息
             log_interval: 每隔多少次温度更新输出一次信息
+            on_accept: 邻域解被接受后调用，参数为该邻域解，用于有状态的目标函数保留本次修改
+            on_reject: 邻域解被拒绝后调用，参数为该邻域解，用于有状态的目标函数撤销本次修改
+            snapshot_function: 记录最优解时对当前解做的复制，邻域函数原地修改当前解时需要提供，默认直接记录引用
+            bounded_objective_function: 带上界的目标函数，输入为优化变量和上界，目标值一定超过上界时可以提前停止并返回 math.inf；
+                提供时先抽取接受准则所需的随机数并换算为上界，随机数序列与优化结果都与只使用 objective_function 时相同
+            stats_function: 每次计算邻域解的目标值之后调用，返回本次计算的统计信息（字典），
+                每个温度下的统计信息汇总之后记录在 history['stats'] 中：键以 peak_ 开头的取最大值，其余求和
+            time_limit: 运行时间上限（秒），从 initialize 开始计时，超时后在当前迭代结束时停止并返回已经找到的最优解，
+                是否因为超时而停止记录在 timed_out 中
+            schedule: 降温策略，为 None 时使用 GeometricSchedule（由 initial_temperature、final_temperature、cooling_rate、
+                equilibrium_iterations 决定的等比降温），也可以使用 AdaptiveSchedule
+            on_new_best: 每次找到更优的解之后调用，参数为最优解（snapshot_function 复制之后的结果）及其目标值，不要原地修改
+            checkpoint_path: 检查点文件的路径，为 None 时不写检查点；每个温度结束时，距离上次写入超过 checkpoint_interval 秒
+                就原子地写入一次，正常结束时再写入一次（因为超时而停止时不写入，当前温度只进行了一部分）
+            checkpoint_interval: 写入检查点的最小间隔（秒）
+            state_handlers: 优化器之外、继续运行时也需要恢复的状态，名字 -> (get, set)，例如邻域函数内部的计数器；
+                get() 的返回值写入检查点，恢复时传给 set
+            checkpoint_metadata: 原样写入检查点的附加信息（例如 pd_code），由 read_checkpoint 读出
+            confirm_function: 当前解的目标值低于最优解时调用，参数为当前解，返回它准确的目标值并替换当前解的目标值，
+                确认之后仍然更优才记录为最优解；用于只能给出近似值的目标函数（例如增量布线）
         """
         self.objective_function = objective_function
         self.neighbor_function = neighbor_function
@@ -41,6 +250,22 @@ class SimulatedAnnealing:
         self.equilibrium_iterations = equilibrium_iterations
         self.verbose = verbose  # 新增属性
         self.log_interval = log_interval  # 新增属性
+        self.on_accept = on_accept
+        self.on_reject = on_reject
+        self.snapshot_function = snapshot_function if snapshot_function is not None else (lambda solution: solution)
+        self.bounded_objective_function = bounded_objective_function
+        self.stats_function = stats_function
+        self.time_limit = time_limit
+        self.timed_out = False
+        self.schedule = schedule if schedule is not None else GeometricSchedule()
+        self.on_new_best = on_new_best
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.state_handlers = state_handlers if state_handlers is not None else {}
+        self.checkpoint_metadata = checkpoint_metadata if checkpoint_metadata is not None else {}
+        self.confirm_function = confirm_function
+        self.last_checkpoint_time = 0.0
+        self.temp_iteration = 0  # 记录温度更新次数
         
         if seed is not None:
             random.seed(seed)
@@ -76,10 +301,11 @@ class SimulatedAnnealing:
         
         self.begin_time = time.time()
         self.current_value = self.objective_function(self.current_solution)
-        self.best_solution = self.current_solution
+        self.best_solution = self.snapshot_function(self.current_solution)
         self.best_value = self.current_value
-        self.temperature = self.initial_temperature
         self.iterations = 0
+        self.timed_out = False
+        self.temperature = self.schedule.start(self) # 自适应降温策略可能会采样邻域解来确定初始温度
         
         # 初始化历史记录
         self.history = {
@@ -88,6 +314,8 @@ class SimulatedAnnealing:
             'current_value': [self.current_value],
             'best_value': [self.best_value]
         }
+        if self.stats_function is not None:
+            self.history['stats'] = []
         
         # 输出初始状态
         if self.verbose:
@@ -110,45 +338,193 @@ class SimulatedAnnealing:
             # 若新解更差，以一定概率接受
             probability = math.exp(-delta / self.temperature)
             return random.random() < probability
+
+    def evaluate_bounded(self, neighbor: Any) -> Tuple[float, bool]:
+        """
+        先抽取接受准则所需的随机数 u，只有目标值不超过 current_value - T * ln(u) 的邻域解才可能被接受，
+        以此作为上界调用 bounded_objective_function，超过上界的邻域解不需要完整计算目标值
+
+        新解更优时 accept_criterion 不会抽取随机数，此时恢复随机数状态，保证随机数序列不变
+
+        返回:
+            邻域解的目标值（提前停止时为 math.inf），是否接受新解
+        """
+        state = random.getstate()
+        u = random.random()
+        ceiling = math.inf if u == 0 else self.current_value - self.temperature * math.log(u)
+        ceiling += 1e-9 * max(1.0, abs(ceiling)) # 留出浮点误差的余量，提前停止的邻域解一定会被 accept_criterion 拒绝
+        neighbor_value = self.bounded_objective_function(neighbor, ceiling) # type: ignore
+        delta = neighbor_value - self.current_value
+        if delta < 0:
+            random.setstate(state)
+            return neighbor_value, True
+        return neighbor_value, u < math.exp(-delta / self.temperature)
     
+    @staticmethod
+    def merge_stats(total: Dict[str, float], stats: Optional[Dict[str, float]]) -> None:
+        """
+        将一次计算的统计信息累加到 total 中，键以 peak_ 开头的取最大值，其余求和
+        """
+        if stats is None:
+            return
+        for key, value in stats.items():
+            if key not in total:
+                total[key] = value
+            elif key.startswith("peak_"):
+                total[key] = max(total[key], value)
+            else:
+                total[key] += value
+
     def update_temperature(self) -> None:
         """
         更新温度（降温）
         """
         self.temperature *= self.cooling_rate
     
-    def run(self, initial_solution: Any = None) -> Tuple[Any, float]:
+    def checkpoint_state(self) -> Dict[str, Any]:
+        """
+        在两个温度之间继续运行所需的全部状态：当前解、最优解、温度、迭代次数、历史记录、降温策略的内部状态、
+        随机数状态以及 state_handlers 给出的外部状态
+        """
+        return {
+            "version": CHECKPOINT_VERSION,
+            "current_solution": self.current_solution,
+            "current_value": self.current_value,
+            "best_solution": self.best_solution,
+            "best_value": self.best_value,
+            "temperature": self.temperature,
+            "iterations": self.iterations,
+            "temp_iteration": self.temp_iteration,
+            "history": self.history,
+            "elapsed": time.time() - self.begin_time,
+            "schedule": dict(vars(self.schedule)),
+            "random_state": random.getstate(),
+            "handlers": {name: get() for name, (get, _) in self.state_handlers.items()},
+            "metadata": self.checkpoint_metadata,
+        }
+
+    def save_checkpoint(self, path: Optional[str] = None) -> None:
+        """
+        原子地写入检查点，path 为 None 时写入 checkpoint_path
+        """
+        path = path if path is not None else self.checkpoint_path
+        assert path is not None
+        write_checkpoint(path, self.checkpoint_state())
+        self.last_checkpoint_time = time.time()
+
+    def load_checkpoint(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        从检查点恢复状态，之后调用 run(resume=True) 或 iterate(resume=True) 继续运行；返回检查点中的附加信息
+        运行时间从检查点中记录的用时开始继续计算，time_limit 限制的是中断前后的总用时
+        """
+        path = path if path is not None else self.checkpoint_path
+        assert path is not None
+        state = read_checkpoint(path)
+        self.current_solution = state["current_solution"]
+        self.current_value = state["current_value"]
+        self.best_solution = state["best_solution"]
+        self.best_value = state["best_value"]
+        self.temperature = state["temperature"]
+        self.iterations = state["iterations"]
+        self.temp_iteration = state["temp_iteration"]
+        self.history = state["history"]
+        self.begin_time = time.time() - state["elapsed"]
+        self.timed_out = False
+        vars(self.schedule).update(state["schedule"])
+        random.setstate(state["random_state"])
+        for name, value in state["handlers"].items():
+            self.state_handlers[name][1](value)
+        self.last_checkpoint_time = time.time()
+        if self.verbose:
+            print(f"从检查点 {path} 继续，迭代 {self.iterations}: 温度 = {self.temperature:.6f}, 当前解目标值 = {self.current_value:.6f}, 最优解目标值 = {self.best_value:.6f}")
+        return state["metadata"]
+
+    def resume(self, path: Optional[str] = None) -> Tuple[Any, float]:
+        """
+        从检查点继续运行直到结束，返回最优解及其目标函数值；与不中断时的结果相同（time_limit 导致的停止除外）
+        """
+        self.load_checkpoint(path)
+        return self.run(resume=True)
+
+    def run(self, initial_solution: Any = None, resume: bool = False) -> Tuple[Any, float]:
         """
         执行模拟退火优化
         
         参数:
             initial_solution: 初始解，若为None则利用neighbor_function随机生成
+            resume: 为 True 时不重新初始化，从 load_checkpoint 恢复的状态继续运行
             
         返回:
             最优解及其目标函数值
         """
-        self.initialize(initial_solution)
-        
-        temp_iteration = 0  # 记录温度更新次数
+        for _ in self.iterate(initial_solution, resume):
+            pass
+        return self.best_solution, self.best_value
+
+    def iterate(self, initial_solution: Any = None, resume: bool = False) -> Iterator[Tuple[Any, float]]:
+        """
+        与 run 相同，但每找到一个更优的解就返回一次 (最优解, 目标值)，第一次返回初始解（继续运行时为检查点中的最优解）；
+        调用者可以随时使用已经返回的最优解，中途停止迭代时优化也随之停止
+        """
+        if not resume:
+            self.initialize(initial_solution)
+            self.temp_iteration = 0
+            if self.on_new_best is not None:
+                self.on_new_best(self.best_solution, self.best_value)
+            if self.checkpoint_path is not None: # 立即写入一次，初始解（可能花了很长时间生成）不会因为中断而丢失
+                self.save_checkpoint()
+        self.last_checkpoint_time = time.time()
+        yield self.best_solution, self.best_value
         
-        while self.temperature > self.final_temperature:
-            for _ in range(self.equilibrium_iterations):
+        while self.schedule.should_continue(self):
+            step_stats: Dict[str, float] = {} # 当前温度下的统计信息
+            step_accepted = step_uphill = step_tried = 0 # 当前温度下接受、接受的变差邻域解以及尝试的次数
+            step_best_value = self.best_value
+            for _ in range(self.schedule.equilibrium_iterations(self)):
+                if self.time_limit is not None and time.time() - self.begin_time >= self.time_limit:
+                    self.timed_out = True
+                    break
+
                 # 生成邻域解
                 neighbor = self.neighbor_function(self.current_solution)
-                neighbor_value = self.objective_function(neighbor)
+                if self.bounded_objective_function is not None:
+                    neighbor_value, accepted = self.evaluate_bounded(neighbor)
+                else:
+                    neighbor_value = self.objective_function(neighbor)
                 
-                # 计算目标函数变化量
-                delta = neighbor_value - self.current_value
+                    # 计算目标函数变化量
+                    delta = neighbor_value - self.current_value
                 
-                # 判断是否接受新解
-                if self.accept_criterion(delta):
+                    # 判断是否接受新解
+                    accepted = self.accept_criterion(delta)
+
+                if self.stats_function is not None:
+                    self.merge_stats(step_stats, self.stats_function())
+
+                step_tried += 1
+                if accepted:
+                    step_accepted += 1
+                    if neighbor_value > self.current_value:
+                        step_uphill += 1
                     self.current_solution = neighbor
                     self.current_value = neighbor_value
+                    if self.on_accept is not None:
+                        self.on_accept(neighbor)
                     
                     # 更新最优解
+                    if self.current_value < self.best_value and self.confirm_function is not None:
+                        self.current_value = self.confirm_function(self.current_solution)
                     if self.current_value < self.best_value:
-                        self.best_solution = self.current_solution
+                        self.best_solution = self.snapshot_function(self.current_solution)
                         self.best_value = self.current_value
+                        if self.on_new_best is not None:
+                            self.on_new_best(self.best_solution, self.best_value)
+                        yield self.best_solution, self.best_value
+                elif self.on_reject is not None:
+                    self.on_reject(neighbor)
+
+                if self.schedule.equilibrium_reached(self, step_accepted, step_tried):
+                    break
             
             # 记录当前迭代信息
             self.iterations += 1
@@ -156,24 +532,36 @@ class SimulatedAnnealing:
             self.history['temperature'].append(self.temperature)
             self.history['current_value'].append(self.current_value)
             self.history['best_value'].append(self.best_value)
+            if self.stats_function is not None:
+                self.history['stats'].append(step_stats)
             
             # 温度更新计数
-            temp_iteration += 1
+            self.temp_iteration += 1
             
             # 输出当前状态
-            if self.verbose and temp_iteration % self.log_interval == 0:
+            if self.verbose and self.temp_iteration % self.log_interval == 0:
                 print(f"时刻：{time.time() - self.begin_time:13.6f}, 迭代 {self.iterations}: 温度 = {self.temperature:.6f}, 当前解目标值 = {self.current_value:.6f}, 最优解目标值 = {self.best_value:.6f}")
                 print("当前最优解: ", self.best_solution)
 
+            if self.timed_out:
+                break
+
             # 降温
-            self.update_temperature()
+            self.schedule.update(self, step_accepted, step_uphill, step_tried, self.best_value < step_best_value)
+
+            # 两个温度之间的状态可以完整地保存下来
+            if self.checkpoint_path is not None and time.time() - self.last_checkpoint_time >= self.checkpoint_interval:
+                self.save_checkpoint()
+
+        if self.checkpoint_path is not None and not self.timed_out:
+            self.save_checkpoint()
         
         # 输出最终结果
+        if self.verbose and self.timed_out:
+            print(f"达到时间上限 {self.time_limit:.3f} 秒，提前停止")
         if self.verbose:
             print(f"优化完成! 最终温度: {self.temperature:.6f}, 最优解目标值: {self.best_value:.6f}")
             print("当前最优解: ", self.best_solution)
-        
-        return self.best_solution, self.best_value
     
     def get_history(self) -> dict:
         """
@@ -185,6 +573,189 @@ class SimulatedAnnealing:
         return self.history
 
 
+def _run_replica_segment(
+    objective_function: Callable[[Any], float],
+    neighbor_function: Callable[[Any], Any],
+    solution: Any,
+    value: float,
+    temperature: float,
+    steps: int,
+    seed: int
+) -> Tuple[Any, float, Any, float, int]:
+    """
+    在固定温度下运行一段 Metropolis 过程，由 ParallelTempering 在子进程中调用
+
+    返回:
+        当前解，当前解目标值，本段中的最优解，最优解目标值，接受次数
+    """
+    random.seed(seed)
+    best_solution, best_value = solution, value
+    accepted = 0
+    for _ in range(steps):
+        neighbor = neighbor_function(solution)
+        neighbor_value = objective_function(neighbor)
+        delta = neighbor_value - value
+        if delta < 0 or random.random() < math.exp(-delta / temperature):
+            solution, value = neighbor, neighbor_value
+            accepted += 1
+            if value < best_value:
+                best_solution, best_value = solution, value
+    return solution, value, best_solution, best_value, accepted
+
+
+class ParallelTempering:
+    """
+    并行回火（多链模拟退火）优化器，用于最小化目标函数
+
+    多个副本分别在一组固定的温度下运行，每运行 swap_interval 步之后，
+    相邻温度的副本之间按照 Metropolis 准则交换状态，同时维护所有副本共享的全局最优解。
+    各个副本在进程池中并行运行，因此 objective_function 和 neighbor_function 必须可以被 pickle（例如模块级函数）。
+    """
+    def __init__(
+        self,
+        objective_function: Callable[[Any], float],
+        neighbor_function: Callable[[Any], Any],
+        n_replicas: int = 4,
+        max_temperature: float = 1000.0,
+        min_temperature: float = 0.1,
+        temperatures: Optional[List[float]] = None,
+        swap_interval: int = 200,
+        n_rounds: int = 100,
+        n_workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        verbose: bool = True,
+        log_interval: int = 1
+    ):
+        """
+        初始化并行回火优化器
+
+        参数:
+            objective_function: 目标函数，输入为优化变量，输出为目标值（需最小化）
+            neighbor_function: 邻域生成函数，输入当前解，返回其邻域内的一个随机解
+            n_replicas: 副本数目
+            max_temperature: 温度阶梯中的最高温度
+            min_temperature: 温度阶梯中的最低温度，温度阶梯在两者之间按等比数列分布
+            temperatures: 直接指定温度阶梯，指定时忽略 n_replicas、max_temperature 和 min_temperature
+            swap_interval: 每两次交换之间，每个副本运行的迭代次数
+            n_rounds: 交换的轮数，每个副本总共运行 n_rounds * swap_interval 次迭代
+            n_workers: 进程池大小，为 None 时取副本数目与 CPU 核数中的较小者
+            seed: 随机数种子，用于结果可复现（与进程调度顺序无关）
+            verbose: 是否输出优化过程信息
+            log_interval: 每隔多少轮交换输出一次信息
+        """
+        if temperatures is None:
+            if n_replicas == 1:
+                temperatures = [min_temperature]
+            else:
+                ratio = (max_temperature / min_temperature) ** (1.0 / (n_replicas - 1))
+                temperatures = [min_temperature * ratio ** k for k in range(n_replicas)]
+        self.objective_function = objective_function
+        self.neighbor_function = neighbor_function
+        self.temperatures = sorted(temperatures) # 从低温到高温
+        self.swap_interval = swap_interval
+        self.n_rounds = n_rounds
+        self.n_workers = n_workers if n_workers is not None else min(len(self.temperatures), os.cpu_count() or 1)
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.log_interval = log_interval
+
+        # 优化结果，replica_solutions[k] 是当前处于温度 temperatures[k] 的副本状态
+        self.best_solution = None
+        self.best_value = float('inf')
+        self.replica_solutions: List[Any] = []
+        self.replica_values: List[float] = []
+
+        # 记录优化过程
+        self.history = {
+            'rounds': [],
+            'replica_values': [],
+            'best_value': [],
+            'swap_acceptance': []
+        }
+
+    def swap_criterion(self, k: int) -> bool:
+        """
+        判断温度 temperatures[k] 与 temperatures[k + 1] 上的副本是否交换状态
+        """
+        value_cold, value_hot = self.replica_values[k], self.replica_values[k + 1]
+        if math.isinf(value_cold) and math.isinf(value_hot):
+            return False
+        exponent = (value_cold - value_hot) * (1.0 / self.temperatures[k] - 1.0 / self.temperatures[k + 1])
+        if exponent >= 0:
+            return True
+        return self.rng.random() < math.exp(exponent)
+
+    def run(self, initial_solution: Any = None) -> Tuple[Any, float]:
+        """
+        执行并行回火优化
+
+        参数:
+            initial_solution: 所有副本共同的初始解，若为None则利用neighbor_function随机生成
+
+        返回:
+            最优解及其目标函数值
+        """
+        if initial_solution is None:
+            initial_solution = self.neighbor_function(None)
+        begin_time = time.time()
+        initial_value = self.objective_function(initial_solution)
+        self.replica_solutions = [initial_solution] * len(self.temperatures)
+        self.replica_values = [initial_value] * len(self.temperatures)
+        self.best_solution, self.best_value = initial_solution, initial_value
+        self.history = {'rounds': [0], 'replica_values': [list(self.replica_values)], 'best_value': [self.best_value], 'swap_acceptance': [0.0]}
+
+        if self.verbose:
+            print(f"温度阶梯: {[round(t, 6) for t in self.temperatures]}, 初始解目标值: {initial_value:.6f}")
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            for round_index in range(1, self.n_rounds + 1):
+                # 所有副本并行运行一段
+                futures = [
+                    executor.submit(
+                        _run_replica_segment, self.objective_function, self.neighbor_function,
+                        self.replica_solutions[k], self.replica_values[k], self.temperatures[k],
+                        self.swap_interval, self.rng.getrandbits(63))
+                    for k in range(len(self.temperatures))
+                ]
+                for k, future in enumerate(futures):
+                    solution, value, segment_best_solution, segment_best_value, _ = future.result()
+                    self.replica_solutions[k], self.replica_values[k] = solution, value
+                    if segment_best_value < self.best_value: # 更新全局最优解
+                        self.best_solution, self.best_value = segment_best_solution, segment_best_value
+
+                # 相邻温度之间交换状态，奇偶轮次交替选择相邻对
+                swap_tried = swap_accepted = 0
+                for k in range(round_index % 2, len(self.temperatures) - 1, 2):
+                    swap_tried += 1
+                    if self.swap_criterion(k):
+                        swap_accepted += 1
+                        self.replica_solutions[k], self.replica_solutions[k + 1] = self.replica_solutions[k + 1], self.replica_solutions[k]
+                        self.replica_values[k], self.replica_values[k + 1] = self.replica_values[k + 1], self.replica_values[k]
+
+                self.history['rounds'].append(round_index)
+                self.history['replica_values'].append(list(self.replica_values))
+                self.history['best_value'].append(self.best_value)
+                self.history['swap_acceptance'].append(swap_accepted / swap_tried if swap_tried > 0 else 0.0)
+
+                if self.verbose and round_index % self.log_interval == 0:
+                    print(f"时刻：{time.time() - begin_time:13.6f}, 轮次 {round_index}: 各副本目标值 = {[round(v, 6) for v in self.replica_values]}, 最优解目标值 = {self.best_value:.6f}")
+
+        if self.verbose:
+            print(f"优化完成! 最优解目标值: {self.best_value:.6f}")
+            print("当前最优解: ", self.best_solution)
+
+        return self.best_solution, self.best_value
+
+    def get_history(self) -> dict:
+        """
+        获取优化历史记录
+
+        返回:
+            包含每一轮各副本目标值、全局最优解以及交换接受率的字典
+        """
+        return self.history
+
+
 # 使用示例
 if __name__ == "__main__":
     # 示例：最小化二维Rastrigin函数
@@ -215,3 +786,52 @@ if __name__ == "__main__":
     print(f"\n最终优化结果:")
     print(f"最优解: {best_solution}")
     print(f"目标函数值: {best_value:.6f}")
+
+    # 使用自适应降温：根据采样确定初始温度，连续多个温度停滞时重新升温，之后提前停止
+    sa = SimulatedAnnealing(
+        objective_function=rastrigin_function,
+        neighbor_function=neighbor_generator,
+        verbose=False,
+        schedule=AdaptiveSchedule()
+    )
+    best_solution, best_value = sa.run()
+    print(f"\n自适应降温最终优化结果:")
+    print(f"最优解: {best_solution}")
+    print(f"目标函数值: {best_value:.6f}, 温度更新次数: {sa.iterations}")
+
+    # 每找到一个更优的解就返回一次，同时把检查点写入临时文件；从检查点继续运行的结果与不中断时相同
+    checkpoint_path = os.path.join(tempfile.gettempdir(), "sa_example_checkpoint.pkl")
+    sa = SimulatedAnnealing(
+        objective_function=rastrigin_function,
+        neighbor_function=neighbor_generator,
+        seed=0,
+        verbose=False,
+        checkpoint_path=checkpoint_path,
+        checkpoint_interval=0.0
+    )
+    for step, (solution, value) in enumerate(sa.iterate()):
+        if step == 10: # 模拟中断
+            break
+    resumed = SimulatedAnnealing(objective_function=rastrigin_function, neighbor_function=neighbor_generator, verbose=False)
+    best_solution, best_value = resumed.resume(checkpoint_path)
+    os.remove(checkpoint_path)
+    print(f"\n从检查点继续的最终优化结果:")
+    print(f"最优解: {best_solution}")
+    print(f"目标函数值: {best_value:.6f}")
+
+    # 使用并行回火，四个副本在不同温度下并行运行
+    pt = ParallelTempering(
+        objective_function=rastrigin_function,
+        neighbor_function=neighbor_generator,
+        n_replicas=4,
+        max_temperature=100.0,
+        min_temperature=0.01,
+        n_rounds=50,
+        seed=0,
+        verbose=True,
+        log_interval=10
+    )
+    best_solution, best_value = pt.run()
+    print(f"\n并行回火最终优化结果:")
+    print(f"最优解: {best_solution}")
+    print(f"目标函数值: {best_value:.6f}")